@@ -2,6 +2,8 @@ import path from 'node:path';
 
 const fileBasedServicesDataFolder = '/tmp/app/server/data/services/';
 const databaseGeometryExportFolder = '/tmp/app/server/fgb-exports/';
+const routingIncrementalStateFolder = '/tmp/app/server/routing-state/';
+const routingGraphFolder = '/tmp/app/server/routing-graph/';
 const servicesDirectoryTitle = 'Services Directory';
 const campusMapVectorTilesOutputFolder = path.join(fileBasedServicesDataFolder, '/FurmanCampusMap/');
 const database = {
@@ -19,6 +21,8 @@ const koopRoutingProviderId = '120eb65f-9e43-4623-9e72-259916d5b736';
 export const constants = {
   fileBasedServicesDataFolder,
   databaseGeometryExportFolder,
+  routingIncrementalStateFolder,
+  routingGraphFolder,
   servicesDirectoryTitle,
   campusMapVectorTilesOutputFolder,
   database,
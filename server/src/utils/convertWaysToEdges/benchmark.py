@@ -0,0 +1,299 @@
+"""
+Benchmark the stages of the ways to edges conversion on synthetic campus-like networks.
+
+Each scale is converted with a stage report (see stage_report.py), and the wall time of every
+stage is compared to a stored baseline. Stages that became slower than the baseline by more than
+the threshold are reported as regressions, and the script exits with a non-zero status.
+
+Examples:
+    python benchmark.py --scales 1k 10k --baseline benchmark_baseline.json --save-baseline
+    python benchmark.py --scales 1k 10k --baseline benchmark_baseline.json --threshold 0.2
+"""
+
+import argparse
+import datetime
+import json
+import math
+import platform
+import sys
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from typing import TypedDict, cast
+
+import geopandas
+import numpy
+import pandas
+import shapely
+
+from convert_ways_to_edges import convert_ways_to_edges
+from stage_report import StageReport, use_report
+
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+
+class ScaleResult(TypedDict):
+    ways: int
+    edges: int
+    stages: dict[str, float]
+
+
+class Regression(TypedDict):
+    scale: str
+    stage: str
+    baseline_seconds: float
+    seconds: float
+    ratio: float
+
+
+def generate_synthetic_ways(target_way_count: int, *, connection_tolerance: float = 3.2, block_size: float = 50.0, entrances_per_side: int = 4, seed: int = 0) -> geopandas.GeoDataFrame:
+    """
+    Generate a synthetic campus-like network of roughly `target_way_count` ways in EPSG:3857.
+
+    The network is a grid of streets (one way per block side) with the blocks filled by:
+    - dangling paths that end just inside or just outside the connection tolerance of a street
+    - MultiLineString paths that cross the block in two parts
+    - plaza polygons with `entrances_per_side` entrance paths on each side
+    - invalid (self-intersecting) polygons that must be repaired
+    """
+    rng = numpy.random.default_rng(seed)
+
+    # each block has two street ways and about 2.6 other ways on average
+    grid_size = max(math.ceil(math.sqrt(target_way_count / 4.6)), 1) + 1
+    origin_x, origin_y = -9177000.0, 4153000.0
+
+    lines: list[shapely.Geometry] = []
+    line_kinds: list[str] = []
+
+    def add_lines(kind: str, coords: numpy.ndarray) -> None:
+        lines.extend(cast(numpy.ndarray, shapely.linestrings(coords)))
+        line_kinds.extend([kind] * len(coords))
+
+    # street grid, split into one way per block side
+    steps = numpy.arange(grid_size, dtype=float) * block_size
+    column, row = (grid.ravel() for grid in numpy.meshgrid(steps[:-1], steps, indexing='ij'))
+    add_lines('street', numpy.stack([
+        numpy.stack([origin_x + column, origin_y + row], axis=-1),
+        numpy.stack([origin_x + column + block_size, origin_y + row], axis=-1),
+    ], axis=1))
+    add_lines('street', numpy.stack([
+        numpy.stack([origin_x + row, origin_y + column], axis=-1),
+        numpy.stack([origin_x + row, origin_y + column + block_size], axis=-1),
+    ], axis=1))
+
+    # assign a role to each block
+    block_x, block_y = numpy.meshgrid(steps[:-1], steps[:-1], indexing='ij')
+    block_x, block_y = origin_x + block_x.ravel(), origin_y + block_y.ravel()
+    block_index = numpy.arange(len(block_x))
+    is_plaza = block_index % 25 == 12
+    is_multi = (block_index % 10 == 3) & ~is_plaza
+    is_invalid = (block_index % 50 == 21) & ~is_plaza
+    is_dangle = ~is_plaza & ~is_multi
+
+    # dangling paths that end just inside (90%) and just outside (110%) the connection
+    # tolerance from the street below or above them
+    x, y = block_x[is_dangle], block_y[is_dangle]
+    offset = rng.uniform(0.1, 0.3, len(x)) * block_size
+    inside_gap = connection_tolerance * 0.9
+    outside_gap = connection_tolerance * 1.1
+    add_lines('dangle_inside', numpy.stack([
+        numpy.stack([x + offset, y + inside_gap], axis=-1),
+        numpy.stack([x + offset, y + inside_gap + block_size * 0.3], axis=-1),
+    ], axis=1))
+    add_lines('dangle_outside', numpy.stack([
+        numpy.stack([x + block_size - offset, y + block_size - outside_gap], axis=-1),
+        numpy.stack([x + block_size - offset, y + block_size - outside_gap - block_size * 0.3], axis=-1),
+    ], axis=1))
+
+    # MultiLineStrings that cross the block from the street below to the street above in two parts
+    x, y = block_x[is_multi] + block_size / 2, block_y[is_multi]
+    parts = cast(numpy.ndarray, shapely.linestrings(numpy.stack([
+        numpy.stack([x, y], axis=-1),
+        numpy.stack([x, y + block_size * 0.4], axis=-1),
+        numpy.stack([x, y + block_size * 0.6], axis=-1),
+        numpy.stack([x, y + block_size], axis=-1),
+    ], axis=1).reshape(-1, 2, 2)))
+    multi_lines = cast(numpy.ndarray, shapely.multilinestrings(parts, indices=numpy.repeat(numpy.arange(len(x)), 2)))
+    lines.extend(multi_lines)
+    line_kinds.extend(['multi'] * len(multi_lines))
+
+    # plazas with entrance paths from the surrounding streets on every side
+    margin = block_size * 0.2
+    x, y = block_x[is_plaza], block_y[is_plaza]
+    plazas = cast(numpy.ndarray, shapely.box(x + margin, y + margin, x + block_size - margin, y + block_size - margin))
+    positions = margin + (block_size - 2 * margin) * \
+        numpy.arange(1, entrances_per_side + 1) / (entrances_per_side + 1)
+    px = (x[:, None] + positions[None, :]).ravel()
+    py = (y[:, None] + positions[None, :]).ravel()
+    bottom = numpy.repeat(y, entrances_per_side)
+    left = numpy.repeat(x, entrances_per_side)
+    for start, end in [
+        ((px, bottom), (px, bottom + margin)),
+        ((px, bottom + block_size), (px, bottom + block_size - margin)),
+        ((left, py), (left + margin, py)),
+        ((left + block_size, py), (left + block_size - margin, py)),
+    ]:
+        add_lines('entrance', numpy.stack([
+            numpy.stack(start, axis=-1),
+            numpy.stack(end, axis=-1),
+        ], axis=1))
+
+    # self-intersecting (bowtie) polygons
+    x, y = block_x[is_invalid] + block_size * 0.6, block_y[is_invalid] + block_size * 0.6
+    size = block_size * 0.2
+    bowties = cast(numpy.ndarray, shapely.polygons(numpy.stack([
+        numpy.stack([x, y], axis=-1),
+        numpy.stack([x + size, y + size], axis=-1),
+        numpy.stack([x + size, y], axis=-1),
+        numpy.stack([x, y + size], axis=-1),
+        numpy.stack([x, y], axis=-1),
+    ], axis=1)))
+
+    geometries = numpy.concatenate([
+        numpy.asarray(lines, dtype=object),
+        plazas,
+        bowties,
+    ])
+    kinds = line_kinds + ['plaza'] * len(plazas) + ['invalid'] * len(bowties)
+    table_names = ['paths'] * len(lines) + ['plazas'] * len(plazas) + ['buildings'] * len(bowties)
+
+    return geopandas.GeoDataFrame({
+        'way_id': numpy.arange(1, len(geometries) + 1),
+        'table_name': table_names,
+        'kind': kinds,
+    }, geometry=geometries, crs='EPSG:3857')
+
+
+def run_scale(ways: geopandas.GeoDataFrame, *, connection_tolerance: float, min_edge_length: float, repeat: int) -> ScaleResult:
+    """
+    Convert the ways `repeat` times and keep the fastest wall time of each stage.
+    """
+    stage_seconds: dict[str, float] = {}
+    edge_count = 0
+    for _ in range(repeat):
+        report = StageReport()
+        with redirect_stdout(StringIO()), use_report(report):
+            result = convert_ways_to_edges(
+                ways.copy(), connection_tolerance, min_edge_length, False, 'EPSG:3857')
+        edge_count = len(result['edges'])
+
+        for record in report.records:
+            seconds = record['wall_seconds']
+            stage_seconds[record['stage']] = min(stage_seconds.get(record['stage'], seconds), seconds)
+        total_seconds = sum(record['wall_seconds'] for record in report.records if record['depth'] == 0)
+        stage_seconds['total'] = min(stage_seconds.get('total', total_seconds), total_seconds)
+
+    return {
+        'ways': len(ways),
+        'edges': edge_count,
+        'stages': stage_seconds,
+    }
+
+
+def find_regressions(results: dict[str, ScaleResult], baseline: dict[str, ScaleResult], *, threshold: float, min_seconds: float) -> list[Regression]:
+    """
+    Find the stages that are slower than the baseline by more than the threshold (e.g., 0.25 for
+    25% slower). Stages that take less than `min_seconds` in the baseline are skipped because
+    their timings are dominated by noise.
+    """
+    regressions: list[Regression] = []
+    for scale, result in results.items():
+        if scale not in baseline:
+            continue
+        for stage_name, seconds in result['stages'].items():
+            baseline_seconds = baseline[scale]['stages'].get(stage_name)
+            if baseline_seconds is None or baseline_seconds < min_seconds:
+                continue
+            ratio = seconds / baseline_seconds
+            if ratio > 1 + threshold:
+                regressions.append({
+                    'scale': scale,
+                    'stage': stage_name,
+                    'baseline_seconds': baseline_seconds,
+                    'seconds': seconds,
+                    'ratio': ratio,
+                })
+    return regressions
+
+
+def _get_versions() -> dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'geopandas': geopandas.__version__,
+        'pandas': pandas.__version__,
+        'shapely': shapely.__version__,
+        'geos': shapely.geos_version_string,
+        'numpy': numpy.__version__,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the stages of the ways to edges conversion on synthetic networks.')
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1k', '10k'],
+                        help='The approximate numbers of ways to benchmark.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='The number of runs per scale. The fastest time of each stage is kept.')
+    parser.add_argument('--connection-tolerance', type=float, default=3.2)
+    parser.add_argument('--min-edge-length', type=float, default=1.6)
+    parser.add_argument('--baseline', type=Path,
+                        help='The JSON file with the baseline timings to compare against.')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Save the timings of this run as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='The fraction by which a stage may be slower than the baseline before it is a regression.')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Stages faster than this in the baseline are not checked for regressions.')
+    args = parser.parse_args()
+
+    results: dict[str, ScaleResult] = {}
+    for scale in args.scales:
+        ways = generate_synthetic_ways(SCALES[scale], connection_tolerance=args.connection_tolerance)
+        print(f'Benchmarking {scale} ({len(ways)} ways)...')
+        results[scale] = run_scale(
+            ways, connection_tolerance=args.connection_tolerance, min_edge_length=args.min_edge_length,
+            repeat=args.repeat)
+        print(f'  {results[scale]["edges"]} edges')
+        for stage_name, seconds in results[scale]['stages'].items():
+            print(f'  {stage_name:<24} {seconds:10.3f}s')
+
+    exit_code = 0
+    if args.baseline and args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        print(f'Comparing to baseline from {baseline["created"]}...')
+        if baseline['versions'] != _get_versions():
+            print(f'  Note: the baseline was recorded with different versions: {baseline["versions"]}')
+
+        regressions = find_regressions(
+            results, baseline['scales'], threshold=args.threshold, min_seconds=args.min_seconds)
+        for regression in regressions:
+            print(f'  REGRESSION {regression["scale"]} {regression["stage"]}: '
+                  f'{regression["baseline_seconds"]:.3f}s -> {regression["seconds"]:.3f}s '
+                  f'({regression["ratio"]:.2f}x)')
+        if regressions:
+            exit_code = 1
+        else:
+            print(f'  No stage is more than {args.threshold:.0%} slower than the baseline.')
+
+    if args.baseline and args.save_baseline:
+        # keep the baseline timings of scales that were not run this time
+        previous_scales = {}
+        if args.baseline.exists():
+            previous_scales = json.loads(args.baseline.read_text(encoding='utf-8'))['scales']
+        args.baseline.write_text(json.dumps({
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'versions': _get_versions(),
+            'scales': {**previous_scales, **results},
+        }, indent=2), encoding='utf-8')
+        print(f'Saved baseline to {args.baseline}')
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
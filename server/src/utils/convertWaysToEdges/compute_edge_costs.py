@@ -0,0 +1,99 @@
+from typing import Any, TypedDict
+
+import geopandas
+import numpy
+import shapely
+
+
+class CostProfile(TypedDict, total=False):
+    """
+    - multiplier: the cost of traversing one metre (default is 1)
+    - multipliers: additional multipliers for edges with specific attribute values
+      (column -> value -> multiplier), e.g., {'table_name': {'stairs': 3}}
+    - impassable: attribute values that make an edge impassable in both directions
+      (column -> values), e.g., {'table_name': ['stairs']}
+    - oneway: the column with one-way flags ('yes', 'true', or '1' for forward only;
+      '-1' or 'reverse' for reverse only)
+    """
+    multiplier: float
+    multipliers: dict[str, dict[Any, float]]
+    impassable: dict[str, list[Any]]
+    oneway: str
+
+
+DEFAULT_COST_PROFILES: dict[str, CostProfile] = {
+    # double the length of the edge in metres (the original cost of the routing tables was double
+    # the length in degrees)
+    'distance': {'multiplier': 2.0},
+}
+
+_FORWARD_ONEWAY_VALUES = ['yes', 'true', '1']
+_REVERSE_ONEWAY_VALUES = ['-1', 'reverse']
+
+
+def get_geodesic_lengths(edges: geopandas.GeoDataFrame) -> numpy.ndarray:
+    """
+    Measure the length of each edge in metres along the ellipsoid of the edges' CRS, so that the
+    lengths do not depend on the scale distortion of a projected CRS (e.g., web mercator lengths
+    are 1/cos(latitude) times too long).
+
+    The segments of all edges are measured in a single vectorized call.
+    """
+    geodetic_crs = edges.crs.geodetic_crs if edges.crs is not None else None
+    geod = edges.crs.get_geod() if edges.crs is not None else None
+    if geodetic_crs is None or geod is None:
+        raise ValueError('Edges GeoDataFrame has no CRS with an ellipsoid to measure the edge lengths on.')
+
+    geographic_geometries = edges.geometry.to_crs(geodetic_crs).to_numpy()
+    parts, part_edge_positions = shapely.get_parts(geographic_geometries, return_index=True)
+    coordinates, coordinate_part_positions = shapely.get_coordinates(parts, return_index=True)
+
+    # a segment connects two consecutive coordinates of the same part
+    is_segment = coordinate_part_positions[1:] == coordinate_part_positions[:-1]
+    starts, ends = coordinates[:-1][is_segment], coordinates[1:][is_segment]
+    _, _, segment_lengths = geod.inv(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
+    segment_edge_positions = part_edge_positions[coordinate_part_positions[:-1][is_segment]]
+    return numpy.bincount(segment_edge_positions, weights=segment_lengths, minlength=len(edges))
+
+
+def compute_edge_costs(edges: geopandas.GeoDataFrame, profiles: dict[str, CostProfile]) -> geopandas.GeoDataFrame:
+    """
+    Add `cost__{profile}` and `reverse_cost__{profile}` columns to the edges for each profile,
+    computed from the geodesic length of each edge in metres (see get_geodesic_lengths) and its
+    attributes.
+
+    The cost of an edge is its length times the profile's multiplier and the multipliers of any
+    matching attribute values. Impassable edges and the closed direction of one-way edges get a
+    cost of -1, which pgRouting treats as not traversable. Attribute columns that do not exist
+    on the edges are ignored.
+    """
+    edges = edges.copy()
+    lengths = get_geodesic_lengths(edges)
+
+    for name, profile in profiles.items():
+        costs = lengths * profile.get('multiplier', 1.0)
+        for column, value_multipliers in profile.get('multipliers', {}).items():
+            if column in edges.columns:
+                multipliers = edges[column].map(value_multipliers).astype(float).fillna(1.0)
+                costs = costs * multipliers.to_numpy()
+        reverse_costs = costs.copy()
+
+        # close both directions of impassable edges
+        is_impassable = numpy.zeros(len(edges), dtype=bool)
+        for column, values in profile.get('impassable', {}).items():
+            if column in edges.columns:
+                is_impassable |= edges[column].isin(values).to_numpy(dtype=bool, na_value=False)
+
+        # close one direction of one-way edges
+        oneway_column = profile.get('oneway')
+        if oneway_column is not None and oneway_column in edges.columns:
+            oneway_values = edges[oneway_column].astype('string').str.lower()
+            reverse_costs[oneway_values.isin(_FORWARD_ONEWAY_VALUES).to_numpy(dtype=bool, na_value=False)] = -1
+            costs[oneway_values.isin(_REVERSE_ONEWAY_VALUES).to_numpy(dtype=bool, na_value=False)] = -1
+
+        costs[is_impassable] = -1
+        reverse_costs[is_impassable] = -1
+        edges[f'cost__{name}'] = costs
+        edges[f'reverse_cost__{name}'] = reverse_costs
+
+    return edges
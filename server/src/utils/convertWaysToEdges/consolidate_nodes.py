@@ -0,0 +1,73 @@
+from typing import TypedDict
+
+import geopandas
+import numpy
+import pandas
+import shapely
+
+from get_line_termini import get_line_termini_coordinates
+
+
+class ConsolidateNodesResult(TypedDict):
+    edges: geopandas.GeoDataFrame
+    nodes: geopandas.GeoDataFrame
+
+
+def consolidate_nodes(edges: geopandas.GeoDataFrame, *, snap_grid: float | None = None) -> ConsolidateNodesResult:
+    """
+    Given a GeoDataFrame of edges, create one node for each unique edge terminus and record the
+    node ids on the edges in `start_vertex` and `end_vertex` columns.
+
+    Termini are grouped by their exact coordinates. If a snap grid size is specified, termini are
+    instead grouped by the grid cell they snap to, and each node uses the coordinates of the first
+    terminus in its group.
+
+    The returned nodes are indexed by `node_id` and list the ids of their edges in an `edges` column.
+    """
+    # collect the start and end coordinates of every edge (the start and end of each edge are adjacent)
+    termini = get_line_termini_coordinates(edges)
+    coords = numpy.column_stack([termini['start'], termini['end']]).reshape(-1, 2)
+    has_terminus = numpy.repeat(termini['has_termini'], 2)
+    terminus_positions = numpy.flatnonzero(has_terminus)
+
+    # build numeric grouping keys from the coordinates
+    keys = coords[has_terminus]
+    if snap_grid is not None:
+        keys = numpy.round(keys / snap_grid).astype(numpy.int64)
+
+    # sort the termini by key (stable, so the first terminus in each group is the earliest one)
+    # and start a new node wherever the key changes
+    order = numpy.lexsort((keys[:, 1], keys[:, 0]))
+    sorted_keys = keys[order]
+    is_new_node = numpy.ones(len(order), dtype=bool)
+    is_new_node[1:] = numpy.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+    sorted_node_ids = numpy.cumsum(is_new_node) - 1
+
+    # map each terminus to its node id
+    node_ids = numpy.empty(len(order), dtype=numpy.int64)
+    node_ids[order] = sorted_node_ids
+    terminus_node_ids = numpy.full(len(coords), -1, dtype=numpy.int64)
+    terminus_node_ids[terminus_positions] = node_ids
+
+    # write the node ids onto the edges
+    edges = edges.copy()
+    for column, offset in (('start_vertex', 0), ('end_vertex', 1)):
+        vertex_ids = pandas.array(terminus_node_ids[offset::2], dtype='Int64')
+        vertex_ids[~termini['has_termini']] = pandas.NA
+        edges[column] = vertex_ids
+
+    # create the nodes, keeping track of all associated edge ids
+    edge_ids = numpy.repeat(edges.index.to_numpy(), 2)[terminus_positions]
+    node_edges = pandas.Series(edge_ids[order]).groupby(sorted_node_ids, sort=True).agg(list)
+    first_coords = coords[terminus_positions][order][is_new_node]
+    nodes = geopandas.GeoDataFrame(
+        {'edges': node_edges.to_numpy()},
+        geometry=shapely.points(first_coords),
+        index=pandas.RangeIndex(len(first_coords), name='node_id'),
+        crs=edges.crs,
+    )
+
+    return {
+        'edges': edges,
+        'nodes': nodes,
+    }
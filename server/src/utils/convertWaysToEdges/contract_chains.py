@@ -0,0 +1,188 @@
+from typing import TypedDict
+
+import geopandas
+import numpy
+import pandas
+import shapely
+
+
+class ContractChainsResult(TypedDict):
+    edges: geopandas.GeoDataFrame
+    nodes: geopandas.GeoDataFrame
+    edge_mapping: geopandas.GeoDataFrame
+
+
+def contract_chains(edges: geopandas.GeoDataFrame, nodes: geopandas.GeoDataFrame, *, attribute_columns: list[str] | None = None, kept_node_ids: numpy.ndarray | None = None) -> ContractChainsResult:
+    """
+    Given edges with `start_vertex` and `end_vertex` columns and their nodes (see consolidate_nodes),
+    merge the chains of LineString edges that meet at nodes of degree 2 into single edges, and
+    remove those nodes. Two edges are only merged if their values in `attribute_columns` (by default,
+    every column except the geometry, ids, and vertices) are the same. The nodes in `kept_node_ids`
+(e.g., polygon entrances) are never removed.
+
+    Each merged edge keeps the index label, id, and attributes of the first edge of its chain and
+    follows the direction of that edge. A chain that forms a closed loop keeps the start node of its
+    first edge, so that it becomes a loop edge.
+
+    Returns the contracted edges and the remaining nodes, along with an `edge_mapping` that lists
+    the original edges of each contracted edge (`edge_id`) in order, with their ids
+    (`original_edge_id`), their position in the chain (`sequence`), whether they run against the
+    direction of the contracted edge (`reversed`), and their original geometries.
+    """
+    edge_ids = (edges['edge_id'] if 'edge_id' in edges.columns else edges.index.to_series()).to_numpy()
+
+    # map the node ids to positions (edges without vertices are never merged)
+    node_positions = pandas.Series(numpy.arange(len(nodes)), index=nodes.index)
+    has_vertices = edges['start_vertex'].notna().to_numpy() & edges['end_vertex'].notna().to_numpy()
+    start_nodes = numpy.full(len(edges), -1, dtype=numpy.int64)
+    end_nodes = numpy.full(len(edges), -1, dtype=numpy.int64)
+    start_nodes[has_vertices] = node_positions.loc[edges['start_vertex'][has_vertices].astype('int64')].to_numpy()
+    end_nodes[has_vertices] = node_positions.loc[edges['end_vertex'][has_vertices].astype('int64')].to_numpy()
+
+    # group the edges by their attribute values
+    if attribute_columns is None:
+        attribute_columns = [column for column in edges.columns
+                             if column not in (edges.geometry.name, 'edge_id', 'start_vertex', 'end_vertex')]
+    attribute_groups: numpy.ndarray = numpy.zeros(len(edges), dtype=numpy.int64)
+    if attribute_columns:
+        attribute_groups = pandas.DataFrame(edges[attribute_columns]).groupby(
+            attribute_columns, dropna=False, sort=False).ngroup().to_numpy()
+
+    # find the two termini of every node of degree 2
+    routed_positions = numpy.flatnonzero(has_vertices)
+    terminus_edges = numpy.concatenate([routed_positions, routed_positions])
+    terminus_nodes = numpy.concatenate([start_nodes[routed_positions], end_nodes[routed_positions]])
+    order = numpy.argsort(terminus_nodes, kind='stable')
+    terminus_edges, terminus_nodes = terminus_edges[order], terminus_nodes[order]
+    degree_2_nodes = numpy.flatnonzero(numpy.bincount(terminus_nodes, minlength=len(nodes)) == 2)
+    first = numpy.searchsorted(terminus_nodes, degree_2_nodes)
+    edges_a, edges_b = terminus_edges[first], terminus_edges[first + 1]
+
+    # a node can be contracted if it joins two different LineStrings with the same attributes
+    is_line = edges.geometry.geom_type.eq('LineString').to_numpy()
+    is_contractible = (edges_a != edges_b) & is_line[edges_a] & is_line[edges_b] & \
+        (attribute_groups[edges_a] == attribute_groups[edges_b])
+    if kept_node_ids is not None:
+        is_contractible &= ~numpy.isin(nodes.index.to_numpy()[degree_2_nodes], kept_node_ids)
+    is_contracted_node = numpy.zeros(len(nodes), dtype=bool)
+    is_contracted_node[degree_2_nodes[is_contractible]] = True
+    node_edges = numpy.full((len(nodes), 2), -1, dtype=numpy.int64)
+    node_edges[degree_2_nodes[is_contractible]] = numpy.column_stack([edges_a, edges_b])[is_contractible]
+
+    # walk each chain from its first edge until the walk reaches a node that is not contracted
+    # (the edges of closed loops are only reached from their lowest edge, after all other chains)
+    start_node_list, end_node_list = start_nodes.tolist(), end_nodes.tolist()
+    is_contracted_node_list = is_contracted_node.tolist()
+    node_edge_list = node_edges.tolist()
+    chain_ids = numpy.full(len(edges), -1, dtype=numpy.int64)
+    member_edges: list[int] = []
+    member_reversed: list[bool] = []
+    chain_start_nodes: list[int] = []
+    chain_end_nodes: list[int] = []
+
+    def walk(edge: int, is_reversed: bool) -> None:
+        chain_id = len(chain_start_nodes)
+        chain_start_nodes.append(end_node_list[edge] if is_reversed else start_node_list[edge])
+        while True:
+            chain_ids[edge] = chain_id
+            member_edges.append(edge)
+            member_reversed.append(is_reversed)
+            exit_node = start_node_list[edge] if is_reversed else end_node_list[edge]
+            if not is_contracted_node_list[exit_node]:
+                break
+            edge_a, edge_b = node_edge_list[exit_node]
+            edge = edge_b if edge_a == edge else edge_a
+            if chain_ids[edge] != -1:
+                # the chain is a closed loop, so the exit node is kept
+                is_contracted_node[exit_node] = False
+                break
+            is_reversed = end_node_list[edge] == exit_node
+        chain_end_nodes.append(exit_node)
+
+    is_start_contracted = has_vertices & is_contracted_node[start_nodes]
+    is_end_contracted = has_vertices & is_contracted_node[end_nodes]
+    for edge in numpy.flatnonzero(has_vertices & ~(is_start_contracted & is_end_contracted)).tolist():
+        if chain_ids[edge] == -1:
+            walk(edge, bool(is_start_contracted[edge]))
+    for edge in numpy.flatnonzero(has_vertices).tolist():
+        if chain_ids[edge] == -1:
+            walk(edge, False)
+
+    member_edge_array = numpy.array(member_edges, dtype=numpy.int64)
+    member_reversed_array = numpy.array(member_reversed, dtype=bool)
+    member_chain_ids = chain_ids[member_edge_array]
+    is_first_member = numpy.ones(len(member_edge_array), dtype=bool)
+    is_first_member[1:] = member_chain_ids[1:] != member_chain_ids[:-1]
+    first_members = member_edge_array[is_first_member]
+    chain_sizes = numpy.bincount(member_chain_ids, minlength=len(first_members))
+
+    # join the coordinates of the edges of each chain in order (reversing the edges that run
+    # against the chain) and remove the duplicate coordinates where the edges meet
+    coordinates, coordinate_members = shapely.get_coordinates(
+        edges.geometry.to_numpy()[member_edge_array], return_index=True)
+    member_coordinate_counts = numpy.bincount(coordinate_members, minlength=len(member_edge_array))
+    member_coordinate_starts = numpy.cumsum(member_coordinate_counts) - member_coordinate_counts
+    coordinate_offsets = numpy.arange(len(coordinates)) - member_coordinate_starts[coordinate_members]
+    source_offsets = numpy.where(member_reversed_array[coordinate_members],
+                                 member_coordinate_counts[coordinate_members] - 1 - coordinate_offsets, coordinate_offsets)
+    coordinates = coordinates[member_coordinate_starts[coordinate_members] + source_offsets]
+    is_duplicate = numpy.zeros(len(coordinates), dtype=bool)
+    is_duplicate[1:] = (coordinate_offsets[1:] == 0) & ~is_first_member[coordinate_members[1:]] & \
+        numpy.all(coordinates[1:] == coordinates[:-1], axis=1)
+    coordinate_chain_ids = member_chain_ids[coordinate_members]
+
+    # replace the first edge of each chain with the merged edge
+    is_merged = chain_sizes > 1
+    contracted_edges = edges.copy()
+    merged_positions = first_members[is_merged]
+    is_merged_coordinate = ~is_duplicate & is_merged[coordinate_chain_ids]
+    merged_geometries = shapely.linestrings(
+        coordinates[is_merged_coordinate],
+        indices=numpy.searchsorted(numpy.flatnonzero(is_merged), coordinate_chain_ids[is_merged_coordinate]))
+    geometries = contracted_edges.geometry.to_numpy().copy()
+    geometries[merged_positions] = merged_geometries
+    contracted_edges.geometry = geometries
+    node_ids = nodes.index.to_numpy()
+    for column, chain_nodes in (('start_vertex', chain_start_nodes), ('end_vertex', chain_end_nodes)):
+        vertex_ids = contracted_edges[column].astype(object).to_numpy().copy()
+        vertex_ids[first_members] = node_ids[numpy.array(chain_nodes, dtype=numpy.int64)]
+        contracted_edges[column] = pandas.array(vertex_ids, dtype='Int64')
+    is_kept_edge = ~has_vertices
+    is_kept_edge[first_members] = True
+    contracted_edges = contracted_edges[is_kept_edge]
+
+    # list the original edges of each contracted edge (every edge maps to itself if it was not merged)
+    mapped_chain_ids = numpy.full(len(edges), -1, dtype=numpy.int64)
+    mapped_chain_ids[member_edge_array] = member_chain_ids
+    mapped_positions = numpy.arange(len(edges))
+    mapped_positions[member_edge_array] = first_members[member_chain_ids]
+    sequences = numpy.zeros(len(edges), dtype=numpy.int64)
+    sequences[member_edge_array] = numpy.arange(len(member_edge_array)) - \
+        (numpy.cumsum(chain_sizes) - chain_sizes)[member_chain_ids]
+    is_reversed_edge = numpy.zeros(len(edges), dtype=bool)
+    is_reversed_edge[member_edge_array] = member_reversed_array
+    edge_mapping = geopandas.GeoDataFrame(
+        {
+            'edge_id': edge_ids[mapped_positions],
+            'original_edge_id': edge_ids,
+            'sequence': sequences,
+            'reversed': is_reversed_edge,
+        },
+        geometry=edges.geometry.to_numpy(),
+        crs=edges.crs,
+    ).sort_values(['edge_id', 'sequence'], kind='stable').reset_index(drop=True)
+
+    # remove the contracted nodes and point the remaining nodes at the contracted edges
+    contracted_nodes = nodes[~is_contracted_node].copy()
+    if 'edges' in contracted_nodes.columns:
+        edge_labels = pandas.Series(edges.index.to_numpy()[mapped_positions], index=edges.index)
+        node_edge_labels = contracted_nodes['edges'].explode()
+        contracted_nodes['edges'] = pandas.Series(
+            edge_labels.reindex(node_edge_labels.to_numpy()).to_numpy(), index=node_edge_labels.index
+        ).groupby(level=0, sort=False).agg(list).reindex(contracted_nodes.index)
+
+    return {
+        'edges': contracted_edges,
+        'nodes': contracted_nodes,
+        'edge_mapping': edge_mapping,
+    }
@@ -1,88 +1,154 @@
+from collections.abc import Callable
 from pathlib import Path
-from typing import Any, TypedDict, cast
+from typing import Literal, NotRequired, TypedDict, TypeVar, cast
 
 import geopandas
-from itertools import combinations
 import pandas
-from pandas import Series
-from shapely import make_valid
-from shapely.validation import explain_validity
-from shapely.geometry import LineString, Point, Polygon, MultiLineString, MultiPolygon
-from shapely.ops import split, substring
-
-from find_orphan_lines import find_orphan_lines
-from get_line_termini import get_line_termini
-from lines_to_edges import lines_to_edges
+import shapely
+
+from consolidate_nodes import consolidate_nodes
+from contract_chains import contract_chains
+from create_polygon_skeletons import create_polygon_skeletons
+from compute_edge_costs import DEFAULT_COST_PROFILES, CostProfile, compute_edge_costs
+from deduplicate_lines import deduplicate_lines
+from find_components import find_components
+from find_entrance_nodes import find_entrance_nodes
+from find_polygon_entrances import find_polygon_entrances, get_entrance_tolerance
+from lines_to_edges import LinesToEdgesResult, lines_to_edges
+from low_memory import BudgetTiling, get_budget_tiling, join_attributes, separate_attributes, to_crs_in_place
+from prepare_ways import PrepareWaysResult, prepare_ways
 from resolve_unconnected_line_ends import resolve_unconnected_line_ends
-from trace_boundary_part import trace_boundary_part
+from stage_cache import StageCache, hash_ways_input
+from stage_report import get_peak_rss_bytes, stage
+
+T = TypeVar('T')
+
+# change this whenever a stage's output changes so that previous checkpoints are not reused
+_CHECKPOINT_VERSION = 3
 
 
 class EdgesResult(TypedDict):
     edges: geopandas.GeoDataFrame
     nodes: geopandas.GeoDataFrame
     orphans: geopandas.GeoDataFrame
+    edge_mapping: NotRequired[geopandas.GeoDataFrame]
+    entrances: NotRequired[geopandas.GeoDataFrame]
+
+
+def get_noding_grid(tile_size: float | None, memory_budget: int | None) -> float | None:
+    """
+    Get the grid that the lines are split on: the lines are split on a 0.000001 grid whenever they
+    may be split in tiles (see node_lines_tiled), so that the edges are the same whether or not the
+    memory budget falls back to tiles.
+    """
+    return 0.000001 if tile_size is not None or memory_budget is not None else None
 
 
-def convert_ways_to_edges(ways: geopandas.GeoDataFrame | Path, connection_tolerance: float, min_edge_length: float, no_orphans: bool, intermediate_crs: str) -> EdgesResult:
+def convert_ways_to_edges(ways: geopandas.GeoDataFrame | Path | PrepareWaysResult, connection_tolerance: float, min_edge_length: float, no_orphans: bool, intermediate_crs: str, *, node_snap_grid: float | None = None, tile_size: float | None = None, attribute_transfer: Literal['buffer', 'lineage'] = 'buffer', entrance_pairs: Literal['all', 'nearest', 'delaunay'] = 'all', min_component_edges: int | None = None, min_component_length: float | None = None, drop_small_components: bool = False, cost_profiles: dict[str, CostProfile] | None = None, remove_duplicate_lines: bool = False, precision_grid: float | None = None, contract_degree_two_nodes: bool = False, contraction_attributes: list[str] | None = None, low_memory: bool = False, memory_budget: int | None = None, cache: StageCache | None = None) -> EdgesResult:
     """
     Given a GeoDataFrame of way geometries, convert them to edges by splitting at intersections.
     Returns a new GeoDataFrame with the edges.
+
+    The ways may also be the result of prepare_ways, in which case they are not prepared again.
+
+    Each edge records the ids of its start and end nodes in `start_vertex` and `end_vertex`.
+    Edge termini are consolidated into nodes by their exact coordinates, or by the grid cell
+    they snap to if `node_snap_grid` is specified (in the units of the intermediate CRS).
+
+    If `tile_size` is specified, lines are split at intersections in tiles of that size (in the
+    units of the intermediate CRS) in parallel processes. The intersections are then snapped to a
+    0.000001 grid so that the tiles agree at their seams, and the resulting edges are the same as
+    splitting all lines at once on that grid (see node_lines_tiled).
+
+    If `remove_duplicate_lines` is True, duplicate lines and lines that are covered by another line
+    are removed before splitting, and their attributes are merged into the remaining lines (see
+    deduplicate_lines). If `precision_grid` is also specified, the coordinates of the lines and
+    polygons are first snapped to a grid of that size (in the units of the intermediate CRS), and
+    the polygon entrances are found within a tolerance that covers the snapping (see
+    get_entrance_tolerance).
+
+    The `attribute_transfer` method controls how way attributes are copied to the edges that are
+    split from them (see lines_to_edges).
+
+    Polygons are integrated into the edges by connecting pairs of their entrances (the edge termini
+    on their boundaries). The skeleton edges keep the `way_id` of their polygon. The `entrance_pairs`
+    method chooses which pairs (see get_entrance_pairs); 'nearest' and 'delaunay' keep the number of
+    skeleton edges near-linear in the number of entrances. The `entrances` of the result map each
+    polygon to the nodes of its entrances (see find_entrance_nodes), for example to compute
+    distances between buildings (see export_distance_matrix).
+
+    If `contract_degree_two_nodes` is True, chains of edges that meet at nodes of degree 2 are merged
+    into single edges when their `contraction_attributes` (by default, all attributes) are the same,
+    and the `edge_mapping` of the result lists the original edges of each merged edge (see
+    contract_chains).
+
+    The connected components of the edges are recorded in a `component_id` column on the edges and
+    nodes (0 is the largest component). Components with fewer than `min_component_edges` edges or
+    shorter than `min_component_length` in total are dropped and added to the orphans if
+    `drop_small_components` is True, raise an error if `no_orphans` is True, and otherwise are
+    kept with a warning (see find_components).
+
+    The `cost__{profile}` and `reverse_cost__{profile}` columns are computed for each cost profile
+    from the geodesic lengths of the edges in metres (see compute_edge_costs). By default, only the
+    'distance' profile is computed.
+
+    If `low_memory` is True, the lines are split, connected, and filtered with only their geometries
+    and the attributes are joined onto the edges afterwards, so the attributes are not copied at
+    every step, and the results are reprojected in place (see low_memory). If a `memory_budget` (in
+    bytes) is specified and no tile size is, the lines are split in tiles when a single union is
+    estimated not to fit in the budget (see get_budget_tiling). With a memory budget, the lines are
+    always split on the same 0.000001 grid as in tiles, so the edges do not depend on whether the
+    budget was exceeded. The peak memory usage is printed in either mode.
+
+    If a stage cache is provided, the outputs of the ways preparation, [e1], [e3], [e5], [p1], and [p2]
+    stages are saved as checkpoints keyed by the content of the input ways and only the parameters
+    that each stage depends on, and the conversion resumes from the deepest checkpoint that is
+    still valid (e.g., changing the connection tolerance reuses the [e1] edges).
+
+    The time, memory, and feature counts of each stage are recorded in the active stage report,
+    if there is one (see stage_report.use_report).
     """
-    # if a path was provided instead, read it to a GeoDataFrame
-    if isinstance(ways, Path):
-        if (not ways.exists()) or (not ways.is_file()):
-            raise FileNotFoundError(f'Ways file not found: {ways}')
-
-        # parquet file
-        if ways.suffix == '.parquet':
-            ways = geopandas.read_parquet(ways)
-
-        # any other file type supported by geopandas
-        else:
-            ways = geopandas.read_file(ways)
-
-    # reproject to intermediate CRS for processing
-    old_crs = ways.crs
-    if not old_crs:
-        raise ValueError('Input ways GeoDataFrame has no CRS defined.')
-    ways = ways.to_crs(intermediate_crs)
-
-    # check for invalid geometries
-    print('Checking for invalid geometries...')
-    invalid_mask = ~ways.is_valid | ways.is_empty | ways.geometry.isna()
-    invalid_count = invalid_mask.sum()
-    if invalid_count > 0:
-        print(f"  Found {invalid_count} invalid or empty geometries.")
-
-        print("  Reasons for invalid geometries:")
-        reasons = ways.geometry[invalid_mask].apply(explain_validity)
-        for reason, count in reasons.value_counts().items():
-            print(f"    {reason}: {count}")
-
-        print("  Attempting repair with make_valid...")
-        ways["geometry"] = ways.geometry.apply(
-            lambda g: make_valid(g) if g is not None else None
-        )
+    noding_grid = get_noding_grid(tile_size, memory_budget)
+
+    # the key of each checkpoint depends on the key of the previous checkpoint and only the
+    # parameters that affect the stage's output
+    checkpoint_keys: dict[str, str] = {}
+    if cache is not None:
+        print('Hashing the input ways for the stage cache...')
+        checkpoint_keys['prepare_ways'] = cache.make_key(
+            'prepare_ways', _CHECKPOINT_VERSION,
+            hash_ways_input(ways['ways'] if isinstance(ways, dict) else ways), intermediate_crs)
+        checkpoint_keys['e1'] = cache.make_key(
+            'e1', checkpoint_keys['prepare_ways'], remove_duplicate_lines, precision_grid, low_memory, no_orphans,
+            tile_size, memory_budget, noding_grid, attribute_transfer)
+        checkpoint_keys['e3'] = cache.make_key(
+            'e3', checkpoint_keys['e1'], min_edge_length, connection_tolerance)
+        checkpoint_keys['e5'] = cache.make_key(
+            'e5', checkpoint_keys['e3'], no_orphans, tile_size, memory_budget, noding_grid, attribute_transfer,
+            min_edge_length)
+        checkpoint_keys['p1'] = cache.make_key('p1', checkpoint_keys['e5'])
+        checkpoint_keys['p2'] = cache.make_key('p2', checkpoint_keys['p1'], entrance_pairs)
+
+    def checkpoint(name: str, compute: Callable[[], T]) -> T:
+        if cache is None:
+            return compute()
+        return cache.checkpoint(name, checkpoint_keys[name], compute)
+
+    # read, reproject, and clean the ways
+    def run_prepare_ways(input_ways: geopandas.GeoDataFrame | Path) -> PrepareWaysResult:
+        with stage('prepare_ways') as record:
+            prepare_ways_result = prepare_ways(input_ways, intermediate_crs)
+            record['output_count'] = len(prepare_ways_result['ways'])
+        return prepare_ways_result
+
+    if isinstance(ways, dict):
+        prepare_ways_result = ways
+    else:
+        input_ways = ways
+        prepare_ways_result = checkpoint('prepare_ways', lambda: run_prepare_ways(input_ways))
+    ways = prepare_ways_result['ways']
+    old_crs = prepare_ways_result['original_crs']
 
-        # drop any geometry that still fails after repair
-        pre_drop_count = len(ways)
-        ways = ways[ways.geometry.notnull() & ways.is_valid & ~ways.is_empty].copy()
-        dropped_count = pre_drop_count - len(ways)
-
-        print(f"  Dropped {dropped_count} geometries that could not be repaired.")
-        print(f"  {len(ways)} geometries remain after cleaning.")
-
-    # lowercase all column names for consistency
-    ways.columns = [col.lower() for col in ways.columns]
-
-    # force geometry requirements
-    if not all(ways.geometry.type.isin(['LineString', 'MultiLineString', 'Polygon', 'MultiPolygon'])):
-        found_types = ways.geometry.type.unique()
-        raise ValueError(
-            f'All geometries in the input ways GeoDataFrame must be LineString, MultiLineString, Polygon, or MultiPolygon types. Found geometry types: {found_types}')
-    if not any(ways.geometry.type.isin(['LineString', 'MultiLineString'])):
-        raise ValueError(
-            'No LineString or MultiLineString geometries found in the input ways GeoDataFrame.')
     initial_lines_mask = ways.geometry.type.isin(['LineString', 'MultiLineString'])
     initial_lines = ways[initial_lines_mask].copy()
     initial_polygons_mask = ways.geometry.type.isin(['Polygon', 'MultiPolygon'])
@@ -92,139 +158,222 @@ def convert_ways_to_edges(ways: geopandas.GeoDataFrame | Path, connection_tolera
     print('Exploding MultiLineStrings to LineStrings...')
     initial_lines = initial_lines.explode(index_parts=False).reset_index(drop=True)
 
+    # snap the polygons to the same precision grid as the lines so that shared vertices stay shared
+    if remove_duplicate_lines and precision_grid is not None:
+        initial_polygons.geometry = shapely.set_precision(initial_polygons.geometry.to_numpy(), precision_grid)
+        initial_polygons = initial_polygons[~initial_polygons.is_empty]
+
+    # remove duplicate and covered lines so that they do not add to the cost of splitting
+    if remove_duplicate_lines:
+        print('[d1] Removing duplicate and covered lines...')
+        with stage('d1', input_count=len(initial_lines)) as record:
+            deduplicate_lines_result = deduplicate_lines(initial_lines, precision=precision_grid)
+            initial_lines = deduplicate_lines_result['lines'].reset_index(drop=True)
+            record['output_count'] = len(initial_lines)
+        print(f'Removed {deduplicate_lines_result["removed_line_count"]} lines and '
+              f'{deduplicate_lines_result["removed_vertex_count"]} vertices.')
+
+    # in low-memory mode, only the geometries of the lines (and their positions) are carried
+    # through the edge steps, and the attributes are joined onto the edges afterwards
+    line_attributes: pandas.DataFrame | None = None
+    if low_memory:
+        separate_attributes_result = separate_attributes(initial_lines)
+        initial_lines = separate_attributes_result['lines']
+        line_attributes = separate_attributes_result['attributes']
+
+    def get_tiling(lines: geopandas.GeoDataFrame) -> BudgetTiling:
+        if tile_size is not None or memory_budget is None:
+            return {'tile_size': tile_size, 'max_workers': None}
+        return get_budget_tiling(lines, memory_budget)
+
     # ----------------------------------------
-    # create edges:
+    # create edges (resuming from the deepest cached checkpoint):
 
     # step 1: split at intersections
-    print('[e1] Splitting ways at intersections...')
-    initial_lines_to_edges_result = lines_to_edges(
-        initial_lines, no_orphans, additional_split_polygons=initial_polygons)
-    initial_edges = initial_lines_to_edges_result['edges']
-
-    # step 2: remove all lines that are shorter than the minimum edge length
-    print(f'[e2] Removing edges shorter than minimum edge length of {min_edge_length}...')
-    filtered_edges = geopandas.GeoDataFrame(
-        initial_edges[initial_edges.geometry.length >= min_edge_length], crs=initial_edges.crs)
-    print(f'Removed {len(initial_edges) - len(filtered_edges)} edges shorter than minimum edge length of {min_edge_length}.')
-
-    # step 3: connect edges that are within the connection tolerance, specifying an overshoot
-    #         distance so that we can split at intersections again
-    print(f'[e3] Connecting unconnected line ends within tolerance of {connection_tolerance}...')
-    connected_edges = resolve_unconnected_line_ends(
-        filtered_edges, connection_tolerance, overshoot=0.000001, polygons=initial_polygons)
-
-    # step 4: split any remaining lines at intersections again (to catch new intersections created by connections)
-    print('[e4] Splitting connected lines at intersections again...')
-    final_lines_to_edges_result = lines_to_edges(connected_edges, no_orphans)
-    edges_with_small_extensions = final_lines_to_edges_result['edges']
-    orphans = final_lines_to_edges_result['orphans']
-
-    # step 5. remove the leftover short edges again
-    print(f'[e5] Removing edges shorter than minimum edge length of {min_edge_length} again...')
-    edges = geopandas.GeoDataFrame(
-        edges_with_small_extensions[edges_with_small_extensions.geometry.length >= min_edge_length], crs=connected_edges.crs)
+    def run_e1() -> geopandas.GeoDataFrame:
+        print('[e1] Splitting ways at intersections...')
+        with stage('e1', input_count=len(initial_lines)) as record:
+            tiling = get_tiling(initial_lines)
+            initial_lines_to_edges_result = lines_to_edges(
+                initial_lines, no_orphans, additional_split_polygons=initial_polygons, tile_size=tiling['tile_size'],
+                grid_size=noding_grid, max_workers=tiling['max_workers'], attribute_transfer=attribute_transfer)
+            initial_edges = initial_lines_to_edges_result['edges']
+            record['output_count'] = len(initial_edges)
+        return initial_edges
+
+    def run_e3() -> geopandas.GeoDataFrame:
+        initial_edges = checkpoint('e1', run_e1)
+
+        # step 2: remove all lines that are shorter than the minimum edge length
+        print(f'[e2] Removing edges shorter than minimum edge length of {min_edge_length}...')
+        with stage('e2', input_count=len(initial_edges)) as record:
+            filtered_edges = geopandas.GeoDataFrame(
+                initial_edges[initial_edges.geometry.length >= min_edge_length], crs=initial_edges.crs)
+            record['output_count'] = len(filtered_edges)
+        print(f'Removed {len(initial_edges) - len(filtered_edges)} edges shorter than minimum edge length of {min_edge_length}.')
+
+        # step 3: connect edges that are within the connection tolerance, specifying an overshoot
+        #         distance so that we can split at intersections again
+        print(f'[e3] Connecting unconnected line ends within tolerance of {connection_tolerance}...')
+        with stage('e3', input_count=len(filtered_edges)) as record:
+            connected_edges = resolve_unconnected_line_ends(
+                filtered_edges, connection_tolerance, overshoot=0.000001, polygons=initial_polygons)
+            record['output_count'] = len(connected_edges)
+        return connected_edges
+
+    def run_e5() -> LinesToEdgesResult:
+        connected_edges = checkpoint('e3', run_e3)
+
+        # step 4: split any remaining lines at intersections again (to catch new intersections created by connections)
+        print('[e4] Splitting connected lines at intersections again...')
+        with stage('e4', input_count=len(connected_edges)) as record:
+            tiling = get_tiling(connected_edges)
+            final_lines_to_edges_result = lines_to_edges(
+                connected_edges, no_orphans, tile_size=tiling['tile_size'], grid_size=noding_grid,
+                max_workers=tiling['max_workers'], attribute_transfer=attribute_transfer)
+            edges_with_small_extensions = final_lines_to_edges_result['edges']
+            record['output_count'] = len(edges_with_small_extensions)
+
+        # step 5. remove the leftover short edges again
+        print(f'[e5] Removing edges shorter than minimum edge length of {min_edge_length} again...')
+        with stage('e5', input_count=len(edges_with_small_extensions)) as record:
+            edges = geopandas.GeoDataFrame(
+                edges_with_small_extensions[edges_with_small_extensions.geometry.length >= min_edge_length], crs=connected_edges.crs)
+            record['output_count'] = len(edges)
+        return {
+            'edges': edges,
+            'orphans': final_lines_to_edges_result['orphans'],
+        }
+
+    e5_result = checkpoint('e5', run_e5)
+    edges = e5_result['edges']
+    orphans = e5_result['orphans']
+    if line_attributes is not None:
+        print('Joining way attributes onto the edges...')
+        with stage('attributes', input_count=len(edges)) as record:
+            edges = join_attributes(edges, line_attributes)
+            record['output_count'] = len(edges)
 
     # ----------------------------------------
     # integrate polygons into edges:
 
+    polygon_entrances = None
+    entrance_tolerance = get_entrance_tolerance(precision_grid if remove_duplicate_lines else None)
     if not initial_polygons.empty:
-        # for each polygon, find the line termini that touch its exterior
-        print('[p1] Finding line termini touching polygon edges...')
-        line_termini = get_line_termini(edges)
-        matches: list[tuple[Polygon | MultiPolygon, geopandas.GeoDataFrame, Series[Any]]] = []
-        for polygon_index, polygon in initial_polygons.iterrows():
-            polygon_boundary = polygon.geometry.boundary  # usually gives MultiLineString
-            touching_nodes = line_termini[line_termini.geometry.within(
-                polygon_boundary.buffer(0.000001))]
-            polygon_column_data = polygon.drop(labels='geometry')
-            matches.append((polygon.geometry, touching_nodes, polygon_column_data))
-
-        # for each polygon, draw straight lines between all touching nodes
-        print('[p2] Creating edges between touching nodes along polygon edges...')
-        polygon_skeletons: list[LineString] = []
-        for polygon_geom, touching_nodes, polygon_info in matches:
-            if len(touching_nodes) < 2:
-                continue
-
-            # create all unique pairs of touching points
-            if not all(touching_nodes.geometry.type.isin(['Point'])):
-                continue
-            touching_points = cast(list[Point], touching_nodes.geometry.tolist())
-            all_pairs = combinations(touching_points, 2)
-
-            # create lines between each pair of touching points
-            for point_a, point_b in all_pairs:
-                line = LineString([point_a, point_b])
-
-                # split the line by the polygon to keep only the portion within the polygon
-                split_line = split(line, polygon_geom)
-                if split_line.is_empty:
-                    continue
-
-                # flag each segment of the split line by whether its midpoint is within the polygon
-                segments: list[tuple[LineString, bool]] = []
-                for segment in split_line.geoms:
-                    if not isinstance(segment, LineString):
-                        continue
-                    midpoint = segment.interpolate(0.5, normalized=True)
-                    is_within = midpoint.within(polygon_geom)
-                    segments.append((segment, is_within))
-
-                # replace each segment that is outside the polygon with the
-                # portion of the polygon boundary between its endpoints
-                reconstructed_segments: list[LineString] = []
-                for segment, is_within in segments:
-                    if is_within:
-                        reconstructed_segments.append(segment)
-                        continue
-
-                    # get the start and end points of the segment
-                    start_point = Point(segment.coords[0])
-                    end_point = Point(segment.coords[-1])
-
-                    # get the segment(s) of the polygon boundary between the two points
-                    boundary_segment = trace_boundary_part(
-                        polygon_geom.boundary.geoms, start_point, end_point)
-                    if isinstance(boundary_segment, LineString):
-                        reconstructed_segments.append(boundary_segment)
-                    elif isinstance(boundary_segment, MultiLineString):
-                        reconstructed_segments.extend(list(boundary_segment.geoms))
-
-                # add the reconstructed segments to the polygon skeletons
-                polygon_skeletons.extend(reconstructed_segments)
+        def run_p1() -> geopandas.GeoDataFrame:
+            # for each polygon, find the line termini that touch its exterior
+            print('[p1] Finding line termini touching polygon edges...')
+            with stage('p1', input_count=len(initial_polygons)) as record:
+                polygon_entrances = find_polygon_entrances(edges, initial_polygons, entrance_tolerance)
+                record['output_count'] = len(polygon_entrances)
+            return polygon_entrances
+
+        found_entrances = checkpoint('p1', run_p1)
+        polygon_entrances = found_entrances
+
+        def run_p2() -> geopandas.GeoDataFrame:
+            # for each polygon, draw straight lines between pairs of touching nodes
+            print('[p2] Creating edges between touching nodes along polygon edges...')
+            with stage('p2', input_count=len(found_entrances)) as record:
+                polygon_skeletons = create_polygon_skeletons(
+                    initial_polygons, found_entrances, entrance_pairs=entrance_pairs, tolerance=entrance_tolerance)
+                record['output_count'] = len(polygon_skeletons)
+            return polygon_skeletons
+
+        polygon_skeletons = checkpoint('p2', run_p2)
 
         polygon_skeletons_gdf = geopandas.GeoDataFrame(
             columns=edges.columns,
-            geometry=polygon_skeletons,
+            geometry=polygon_skeletons.geometry.to_numpy(),
             crs=intermediate_crs,
         )
         polygon_skeletons_gdf['table_name'] = '__skeletons'
 
+        # record the way id of the polygon that each skeleton edge belongs to
+        if 'way_id' in initial_polygons.columns:
+            polygon_skeletons_gdf['way_id'] = initial_polygons['way_id'].loc[
+                polygon_skeletons['polygon_index']].to_numpy()
+
         # consolidate all edges and re-assign ids
         print('[p4] Consolidating polygon edges with existing edges...')
-        edges = cast(geopandas.GeoDataFrame, pandas.concat(
-            [edges, polygon_skeletons_gdf], ignore_index=True))
-        edges.reset_index(drop=True, inplace=True)
-        edges['edge_id'] = edges.index
+        with stage('p4', input_count=len(edges) + len(polygon_skeletons_gdf)) as record:
+            edges = cast(geopandas.GeoDataFrame, pandas.concat(
+                [edges, polygon_skeletons_gdf], ignore_index=True))
+            edges.reset_index(drop=True, inplace=True)
+            edges['edge_id'] = edges.index
+            record['output_count'] = len(edges)
 
     # ----------------------------------------
 
-    # create nodes (includes duplicates)
+    # create nodes from the edge termini, consolidating termini with the same coordinates
+    # into a single node and recording the start and end node ids on each edge
     print('Creating nodes from edge termini...')
-    nodes = get_line_termini(edges)
-
-    # consolidate by geometry to remove duplicates, but keep track of all associated edge_ids
-    print('Consolidating nodes to remove duplicates...')
-    nodes['geometry_wkt'] = nodes.geometry.apply(lambda geom: geom.wkt)
-    nodes.drop(columns=['type'], inplace=True)
-    nodes = nodes.dissolve(by='geometry_wkt', as_index=False, aggfunc=lambda x: list(x))
-    nodes.drop(columns=['geometry_wkt'], inplace=True)
-    nodes.rename(columns={'edge_id': 'edges'}, inplace=True)
-    nodes['node_id'] = nodes.index
-    nodes.set_index('node_id', inplace=True)
-
-    return {
-        'edges': edges.to_crs(old_crs),
-        'nodes': nodes.to_crs(old_crs),
-        'orphans': orphans.to_crs(old_crs)
+    with stage('nodes', input_count=len(edges)) as record:
+        consolidate_nodes_result = consolidate_nodes(edges, snap_grid=node_snap_grid)
+        edges = consolidate_nodes_result['edges']
+        nodes = consolidate_nodes_result['nodes']
+        record['output_count'] = len(nodes)
+
+    # keep the node of each polygon entrance
+    entrances = None
+    if polygon_entrances is not None:
+        print('Finding the nodes of polygon entrances...')
+        with stage('entrances', input_count=len(polygon_entrances)) as record:
+            entrances = find_entrance_nodes(polygon_entrances, initial_polygons, edges)
+            record['output_count'] = len(entrances)
+
+    # merge the chains of edges through nodes of degree 2 (except for the entrances)
+    edge_mapping = None
+    if contract_degree_two_nodes:
+        print('Contracting chains of edges through nodes of degree 2...')
+        with stage('contract', input_count=len(edges)) as record:
+            contract_chains_result = contract_chains(
+                edges, nodes, attribute_columns=contraction_attributes,
+                kept_node_ids=entrances['node_id'].to_numpy() if entrances is not None else None)
+            print(f'  Removed {len(nodes) - len(contract_chains_result["nodes"])} nodes and '
+                  f'{len(edges) - len(contract_chains_result["edges"])} edges.')
+            edges = contract_chains_result['edges']
+            nodes = contract_chains_result['nodes']
+            edge_mapping = contract_chains_result['edge_mapping']
+            record['output_count'] = len(edges)
+
+    # label the connected components of the edges and handle the small components
+    print('Finding connected components...')
+    with stage('components', input_count=len(edges)) as record:
+        find_components_result = find_components(
+            edges, nodes, min_edges=min_component_edges, min_length=min_component_length,
+            small_components='drop' if drop_small_components else 'error' if no_orphans else 'keep')
+        edges = find_components_result['edges']
+        nodes = find_components_result['nodes']
+        if drop_small_components:
+            small_component_edges = find_components_result['small_component_edges']
+            orphans = cast(geopandas.GeoDataFrame, pandas.concat([
+                orphans,
+                geopandas.GeoDataFrame(geometry=small_component_edges.geometry.to_numpy(), crs=edges.crs),
+            ], ignore_index=True))
+        record['output_count'] = int(nodes['component_id'].nunique())
+    if entrances is not None:
+        entrances = entrances[entrances['node_id'].isin(nodes.index)].reset_index(drop=True)
+
+    # compute the costs of traversing each edge for each profile
+    print('Computing edge costs...')
+    with stage('costs', input_count=len(edges)) as record:
+        edges = compute_edge_costs(edges, DEFAULT_COST_PROFILES if cost_profiles is None else cost_profiles)
+        record['output_count'] = len(edges)
+
+    # (in low-memory mode, the results are reprojected without copying them)
+    to_crs = to_crs_in_place if low_memory else geopandas.GeoDataFrame.to_crs
+    result: EdgesResult = {
+        'edges': to_crs(edges, old_crs),
+        'nodes': to_crs(nodes, old_crs),
+        'orphans': to_crs(orphans, old_crs)
     }
+    if edge_mapping is not None:
+        result['edge_mapping'] = to_crs(edge_mapping, old_crs)
+    if entrances is not None:
+        result['entrances'] = to_crs(entrances, old_crs)
+
+    if low_memory or memory_budget is not None:
+        budget_message = f' (budget: {memory_budget / 1024 ** 2:.0f} MiB)' if memory_budget is not None else ''
+        print(f'Peak memory usage: {get_peak_rss_bytes() / 1024 ** 2:.0f} MiB{budget_message}')
+    return result
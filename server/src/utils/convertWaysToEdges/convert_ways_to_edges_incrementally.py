@@ -0,0 +1,372 @@
+import pickle
+from pathlib import Path
+from typing import Any, Literal, TypedDict, cast
+
+import geopandas
+import numpy
+import pandas
+import shapely
+from pyproj import CRS
+
+from consolidate_nodes import consolidate_nodes
+from contract_chains import contract_chains
+from convert_ways_to_edges import EdgesResult, convert_ways_to_edges, get_noding_grid
+from create_polygon_skeletons import create_polygon_skeletons
+from compute_edge_costs import DEFAULT_COST_PROFILES, CostProfile, compute_edge_costs
+from find_components import find_components
+from find_entrance_nodes import find_entrance_nodes
+from find_parent_lines import find_parent_lines
+from find_polygon_entrances import find_polygon_entrances, get_entrance_tolerance
+from prepare_ways import PrepareWaysResult, prepare_ways
+from stage_report import stage
+
+
+class _IncrementalState(TypedDict):
+    parameters: dict[str, Any]
+    way_hashes: pandas.Series
+    way_geometries: geopandas.GeoSeries
+    edges: geopandas.GeoDataFrame
+    orphans: geopandas.GeoDataFrame
+    next_edge_id: int
+
+
+def _hash_ways(ways: geopandas.GeoDataFrame) -> pandas.Series:
+    """
+    Compute a content hash of the attributes and geometry of each way, indexed by way id.
+    """
+    contents = pandas.DataFrame(ways.drop(columns=ways.geometry.name))
+    contents['__wkb'] = ways.geometry.to_wkb(hex=True)
+    hashes = pandas.util.hash_pandas_object(contents, index=False)
+    hashes.index = pandas.Index(ways['way_id'].to_numpy())
+    return hashes
+
+
+def _find_nearby_ways(ways: geopandas.GeoDataFrame, geometries: numpy.ndarray, distance: float) -> numpy.ndarray:
+    """
+    Find the positions of the ways within a distance of any of the geometries.
+    """
+    if len(geometries) == 0:
+        return numpy.array([], dtype=numpy.int64)
+    return numpy.unique(ways.sindex.query(geometries, predicate='dwithin', distance=distance)[1])
+
+
+def _is_unattributed_near(edges: geopandas.GeoDataFrame, geometries: numpy.ndarray, distance: float) -> numpy.ndarray:
+    """
+    Flag the edges without a way id (e.g., edges that are not within the buffer of any line with
+    buffer attribute transfer) that are within a distance of any of the geometries.
+    """
+    is_near = numpy.zeros(len(edges), dtype=bool)
+    unattributed_positions = numpy.flatnonzero(edges['way_id'].isna().to_numpy())
+    is_near[unattributed_positions[_find_nearby_ways(edges.iloc[unattributed_positions], geometries, distance)]] = True
+    return is_near
+
+
+def _is_skeleton(edges: geopandas.GeoDataFrame) -> pandas.Series:
+    """
+    Flag the edges that were created from polygon skeletons.
+    """
+    if 'table_name' not in edges.columns:
+        return pandas.Series(False, index=edges.index)
+    return edges['table_name'].eq('__skeletons').fillna(False).astype(bool)
+
+
+def _as_prepared(ways: geopandas.GeoDataFrame) -> PrepareWaysResult:
+    """
+    Wrap ways that were already prepared (in the intermediate CRS) so that convert_ways_to_edges
+    does not prepare them again and returns its results in the intermediate CRS.
+    """
+    return {'ways': ways, 'original_crs': cast(CRS, ways.crs), 'repaired_way_ids': [], 'dropped_way_ids': []}
+
+
+def _load_state(state_path: Path) -> _IncrementalState | None:
+    if not state_path.exists():
+        return None
+    with open(state_path, 'rb') as state_file:
+        return cast(_IncrementalState, pickle.load(state_file))
+
+
+def _save_state(state_path: Path, state: _IncrementalState) -> None:
+    # write to a temporary file first so that an interrupted save never corrupts the state
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = state_path.with_name(state_path.name + '.tmp')
+    with open(temporary_path, 'wb') as state_file:
+        pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+    temporary_path.replace(state_path)
+
+
+def convert_ways_to_edges_incrementally(ways: geopandas.GeoDataFrame | Path, state_path: Path, connection_tolerance: float, min_edge_length: float, no_orphans: bool, intermediate_crs: str, *, node_snap_grid: float | None = None, tile_size: float | None = None, attribute_transfer: Literal['buffer', 'lineage'] = 'buffer', entrance_pairs: Literal['all', 'nearest', 'delaunay'] = 'all', min_component_edges: int | None = None, min_component_length: float | None = None, drop_small_components: bool = False, cost_profiles: dict[str, CostProfile] | None = None, remove_duplicate_lines: bool = False, precision_grid: float | None = None, contract_degree_two_nodes: bool = False, contraction_attributes: list[str] | None = None, low_memory: bool = False, memory_budget: int | None = None) -> EdgesResult:
+    """
+    Convert ways to edges like convert_ways_to_edges, but reuse the edges from the previous run
+    for the ways that have not changed.
+
+    A content hash of each way (keyed by `way_id`) is stored in the state file along with the
+    previous edges and orphans. On the next run, only the ways that were added, changed, or
+    deleted and the ways within the connection tolerance of them are converted to edges again.
+    The ways near those ways are included in the conversion as context (so that the rebuilt edges
+    are split and connected the same way as in a full conversion), but their edges are discarded.
+    Edges without a `way_id` are replaced if they are along the rebuilt lines. The skeletons of polygons near the rebuilt edges are also rebuilt.
+
+    Unchanged edges keep their `edge_id`, and rebuilt edges get new ids that have never been used.
+    Node ids and component ids are reassigned, and edge costs are recomputed, on every run. Chains
+    of edges are contracted after the edges are combined, so the stored edges are never contracted.
+
+    The `low_memory` and `memory_budget` options apply to the conversions of the ways to edges
+    (see convert_ways_to_edges). Setting a `tile_size` or a `memory_budget` splits the lines on a
+    0.000001 grid (see get_noding_grid), so the edges are rebuilt when either is set or unset.
+
+    A full conversion is run if there is no state file or if the conversion parameters changed.
+    The `way_id` values must identify the same ways between runs, or every way will be treated
+    as changed.
+    """
+    with stage('prepare_ways') as record:
+        prepare_ways_result = prepare_ways(ways, intermediate_crs)
+        ways = prepare_ways_result['ways']
+        old_crs = prepare_ways_result['original_crs']
+        record['output_count'] = len(ways)
+    if 'way_id' not in ways.columns:
+        raise ValueError('Input ways GeoDataFrame must have a way_id column for incremental conversion.')
+    if not ways['way_id'].is_unique:
+        raise ValueError('Input ways GeoDataFrame must have unique way_id values for incremental conversion.')
+
+    # the parameters that affect the stored edges (the nodes, which are snapped to the
+    # `node_snap_grid`, and everything after them are computed from the stored edges on every run)
+    parameters: dict[str, Any] = {
+        'connection_tolerance': connection_tolerance,
+        'min_edge_length': min_edge_length,
+        'intermediate_crs': intermediate_crs,
+        'attribute_transfer': attribute_transfer,
+        'entrance_pairs': entrance_pairs,
+        'remove_duplicate_lines': remove_duplicate_lines,
+        'precision_grid': precision_grid,
+        'noding_grid': get_noding_grid(tile_size, memory_budget),
+    }
+    entrance_tolerance = get_entrance_tolerance(precision_grid if remove_duplicate_lines else None)
+
+    print('Finding changed ways...')
+    with stage('hash_ways', input_count=len(ways)):
+        way_hashes = _hash_ways(ways)
+        state = _load_state(state_path)
+    if state is not None and state['parameters'] != parameters:
+        print('  The conversion parameters changed since the previous run.')
+        state = None
+
+    if state is None:
+        print('  No reusable previous edges were found. Converting all ways to edges...')
+        with stage('full', input_count=len(ways)):
+            full_result = convert_ways_to_edges(
+                _as_prepared(ways), connection_tolerance, min_edge_length, no_orphans, intermediate_crs, tile_size=tile_size,
+                attribute_transfer=attribute_transfer, entrance_pairs=entrance_pairs, cost_profiles={},
+                remove_duplicate_lines=remove_duplicate_lines, precision_grid=precision_grid,
+                low_memory=low_memory, memory_budget=memory_budget)
+        edges = full_result['edges']
+        if 'edge_id' not in edges.columns:
+            edges = edges.reset_index()
+        edges = edges.drop(columns=['start_vertex', 'end_vertex', 'component_id'])
+        orphans = full_result['orphans']
+        next_edge_id = int(edges['edge_id'].max()) + 1 if not edges.empty else 0
+
+    else:
+        previous_hashes = state['way_hashes']
+        is_new_or_changed = ~way_hashes.index.isin(previous_hashes.index)
+        is_new_or_changed[~is_new_or_changed] = \
+            way_hashes[~is_new_or_changed].to_numpy() != previous_hashes.loc[way_hashes.index[~is_new_or_changed]].to_numpy()
+        changed_way_ids = way_hashes.index[is_new_or_changed]
+        deleted_way_ids = previous_hashes.index[~previous_hashes.index.isin(way_hashes.index)]
+        print(f'  Found {len(changed_way_ids)} new or changed ways and {len(deleted_way_ids)} deleted ways.')
+
+        edges = state['edges']
+        orphans = state['orphans']
+        next_edge_id = state['next_edge_id']
+
+        if len(changed_way_ids) > 0 or len(deleted_way_ids) > 0:
+            way_ids = ways['way_id'].to_numpy()
+            way_geometries = ways.geometry.to_numpy()
+            is_line = ways.geometry.type.isin(['LineString', 'MultiLineString']).to_numpy()
+
+            # find the affected ways: the changed ways and the ways within the connection tolerance of
+            # the new or old geometries of the changed and deleted ways (including the overshoot)
+            distance = connection_tolerance + 0.000001
+            previous_way_geometries = state['way_geometries']
+            seed_geometries = numpy.concatenate([
+                way_geometries[ways['way_id'].isin(changed_way_ids).to_numpy()],
+                previous_way_geometries.to_numpy()[previous_way_geometries.index.isin(
+                    changed_way_ids.union(deleted_way_ids))],
+            ])
+            affected_positions = _find_nearby_ways(ways, seed_geometries, distance)
+
+            # the ways near the affected ways decide where the affected ways are split and connected,
+            # and the ways near those decide where those ways are split and connected
+            context_positions = _find_nearby_ways(ways, way_geometries[affected_positions], distance)
+            outer_context_positions = _find_nearby_ways(ways, way_geometries[context_positions], distance)
+            print(f'  Rebuilding the edges of {len(affected_positions)} affected ways '
+                  f'using {len(outer_context_positions)} nearby ways...')
+
+            affected_line_way_ids = way_ids[affected_positions[is_line[affected_positions]]]
+            rebuilt_polygon_way_ids = way_ids[context_positions[~is_line[context_positions]]]
+            removed_way_ids = numpy.concatenate(
+                [affected_line_way_ids, rebuilt_polygon_way_ids, deleted_way_ids.to_numpy()])
+
+            # the edges without a way id are replaced by their geometry instead: the ones along the
+            # previous geometries of the removed lines or the geometries of the affected lines (within
+            # the precision grid that they may have moved onto)
+            previous_lines = cast(geopandas.GeoSeries, previous_way_geometries[
+                previous_way_geometries.index.isin(removed_way_ids) &
+                previous_way_geometries.type.isin(['LineString', 'MultiLineString'])])
+            replaced_line_geometries = numpy.concatenate([
+                way_geometries[affected_positions[is_line[affected_positions]]], previous_lines.to_numpy()])
+            unattributed_distance = 0.000001 + ((precision_grid or 0.0) if remove_duplicate_lines else 0.0)
+
+            # convert the affected ways and their context to edges, and only keep the edges
+            # of the affected lines
+            new_edges = geopandas.GeoDataFrame(columns=edges.columns, geometry=[], crs=intermediate_crs)
+            new_orphans = geopandas.GeoDataFrame(geometry=[], crs=intermediate_crs)
+            subset = ways.iloc[outer_context_positions]
+            if len(affected_line_way_ids) > 0:
+                with stage('rebuild', input_count=len(subset)):
+                    subset_result = convert_ways_to_edges(
+                        _as_prepared(subset), connection_tolerance, min_edge_length, False, intermediate_crs, tile_size=tile_size,
+                        attribute_transfer=attribute_transfer, entrance_pairs=entrance_pairs, cost_profiles={},
+                        remove_duplicate_lines=remove_duplicate_lines, precision_grid=precision_grid,
+                        low_memory=low_memory, memory_budget=memory_budget)
+                subset_edges = subset_result['edges']
+                new_edges = subset_edges[~_is_skeleton(subset_edges) & (
+                    subset_edges['way_id'].isin(affected_line_way_ids) |
+                    _is_unattributed_near(subset_edges, replaced_line_geometries, unattributed_distance))]
+                new_edges = new_edges.drop(columns=['edge_id', 'start_vertex', 'end_vertex', 'component_id'], errors='ignore')
+                new_edges = new_edges.reset_index(drop=True)
+
+                # only keep the orphans that come from the affected lines
+                subset_orphans = subset_result['orphans']
+                affected_lines = ways.iloc[affected_positions[is_line[affected_positions]]]
+                new_orphans = subset_orphans[find_parent_lines(subset_orphans, affected_lines) >= 0]
+                if len(new_orphans) > 0:
+                    if no_orphans:
+                        raise ValueError(
+                            f'    Found {len(new_orphans)} orphan lines. Cannot proceed with splitting at intersections.')
+                    print(
+                        f'    Warning: Found {len(new_orphans)} orphan lines. Orphan lines indicate connectivity issues in the input data.')
+
+            # remove the previous edges of the affected lines, rebuilt polygons, and deleted ways
+            kept_edges = edges[~(edges['way_id'].isin(removed_way_ids) |
+                                 _is_unattributed_near(edges, replaced_line_geometries, unattributed_distance))]
+            line_edges = cast(geopandas.GeoDataFrame, pandas.concat(
+                [kept_edges[~_is_skeleton(kept_edges)], new_edges], ignore_index=True))
+
+            # rebuild the skeletons of the polygons near the affected ways
+            polygons = ways[ways['way_id'].isin(rebuilt_polygon_way_ids)]
+            if remove_duplicate_lines and precision_grid is not None:
+                polygons = polygons.set_geometry(shapely.set_precision(polygons.geometry.to_numpy(), precision_grid))
+                polygons = polygons[~polygons.is_empty]
+            if not polygons.empty:
+                print(f'  Rebuilding the skeletons of {len(polygons)} polygons...')
+                with stage('skeletons', input_count=len(polygons)) as record:
+                    polygon_entrances = find_polygon_entrances(line_edges, polygons, entrance_tolerance)
+                    polygon_skeletons = create_polygon_skeletons(
+                        polygons, polygon_entrances, entrance_pairs=entrance_pairs, tolerance=entrance_tolerance)
+                    record['output_count'] = len(polygon_skeletons)
+                polygon_skeletons_gdf = geopandas.GeoDataFrame(
+                    columns=line_edges.columns,
+                    geometry=polygon_skeletons.geometry.to_numpy(),
+                    crs=intermediate_crs,
+                )
+                polygon_skeletons_gdf['table_name'] = '__skeletons'
+                polygon_skeletons_gdf['way_id'] = polygons['way_id'].loc[
+                    polygon_skeletons['polygon_index']].to_numpy()
+                new_edges = cast(geopandas.GeoDataFrame, pandas.concat(
+                    [new_edges, polygon_skeletons_gdf], ignore_index=True))
+
+            # give the new edges ids that have never been used
+            new_edges['edge_id'] = numpy.arange(next_edge_id, next_edge_id + len(new_edges))
+            next_edge_id += len(new_edges)
+            print(f'  Replaced {len(edges) - len(kept_edges)} edges with {len(new_edges)} new edges.')
+            edges = cast(geopandas.GeoDataFrame, pandas.concat([kept_edges, new_edges], ignore_index=True))
+
+            # replace the previous orphans of the affected lines and deleted ways
+            orphans = cast(geopandas.GeoDataFrame, pandas.concat([
+                orphans[find_parent_lines(orphans, geopandas.GeoDataFrame(geometry=previous_lines)) < 0],
+                new_orphans,
+            ], ignore_index=True))
+
+    # save the edges and way hashes for the next run
+    print('Saving incremental state...')
+    with stage('save_state', input_count=len(edges)):
+        _save_state(state_path, {
+            'parameters': parameters,
+            'way_hashes': way_hashes,
+            'way_geometries': geopandas.GeoSeries(ways.geometry.to_numpy(), index=way_hashes.index, crs=ways.crs),
+            'edges': edges,
+            'orphans': orphans,
+            'next_edge_id': next_edge_id,
+        })
+
+    # create nodes from the edge termini
+    print('Creating nodes from edge termini...')
+    edges = edges.set_index(pandas.Index(edges['edge_id'].to_numpy()))
+    with stage('nodes', input_count=len(edges)) as record:
+        consolidate_nodes_result = consolidate_nodes(edges, snap_grid=node_snap_grid)
+        edges = consolidate_nodes_result['edges']
+        nodes = consolidate_nodes_result['nodes']
+        record['output_count'] = len(nodes)
+
+    # find the node of each entrance of every polygon (not only the rebuilt ones)
+    entrances = None
+    all_polygons = ways[ways.geometry.type.isin(['Polygon', 'MultiPolygon'])]
+    if remove_duplicate_lines and precision_grid is not None:
+        all_polygons = all_polygons.set_geometry(shapely.set_precision(all_polygons.geometry.to_numpy(), precision_grid))
+        all_polygons = all_polygons[~all_polygons.is_empty]
+    if not all_polygons.empty:
+        print('Finding the nodes of polygon entrances...')
+        with stage('entrances', input_count=len(all_polygons)) as record:
+            polygon_entrances = find_polygon_entrances(edges[~_is_skeleton(edges)], all_polygons, entrance_tolerance)
+            entrances = find_entrance_nodes(polygon_entrances, all_polygons, edges)
+            record['output_count'] = len(entrances)
+
+    # merge the chains of edges through nodes of degree 2 (except for the entrances)
+    edge_mapping = None
+    if contract_degree_two_nodes:
+        print('Contracting chains of edges through nodes of degree 2...')
+        with stage('contract', input_count=len(edges)) as record:
+            contract_chains_result = contract_chains(
+                edges, nodes, attribute_columns=contraction_attributes,
+                kept_node_ids=entrances['node_id'].to_numpy() if entrances is not None else None)
+            print(f'  Removed {len(nodes) - len(contract_chains_result["nodes"])} nodes and '
+                  f'{len(edges) - len(contract_chains_result["edges"])} edges.')
+            edges = contract_chains_result['edges']
+            nodes = contract_chains_result['nodes']
+            edge_mapping = contract_chains_result['edge_mapping']
+            record['output_count'] = len(edges)
+
+    # label the connected components of the edges and handle the small components
+    print('Finding connected components...')
+    with stage('components', input_count=len(edges)) as record:
+        find_components_result = find_components(
+            edges, nodes, min_edges=min_component_edges, min_length=min_component_length,
+            small_components='drop' if drop_small_components else 'error' if no_orphans else 'keep')
+        edges = find_components_result['edges']
+        nodes = find_components_result['nodes']
+        if drop_small_components:
+            small_component_edges = find_components_result['small_component_edges']
+            orphans = cast(geopandas.GeoDataFrame, pandas.concat([
+                orphans,
+                geopandas.GeoDataFrame(geometry=small_component_edges.geometry.to_numpy(), crs=edges.crs),
+            ], ignore_index=True))
+        record['output_count'] = int(nodes['component_id'].nunique())
+    if entrances is not None:
+        entrances = entrances[entrances['node_id'].isin(nodes.index)].reset_index(drop=True)
+
+    # compute the costs of traversing each edge for each profile
+    print('Computing edge costs...')
+    with stage('costs', input_count=len(edges)) as record:
+        edges = compute_edge_costs(edges, DEFAULT_COST_PROFILES if cost_profiles is None else cost_profiles)
+        record['output_count'] = len(edges)
+
+    result: EdgesResult = {
+        'edges': edges.to_crs(old_crs),
+        'nodes': nodes.to_crs(old_crs),
+        'orphans': orphans.to_crs(old_crs)
+    }
+    if edge_mapping is not None:
+        result['edge_mapping'] = edge_mapping.to_crs(old_crs)
+    if entrances is not None:
+        result['entrances'] = entrances.to_crs(old_crs)
+    return result
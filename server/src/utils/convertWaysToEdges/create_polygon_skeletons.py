@@ -0,0 +1,178 @@
+from typing import Literal, cast
+
+import geopandas
+import numpy
+import shapely
+from shapely.geometry import LineString, MultiLineString
+
+from trace_boundary_part import BoundaryIndex
+
+
+def get_entrance_pairs(coords: numpy.ndarray, method: Literal['all', 'nearest', 'delaunay'] = 'all', nearest_k: int = 3) -> numpy.ndarray:
+    """
+    Given the coordinates of the entrances of a polygon, choose the pairs of entrances that should
+    be connected by skeleton lines.
+
+    Methods:
+    - all: every pair of entrances (grows quadratically with the number of entrances)
+    - nearest: each entrance and its k nearest entrances
+    - delaunay: the pairs of entrances that share an edge in the Delaunay triangulation of the entrances
+
+    Returns an array of (a, b) entrance position pairs with a < b, sorted in the same order as
+    itertools.combinations would produce them.
+    """
+    count = len(coords)
+    if method == 'all' or count <= 3 or (method == 'nearest' and nearest_k >= count - 1):
+        return numpy.column_stack(numpy.triu_indices(count, 1))
+
+    if method == 'nearest':
+        pairs = _get_nearest_pairs(coords, nearest_k)
+
+    elif method == 'delaunay':
+        # find the edges of the Delaunay triangulation and map their ends back to the entrances
+        triangulation_edges = shapely.get_parts(shapely.delaunay_triangles(
+            shapely.multipoints(coords), only_edges=True))
+        if len(triangulation_edges) == 0:
+            # the entrances are collinear, so connect each entrance to the next one along the line
+            order = numpy.lexsort((coords[:, 1], coords[:, 0]))
+            pairs = numpy.column_stack([order[:-1], order[1:]])
+        else:
+            positions_by_coords = {tuple(coord): position for position, coord in enumerate(coords.tolist())}
+            edge_coords = shapely.get_coordinates(triangulation_edges).reshape(-1, 2, 2)
+            pairs = numpy.array([[positions_by_coords[tuple(start)], positions_by_coords[tuple(end)]]
+                                 for start, end in edge_coords.tolist()], dtype=numpy.int64)
+
+    else:
+        raise ValueError(f'Unknown entrance pair method: {method}')
+
+    # remove duplicate pairs and sort them like itertools.combinations
+    pairs = numpy.unique(numpy.sort(pairs, axis=1), axis=0)
+    return pairs
+
+
+def _get_nearest_pairs(coords: numpy.ndarray, k: int) -> numpy.ndarray:
+    """
+    Find the k nearest other entrances of each entrance (with ties resolved in favor of the
+    entrance that comes first) with queries of a spatial index.
+
+    Each entrance is queried within a radius that doubles until at least k other entrances are
+    within it, starting from the radius that would hold about k entrances if the entrances were
+    spread evenly over their extent.
+    """
+    count = len(coords)
+    points = cast(numpy.ndarray, shapely.points(coords))
+    tree = shapely.STRtree(points)
+    radius = float(numpy.ptp(coords, axis=0).max()) * (k / count) ** 0.5
+
+    pending_positions = numpy.arange(count)
+    sources: list[numpy.ndarray] = []
+    targets: list[numpy.ndarray] = []
+    while len(pending_positions) > 0:
+        query_positions, target_positions = tree.query(
+            points[pending_positions], predicate='dwithin', distance=radius)
+        source_positions = pending_positions[query_positions]
+        other = source_positions != target_positions
+        source_positions = source_positions[other]
+        target_positions = target_positions[other]
+
+        # keep the candidates of the entrances with enough of them and query the others again
+        is_done = numpy.bincount(source_positions, minlength=count) >= k
+        done = is_done[source_positions]
+        sources.append(source_positions[done])
+        targets.append(target_positions[done])
+        pending_positions = pending_positions[~is_done[pending_positions]]
+        radius *= 2
+
+    # keep the k nearest candidates of each entrance
+    source_positions = numpy.concatenate(sources)
+    target_positions = numpy.concatenate(targets)
+    deltas = coords[source_positions] - coords[target_positions]
+    distances = numpy.hypot(deltas[:, 0], deltas[:, 1])
+    order = numpy.lexsort((target_positions, distances, source_positions))
+    source_positions = source_positions[order]
+    ranks = numpy.arange(len(order)) - numpy.searchsorted(source_positions, source_positions)
+    nearest = ranks < k
+    return numpy.column_stack([source_positions[nearest], target_positions[order][nearest]])
+
+
+def create_polygon_skeletons(polygons: geopandas.GeoDataFrame, entrances: geopandas.GeoDataFrame, *, entrance_pairs: Literal['all', 'nearest', 'delaunay'] = 'all', nearest_k: int = 3, tolerance: float = 0.000001) -> geopandas.GeoDataFrame:
+    """
+    Given polygons and their entrances (see find_polygon_entrances), connect pairs of entrances of
+    each polygon with straight lines. The portions of those lines that are outside the polygon are
+    replaced with the portion of the polygon boundary between their ends.
+
+    The pairs of entrances that are connected are chosen by `entrance_pairs` (see get_entrance_pairs).
+    The boundary between two entrances is traced from the ring that both are within the `tolerance`
+    of (which should be the tolerance that the entrances were found with).
+
+    Returns a GeoDataFrame of the skeleton lines with the index label of the polygon to which
+    each line belongs (`polygon_index`).
+    """
+    polygon_skeletons: list[LineString] = []
+    skeleton_polygon_indexes: list = []
+    for polygon_index, polygon_entrances in entrances.groupby('polygon_index', sort=False):
+        if len(polygon_entrances) < 2:
+            continue
+        polygon_geom = polygons.geometry.loc[polygon_index]
+        polygon_boundary = polygon_geom.boundary
+        polygon_boundary_parts = list(shapely.get_parts(polygon_boundary))
+        shapely.prepare(polygon_geom)
+        shapely.prepare(polygon_boundary)
+
+        # create lines between each pair of touching points
+        coords = shapely.get_coordinates(polygon_entrances.geometry.to_numpy())
+        pairs = get_entrance_pairs(coords, entrance_pairs, nearest_k)
+        pair_lines = cast(numpy.ndarray, shapely.linestrings(
+            numpy.stack([coords[pairs[:, 0]], coords[pairs[:, 1]]], axis=1)))
+
+        # split the lines by the polygon boundary (lines that overlap the boundary cannot be split,
+        # so their overlapping portions are kept as-is because they already follow the boundary)
+        overlaps_boundary = shapely.relate_pattern(polygon_boundary, pair_lines, '1********')
+        split_segments, split_pair_positions = shapely.get_parts(
+            shapely.difference(pair_lines, polygon_boundary), return_index=True)
+        overlapping_segments, overlapping_pair_positions = shapely.get_parts(
+            shapely.intersection(pair_lines[overlaps_boundary], polygon_boundary), return_index=True)
+        segments = numpy.concatenate([split_segments, overlapping_segments])
+        segment_pair_positions = numpy.concatenate([
+            split_pair_positions, numpy.flatnonzero(overlaps_boundary)[overlapping_pair_positions]])
+        is_overlapping = numpy.arange(len(segments)) >= len(split_segments)
+
+        # only keep line segments (lines that are entirely on the boundary leave empty segments,
+        # and overlaps can also produce points)
+        is_line = (shapely.get_type_id(segments) == shapely.GeometryType.LINESTRING) & ~shapely.is_empty(segments)
+        segments = segments[is_line]
+        segment_pair_positions = segment_pair_positions[is_line]
+        is_overlapping = is_overlapping[is_line]
+
+        # flag each segment of the split lines by whether its midpoint is within the polygon
+        midpoints = shapely.line_interpolate_point(segments, 0.5, normalized=True)
+        is_within = shapely.contains(polygon_geom, midpoints) | is_overlapping
+
+        # keep the segments within the polygon, and replace each segment that is outside
+        # the polygon with the portion of the polygon boundary between its endpoints
+        # (traced in a single batch with an index of the polygon's boundary rings)
+        order = numpy.argsort(segment_pair_positions, kind='stable')
+        outside_positions = order[~is_within[order]]
+        boundary_segments = BoundaryIndex(polygon_boundary_parts, tolerance=tolerance).trace(
+            shapely.get_point(segments[outside_positions], 0), shapely.get_point(segments[outside_positions], -1))
+        boundary_segments_by_position = dict(zip(outside_positions.tolist(), boundary_segments))
+        for segment_position in order.tolist():
+            if is_within[segment_position]:
+                polygon_skeletons.append(segments[segment_position])
+                skeleton_polygon_indexes.append(polygon_index)
+                continue
+
+            # get the segment(s) of the polygon boundary between the two points
+            boundary_segment = boundary_segments_by_position[segment_position]
+            if isinstance(boundary_segment, LineString):
+                polygon_skeletons.append(boundary_segment)
+                skeleton_polygon_indexes.append(polygon_index)
+            elif isinstance(boundary_segment, MultiLineString):
+                polygon_skeletons.extend(list(boundary_segment.geoms))
+                skeleton_polygon_indexes.extend([polygon_index] * len(boundary_segment.geoms))
+
+    return geopandas.GeoDataFrame(
+        {'polygon_index': skeleton_polygon_indexes},
+        geometry=polygon_skeletons,
+        crs=polygons.crs,
+    )
@@ -0,0 +1,89 @@
+from typing import TypedDict
+
+import geopandas
+import numpy
+import pandas
+import shapely
+
+
+class DeduplicateLinesResult(TypedDict):
+    lines: geopandas.GeoDataFrame
+    removed_line_count: int
+    removed_vertex_count: int
+
+
+def deduplicate_lines(lines: geopandas.GeoDataFrame, *, precision: float | None = None) -> DeduplicateLinesResult:
+    """
+    Given a GeoDataFrame of LineStrings, remove the lines that would only add work (and tiny edges)
+    to noding: exact duplicates (in either direction) and lines that are fully covered by another line.
+
+    If a precision is specified, the coordinates are first snapped to a grid of that size (in the
+    units of the lines' CRS), which merges vertices that are nearly identical and turns lines that
+    differ only by such vertices into duplicates. Lines that collapse to nothing are removed.
+
+    Each removed line is merged into the line that is kept in its place: the kept line's missing
+    attribute values are filled from the removed lines, in the order of the lines GeoDataFrame.
+    When duplicate lines cover each other, the first one is kept.
+
+    Returns the remaining lines (with their original index labels) and the number of lines and
+    vertices that were removed.
+    """
+    geometries = lines.geometry.to_numpy()
+    vertex_count = int(shapely.get_num_coordinates(geometries).sum())
+
+    # snap the coordinates to the precision grid and remove the collapsed lines
+    if precision is not None:
+        geometries = shapely.set_precision(geometries, precision)
+    is_kept = ~shapely.is_empty(geometries)
+    positions = numpy.flatnonzero(is_kept)
+
+    # group exact duplicates in a hash table of their normalized geometries (which orients every
+    # line the same way) and map each duplicate to the first line of its group
+    group_ids, _ = pandas.factorize(shapely.to_wkb(shapely.normalize(geometries[positions])))
+    _, first_positions = numpy.unique(group_ids, return_index=True)
+    duplicate_keepers = first_positions[group_ids]
+    unique_positions = numpy.flatnonzero(duplicate_keepers == numpy.arange(len(positions)))
+
+    # find the lines that are covered by another line with a single spatial index query,
+    # ignoring the lines that cover each other except for the first one
+    unique_geometries = geometries[positions[unique_positions]]
+    covered, covering = shapely.STRtree(unique_geometries).query(unique_geometries, predicate='covered_by')
+    is_other = covered != covering
+    covered, covering = covered[is_other], covering[is_other]
+    pair_codes = covered * len(unique_geometries) + covering
+    is_mutual = numpy.isin(covering * len(unique_geometries) + covered, pair_codes)
+    is_dominated = ~is_mutual | (covering < covered)
+    covered, covering = covered[is_dominated], covering[is_dominated]
+
+    # map each covered line to the first covering line that is kept (every covered line is also
+    # covered by a kept line, because the lines that cover it are covered by the kept lines)
+    is_unique_kept = numpy.ones(len(unique_geometries), dtype=bool)
+    is_unique_kept[covered] = False
+    is_kept_covering = is_unique_kept[covering]
+    order = numpy.lexsort((covering[is_kept_covering], covered[is_kept_covering]))
+    covered_lines, first = numpy.unique(covered[is_kept_covering][order], return_index=True)
+    cover_keepers = numpy.arange(len(unique_geometries))
+    cover_keepers[covered_lines] = covering[is_kept_covering][order][first]
+
+    # combine both mappings into the position of the kept line of each remaining line
+    unique_group_positions = numpy.full(len(positions), -1, dtype=numpy.int64)
+    unique_group_positions[unique_positions] = numpy.arange(len(unique_positions))
+    keepers = unique_positions[cover_keepers[unique_group_positions[duplicate_keepers]]]
+    kept_positions = positions[numpy.unique(keepers)]
+
+    deduplicated_lines = lines.iloc[kept_positions].copy()
+    deduplicated_lines.geometry = geometries[kept_positions]
+
+    # fill the missing attributes of the kept lines from the lines merged into them
+    if len(kept_positions) < len(positions):
+        attributes = pandas.DataFrame(lines.drop(columns=lines.geometry.name)).iloc[positions]
+        merged_attributes = attributes.groupby(positions[keepers], sort=True).first()
+        merged_attributes.index = deduplicated_lines.index
+        for column in merged_attributes.columns:
+            deduplicated_lines[column] = merged_attributes[column]
+
+    return {
+        'lines': deduplicated_lines,
+        'removed_line_count': len(lines) - len(deduplicated_lines),
+        'removed_vertex_count': vertex_count - int(shapely.get_num_coordinates(deduplicated_lines.geometry.to_numpy()).sum()),
+    }
@@ -0,0 +1,64 @@
+"""
+Look up the cost between two polygons in a distance matrix that was exported by
+export_distance_matrix without routing.
+
+Example:
+    python distance_matrix.py path/to/graph 12 345
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any
+
+import numpy
+
+from export_distance_matrix import DISTANCE_MATRIX_FORMAT_VERSION
+
+
+class DistanceMatrix:
+    """
+    The costs between every pair of polygons, memory-mapped from the arrays written by
+    export_distance_matrix so that each lookup only reads a single value of the matrix.
+    """
+
+    def __init__(self, graph_dir: Path):
+        metadata = json.loads((graph_dir / 'distance_matrix.json').read_text(encoding='utf-8'))
+        if metadata['format_version'] != DISTANCE_MATRIX_FORMAT_VERSION:
+            raise ValueError(f'Unsupported distance matrix format version: {metadata["format_version"]}')
+        self.cost_profile: str = metadata['cost_profile']
+
+        self.matrix = numpy.load(graph_dir / 'distance_matrix.npy', mmap_mode='r')
+        polygon_ids = numpy.load(graph_dir / 'distance_matrix_polygon_ids.npy')
+        self.polygon_positions: dict[Any, int] = {polygon_id: position for position, polygon_id in enumerate(polygon_ids.tolist())}
+
+    def get_polygon_position(self, polygon_id: Any) -> int:
+        if polygon_id not in self.polygon_positions:
+            raise KeyError(f'Polygon not found in distance matrix: {polygon_id}')
+        return self.polygon_positions[polygon_id]
+
+    def get_cost(self, source_polygon_id: Any, target_polygon_id: Any) -> float | None:
+        """
+        Get the cost of the cheapest path from the source polygon to the target polygon.
+        Returns None if the target cannot be reached.
+        """
+        cost = float(self.matrix[self.get_polygon_position(source_polygon_id),
+                                 self.get_polygon_position(target_polygon_id)])
+        return cost if numpy.isfinite(cost) else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Look up the cost between two polygons in an exported distance matrix.')
+    parser.add_argument('graph_dir', type=Path, help='The directory of the exported routing graph and distance matrix.')
+    parser.add_argument('source', help='The id of the source polygon.')
+    parser.add_argument('target', help='The id of the target polygon.')
+    args = parser.parse_args()
+
+    matrix = DistanceMatrix(args.graph_dir)
+    # the ids are numbers unless they were exported as strings
+    id_type = str if any(isinstance(polygon_id, str) for polygon_id in matrix.polygon_positions) else int
+    print(json.dumps(matrix.get_cost(id_type(args.source), id_type(args.target))))
+
+
+if __name__ == '__main__':
+    main()
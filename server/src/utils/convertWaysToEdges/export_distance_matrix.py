@@ -0,0 +1,98 @@
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy
+
+from convert_ways_to_edges import EdgesResult
+from export_graph import save_array
+from routing_graph import RoutingGraph
+
+DISTANCE_MATRIX_FORMAT_VERSION = 1
+
+
+def _compute_rows(graph_dir: Path, entrance_node_ids: numpy.ndarray, polygon_offsets: numpy.ndarray, polygon_positions: range) -> numpy.ndarray:
+    """
+    Compute the rows of the distance matrix for a range of polygons, with one multi-source Dijkstra
+    from all entrances of each polygon to the entrances of every polygon.
+    """
+    graph = RoutingGraph(graph_dir)
+    target_node_ids = entrance_node_ids.tolist()
+    rows = numpy.empty((len(polygon_positions), len(polygon_offsets) - 1), dtype=numpy.float32)
+    for row, polygon_position in enumerate(polygon_positions):
+        source_node_ids = target_node_ids[polygon_offsets[polygon_position]:polygon_offsets[polygon_position + 1]]
+        costs = graph.shortest_costs(source_node_ids, target_node_ids)
+        # the distance to each polygon is the cost to its nearest entrance
+        rows[row] = numpy.minimum.reduceat(costs, polygon_offsets[:-1])
+    return rows
+
+
+def export_distance_matrix(result: EdgesResult, graph_dir: Path, *, max_workers: int | None = None) -> Path:
+    """
+    Compute the cost of the cheapest path between every pair of polygons (e.g., buildings) over a
+    routing graph that was exported from the same result by export_graph, and save it next to the
+    graph so that building-to-building queries are lookups (see distance_matrix.py):
+
+    - distance_matrix.npy: the costs as float32, with a row for each source polygon and a column
+      for each target polygon (infinite if the target cannot be reached)
+    - distance_matrix_polygon_ids.npy: the id of the polygon of each row and column (only the
+      polygons with entrances are included)
+    - distance_matrix.json: the cost profile of the graph and the number of polygons
+
+    The cost between two polygons is the cost from the nearest entrance of the source to the
+    nearest entrance of the target (see find_entrance_nodes), so each row is computed with a single
+    Dijkstra from all entrances of its polygon. The rows are computed in parallel processes that
+    memory-map the same graph (in up to `max_workers` processes, by default one per CPU).
+
+    Returns the path of the matrix metadata.
+    """
+    graph_metadata = json.loads((graph_dir / 'graph.json').read_text(encoding='utf-8'))
+
+    # group the entrances by polygon
+    entrance_node_ids = numpy.array([], dtype=numpy.int64)
+    polygon_ids = numpy.array([], dtype=numpy.int64)
+    polygon_offsets = numpy.zeros(1, dtype=numpy.int64)
+    if 'entrances' in result and not result['entrances'].empty:
+        entrances = result['entrances']
+        codes, unique_polygon_ids = entrances['polygon_id'].factorize()
+        order = numpy.argsort(codes, kind='stable')
+        entrance_node_ids = entrances['node_id'].to_numpy(dtype=numpy.int64)[order]
+        # (ids that are not numbers are stored as strings so that the array can be memory-mapped)
+        polygon_ids = numpy.asarray(unique_polygon_ids)
+        if polygon_ids.dtype == object:
+            polygon_ids = polygon_ids.astype(str)
+        polygon_offsets = numpy.zeros(len(polygon_ids) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(codes, minlength=len(polygon_ids)), out=polygon_offsets[1:])
+
+    # compute the rows in chunks, in parallel if there is more than one chunk (in spawned processes,
+    # see node_lines_tiled)
+    workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(math.ceil(len(polygon_ids) / (workers * 4)), 1)
+    chunks = [range(start, min(start + chunk_size, len(polygon_ids))) for start in range(0, len(polygon_ids), chunk_size)]
+    print(f'  Computing the distances between {len(polygon_ids)} polygons with {len(entrance_node_ids)} entrances...')
+    if len(chunks) <= 1 or workers == 1:
+        row_chunks = [_compute_rows(graph_dir, entrance_node_ids, polygon_offsets, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_compute_rows, graph_dir, entrance_node_ids, polygon_offsets, chunk)
+                       for chunk in chunks]
+            row_chunks = [future.result() for future in futures]
+    matrix = numpy.concatenate(row_chunks) if row_chunks else numpy.empty((0, 0), dtype=numpy.float32)
+
+    # remove the metadata first and write it last so that distance_matrix.json only exists when
+    # both arrays are from the same export
+    metadata_path = graph_dir / 'distance_matrix.json'
+    metadata_path.unlink(missing_ok=True)
+    save_array(graph_dir / 'distance_matrix.npy', matrix)
+    save_array(graph_dir / 'distance_matrix_polygon_ids.npy', polygon_ids)
+    metadata_path.write_text(json.dumps({
+        'format_version': DISTANCE_MATRIX_FORMAT_VERSION,
+        'cost_profile': graph_metadata['cost_profile'],
+        'polygon_count': len(polygon_ids),
+        'entrance_count': len(entrance_node_ids),
+    }, indent=2), encoding='utf-8')
+
+    return metadata_path
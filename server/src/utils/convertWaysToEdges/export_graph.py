@@ -0,0 +1,120 @@
+import json
+from pathlib import Path
+
+import numpy
+import shapely
+
+from convert_ways_to_edges import EdgesResult
+
+GRAPH_FORMAT_VERSION = 2
+
+
+def save_array(path: Path, array: numpy.ndarray) -> None:
+    # replace the file instead of overwriting it so that processes that have memory-mapped the
+    # previous array keep reading the previous file
+    temporary_path = path.with_name(path.name + '.tmp')
+    with open(temporary_path, 'wb') as array_file:
+        numpy.save(array_file, array)
+    temporary_path.replace(path)
+
+
+def export_graph(result: EdgesResult, graph_dir: Path, cost_crs: str, *, cost_profile: str = 'distance') -> Path:
+    """
+    Export the edges and nodes from a conversion as a compact directed graph of NumPy arrays
+    that can be memory-mapped by RoutingGraph (see routing_graph.py):
+
+    - node_ids.npy: the sorted node ids
+    - node_coordinates.npy: the XY coordinates of each node in the cost CRS
+    - indptr.npy: the CSR row offsets into the arc arrays for each node position
+    - arc_targets.npy, arc_costs.npy, arc_edge_ids.npy: the target node position, cost, and
+      edge id of each arc
+    - edge_ids.npy, edge_coordinates.npy, edge_coordinate_offsets.npy: the id and the
+      coordinates (in the cost CRS) of each LineString edge, for snapping points onto the edges
+      (see snap_index.py)
+    - graph.json: the CRS, counts, and the scale of the A* heuristic
+
+    Each edge becomes an arc from its start vertex to its end vertex with the `cost__{profile}`
+    of the edge for the cost profile, and an arc in the opposite direction with its
+    `reverse_cost__{profile}` (see compute_edge_costs). A negative cost means that the edge cannot
+    be traversed in that direction. If the edges do not have the cost columns, both costs are the
+    length of the edge in the cost CRS (which should be a projected CRS).
+
+    Returns the graph directory.
+    """
+    edges = result['edges'].to_crs(cost_crs)
+    nodes = result['nodes'].to_crs(cost_crs)
+
+    # sort the nodes by id so that node ids can be mapped to positions with a binary search
+    node_ids = nodes.index.to_numpy(dtype=numpy.int64)
+    node_order = numpy.argsort(node_ids, kind='stable')
+    node_ids = node_ids[node_order]
+    node_coordinates = shapely.get_coordinates(nodes.geometry.to_numpy()[node_order])
+
+    # only edges with both vertices can be routed over
+    has_vertices = (edges['start_vertex'].notna() & edges['end_vertex'].notna()).to_numpy()
+    edges = edges[has_vertices]
+    start_positions = numpy.searchsorted(node_ids, edges['start_vertex'].to_numpy(dtype=numpy.int64))
+    end_positions = numpy.searchsorted(node_ids, edges['end_vertex'].to_numpy(dtype=numpy.int64))
+    edge_ids = (edges['edge_id'] if 'edge_id' in edges.columns else edges.index.to_series()).to_numpy(dtype=numpy.int64)
+
+    lengths = edges.geometry.length.to_numpy()
+    cost_column, reverse_cost_column = f'cost__{cost_profile}', f'reverse_cost__{cost_profile}'
+    costs = edges[cost_column].to_numpy(dtype=float) if cost_column in edges.columns else lengths
+    reverse_costs = edges[reverse_cost_column].to_numpy(dtype=float) \
+        if reverse_cost_column in edges.columns else lengths
+
+    # create an arc for each traversable direction of each edge
+    sources = numpy.concatenate([start_positions, end_positions])
+    targets = numpy.concatenate([end_positions, start_positions])
+    arc_costs = numpy.concatenate([costs, reverse_costs])
+    arc_edge_ids = numpy.concatenate([edge_ids, edge_ids])
+    is_traversable = ~numpy.isnan(arc_costs) & (arc_costs >= 0)
+    sources, targets = sources[is_traversable], targets[is_traversable]
+    arc_costs, arc_edge_ids = arc_costs[is_traversable], arc_edge_ids[is_traversable]
+
+    # sort the arcs by source node to build the CSR offsets
+    arc_order = numpy.argsort(sources, kind='stable')
+    sources, targets = sources[arc_order], targets[arc_order]
+    arc_costs, arc_edge_ids = arc_costs[arc_order], arc_edge_ids[arc_order]
+    indptr = numpy.zeros(len(node_ids) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+
+    # the A* heuristic is the straight-line distance to the target scaled by the smallest ratio
+    # of arc cost to straight-line arc distance, which never overestimates the remaining cost
+    arc_distances = numpy.hypot(*(node_coordinates[targets] - node_coordinates[sources]).T)
+    has_distance = arc_distances > 0
+    heuristic_scale = float(numpy.min(arc_costs[has_distance] / arc_distances[has_distance])) \
+        if has_distance.any() else 0.0
+
+    # store the edge geometries as flat coordinate arrays so that they can be memory-mapped
+    is_line = edges.geometry.geom_type.eq('LineString').to_numpy()
+    edge_coordinates, coordinate_line_positions = shapely.get_coordinates(
+        edges.geometry.to_numpy()[is_line], return_index=True)
+    edge_coordinate_offsets = numpy.zeros(is_line.sum() + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(coordinate_line_positions, minlength=is_line.sum()),
+                 out=edge_coordinate_offsets[1:])
+
+    # remove the metadata first and write it last so that graph.json only exists when all arrays
+    # are from the same export
+    graph_dir.mkdir(parents=True, exist_ok=True)
+    (graph_dir / 'graph.json').unlink(missing_ok=True)
+    save_array(graph_dir / 'node_ids.npy', node_ids)
+    save_array(graph_dir / 'node_coordinates.npy', node_coordinates)
+    save_array(graph_dir / 'indptr.npy', indptr)
+    save_array(graph_dir / 'arc_targets.npy', targets.astype(numpy.int64))
+    save_array(graph_dir / 'arc_costs.npy', arc_costs.astype(numpy.float64))
+    save_array(graph_dir / 'arc_edge_ids.npy', arc_edge_ids)
+    save_array(graph_dir / 'edge_ids.npy', edge_ids[is_line])
+    save_array(graph_dir / 'edge_coordinates.npy', edge_coordinates)
+    save_array(graph_dir / 'edge_coordinate_offsets.npy', edge_coordinate_offsets)
+    (graph_dir / 'graph.json').write_text(json.dumps({
+        'format_version': GRAPH_FORMAT_VERSION,
+        'crs': cost_crs,
+        'cost_profile': cost_profile,
+        'node_count': len(node_ids),
+        'arc_count': len(targets),
+        'edge_count': int(is_line.sum()),
+        'heuristic_scale': max(heuristic_scale, 0.0),
+    }, indent=2), encoding='utf-8')
+
+    return graph_dir
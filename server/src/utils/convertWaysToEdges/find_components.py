@@ -0,0 +1,107 @@
+from typing import Literal, TypedDict
+
+import geopandas
+import numpy
+import pandas
+
+
+class FindComponentsResult(TypedDict):
+    edges: geopandas.GeoDataFrame
+    nodes: geopandas.GeoDataFrame
+    small_component_edges: geopandas.GeoDataFrame
+
+
+def label_components(start_nodes: numpy.ndarray, end_nodes: numpy.ndarray, node_count: int) -> numpy.ndarray:
+    """
+    Label the connected components of a graph given the start and end node positions of its
+    edges. Returns the component label of each node (the smallest node position in its component).
+
+    This is a vectorized union-find: in each round, the root of the larger label of every edge is
+    hooked onto the smaller label, and then all paths are compressed with pointer jumping.
+    """
+    labels = numpy.arange(node_count)
+    while True:
+        start_labels = labels[start_nodes]
+        end_labels = labels[end_nodes]
+        is_unmerged = start_labels != end_labels
+        if not is_unmerged.any():
+            return labels
+
+        # hook the larger root onto the smaller root
+        numpy.minimum.at(labels, numpy.maximum(start_labels, end_labels)[is_unmerged],
+                         numpy.minimum(start_labels, end_labels)[is_unmerged])
+
+        # point every node directly at its root
+        while True:
+            root_labels = labels[labels]
+            if numpy.array_equal(root_labels, labels):
+                break
+            labels = root_labels
+
+
+def find_components(edges: geopandas.GeoDataFrame, nodes: geopandas.GeoDataFrame, *, min_edges: int | None = None, min_length: float | None = None, small_components: Literal['keep', 'drop', 'error'] = 'keep') -> FindComponentsResult:
+    """
+    Given edges with `start_vertex` and `end_vertex` columns and their nodes (see consolidate_nodes),
+    find the connected components of the edge graph and record them in a `component_id` column on
+    both the edges and the nodes. Components are numbered from largest to smallest by their number
+    of edges, so the main network is component 0.
+
+    Components with fewer than `min_edges` edges or a total edge length shorter than `min_length`
+    (in the units of the edges' CRS) are small. They typically indicate islands of paths (e.g., an
+    unlinked courtyard) that cannot be reached from the main network. Small components are kept
+    with a warning, dropped (with their nodes), or raise an error, depending on `small_components`.
+    The edges of small components are also returned in `small_component_edges`.
+    """
+    # map the node ids to positions
+    node_positions = pandas.Series(numpy.arange(len(nodes)), index=nodes.index)
+    has_vertices = edges['start_vertex'].notna().to_numpy() & edges['end_vertex'].notna().to_numpy()
+    start_nodes = node_positions.loc[edges['start_vertex'][has_vertices].astype('int64')].to_numpy()
+    end_nodes = node_positions.loc[edges['end_vertex'][has_vertices].astype('int64')].to_numpy()
+
+    node_labels = label_components(start_nodes, end_nodes, len(nodes))
+    edge_labels = node_labels[start_nodes]
+
+    # number the components by their number of edges (largest first); nodes without edges
+    # are their own components
+    edge_counts = numpy.bincount(edge_labels, minlength=len(nodes))
+    lengths = numpy.bincount(edge_labels, weights=edges.geometry.length.to_numpy()[has_vertices],
+                             minlength=len(nodes))
+    roots = numpy.flatnonzero(node_labels == numpy.arange(len(nodes)))
+    roots = roots[numpy.argsort(-edge_counts[roots], kind='stable')]
+    component_ids = numpy.empty(len(nodes), dtype=numpy.int64)
+    component_ids[roots] = numpy.arange(len(roots))
+
+    nodes = nodes.copy()
+    nodes['component_id'] = component_ids[node_labels]
+    edges = edges.copy()
+    edge_component_ids = pandas.array(numpy.zeros(len(edges), dtype=numpy.int64), dtype='Int64')
+    edge_component_ids[has_vertices] = component_ids[edge_labels]
+    edge_component_ids[~has_vertices] = pandas.NA
+    edges['component_id'] = edge_component_ids
+
+    # find the components that are below the thresholds
+    is_small = numpy.zeros(len(roots), dtype=bool)
+    if min_edges is not None:
+        is_small |= edge_counts[roots] < min_edges
+    if min_length is not None:
+        is_small |= lengths[roots] < min_length
+
+    small_component_ids = numpy.flatnonzero(is_small)
+    is_small_edge = edges['component_id'].isin(small_component_ids).to_numpy(dtype=bool, na_value=False)
+    small_component_edges = edges[is_small_edge]
+    if len(small_component_ids) > 0:
+        message = f'Found {len(small_component_ids)} small components with {len(small_component_edges)} edges.'
+        if small_components == 'error':
+            raise ValueError(f'    {message} Small components indicate connectivity issues in the input data.')
+        elif small_components == 'drop':
+            print(f'    {message} Dropping them...')
+            edges = edges[~is_small_edge]
+            nodes = nodes[~nodes['component_id'].isin(small_component_ids)]
+        else:
+            print(f'    Warning: {message} Small components indicate connectivity issues in the input data.')
+
+    return {
+        'edges': edges,
+        'nodes': nodes,
+        'small_component_edges': small_component_edges,
+    }
@@ -0,0 +1,49 @@
+import geopandas
+import numpy
+import pandas
+import shapely
+
+from get_line_termini import get_line_termini_coordinates
+
+
+def find_entrance_nodes(entrances: geopandas.GeoDataFrame, polygons: geopandas.GeoDataFrame, edges: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
+    """
+    Given the entrances of polygons (see find_polygon_entrances), the polygons, and the edges with
+    `start_vertex` and `end_vertex` columns (see consolidate_nodes), find the node of each entrance.
+
+    The entrances are edge termini, so each one is matched to the node of the edge terminus with
+    the same coordinates (which also works when the nodes were snapped to a grid).
+
+    Returns a GeoDataFrame with the `polygon_id` (the `way_id` of the polygon, or its index label if
+    the polygons have no `way_id` column) and the `node_id` of each entrance, ordered by polygon.
+    Entrances without a node are left out, and each node is only included once per polygon.
+    """
+    # collect the coordinates and node ids of every edge terminus
+    termini = get_line_termini_coordinates(edges)
+    has_termini = termini['has_termini']
+    terminus_nodes = pandas.DataFrame({
+        'x': numpy.concatenate([termini['start'][has_termini, 0], termini['end'][has_termini, 0]]),
+        'y': numpy.concatenate([termini['start'][has_termini, 1], termini['end'][has_termini, 1]]),
+        'node_id': numpy.concatenate([
+            edges['start_vertex'].to_numpy()[has_termini], edges['end_vertex'].to_numpy()[has_termini]]),
+    }).dropna().drop_duplicates(['x', 'y'])
+
+    # match the entrances to the termini by their exact coordinates
+    polygon_ids = polygons['way_id'] if 'way_id' in polygons.columns else polygons.index.to_series()
+    coordinates = shapely.get_coordinates(entrances.geometry.to_numpy())
+    entrance_nodes = pandas.DataFrame({
+        'polygon_id': polygon_ids.loc[entrances['polygon_index']].to_numpy(),
+        'x': coordinates[:, 0],
+        'y': coordinates[:, 1],
+        'position': numpy.arange(len(entrances)),
+    }).merge(terminus_nodes, on=['x', 'y'], how='inner').sort_values('position', kind='stable')
+    entrance_nodes = entrance_nodes.drop_duplicates(['polygon_id', 'node_id'])
+
+    return geopandas.GeoDataFrame(
+        {
+            'polygon_id': entrance_nodes['polygon_id'].to_numpy(),
+            'node_id': entrance_nodes['node_id'].to_numpy(dtype=numpy.int64),
+        },
+        geometry=entrances.geometry.to_numpy()[entrance_nodes['position'].to_numpy()],
+        crs=entrances.crs,
+    )
@@ -1,26 +1,23 @@
-from collections import Counter
-
+import numpy
+import shapely
 from shapely import LineString, MultiLineString
 
 
 def find_orphan_lines(multiline: MultiLineString) -> list[LineString]:
-    lines = list(multiline.geoms)
-    endpoints = []
+    lines = shapely.get_parts(multiline)
+    if len(lines) == 0:
+        return []
 
-    # collect start and end points of all lines
-    for line in lines:
-        coords = list(line.coords)
-        endpoints.append(coords[0])
-        endpoints.append(coords[-1])
+    # collect start and end points of all lines (the start and end of each line are adjacent)
+    endpoints = numpy.column_stack([
+        shapely.get_coordinates(shapely.get_point(lines, 0)),
+        shapely.get_coordinates(shapely.get_point(lines, -1)),
+    ]).reshape(-1, 2)
 
     # count occurrences of each endpoint
-    counts = Counter(endpoints)
-
-    # any endpoint that appears only once is isolated
-    isolated_lines: list[LineString] = []
-    for line in lines:
-        coords = list(line.coords)
-        if counts[coords[0]] == 1 and counts[coords[-1]] == 1:
-            isolated_lines.append(line)
+    _, endpoint_ids, counts = numpy.unique(endpoints, axis=0, return_inverse=True, return_counts=True)
+    endpoint_counts = counts[endpoint_ids.ravel()].reshape(-1, 2)
 
-    return isolated_lines
+    # any line whose endpoints both appear only once is isolated
+    is_isolated = (endpoint_counts == 1).all(axis=1)
+    return list(lines[is_isolated])
@@ -0,0 +1,51 @@
+import geopandas
+import numpy
+import shapely
+
+
+def find_parent_lines(edges: geopandas.GeoDataFrame, lines: geopandas.GeoDataFrame, tolerance: float = 0.000001) -> numpy.ndarray:
+    """
+    Given edges that were created by splitting lines, find the line from which each edge originates.
+
+    A line is a parent of an edge if it covers the edge. Because the edges are split at every
+    intersection, the only lines that pass through the midpoint of an edge are the lines that
+    cover it, so the lines within the tolerance of each edge's midpoint are used as parents. If
+    more than one line passes through the midpoint (e.g., overlapping lines), each of them is
+    confirmed by checking that every vertex of the edge is within the tolerance of the line, and
+    the first confirmed line in the lines GeoDataFrame is used. A tolerance is needed because
+    the vertices that splitting creates at intersections are not always exactly on the line.
+
+    Returns an array with the position (not the index label) of the parent line for each edge,
+    or -1 if an edge has no parent line.
+    """
+    edge_geometries = edges.geometry.to_numpy()
+    line_geometries = lines.geometry.to_numpy()
+
+    # find the lines near the midpoint of each edge with a single spatial index query
+    midpoints = shapely.line_interpolate_point(edge_geometries, 0.5, normalized=True)
+    edge_positions, line_positions = lines.sindex.query(
+        midpoints, predicate='dwithin', distance=tolerance, sort=True)
+
+    # for edges with several candidates, find the greatest distance from the vertices of
+    # the edge to each candidate line
+    candidate_counts = numpy.bincount(edge_positions, minlength=len(edge_geometries))
+    is_ambiguous = candidate_counts[edge_positions] > 1
+    vertices, vertex_pair_positions = shapely.get_coordinates(
+        edge_geometries[edge_positions[is_ambiguous]], return_index=True)
+    vertex_distances = shapely.distance(
+        shapely.points(vertices), line_geometries[line_positions[is_ambiguous][vertex_pair_positions]])
+    max_vertex_distances = numpy.zeros(len(edge_positions))
+    ambiguous_max_vertex_distances = numpy.full(is_ambiguous.sum(), -numpy.inf)
+    numpy.maximum.at(ambiguous_max_vertex_distances, vertex_pair_positions, vertex_distances)
+    max_vertex_distances[is_ambiguous] = ambiguous_max_vertex_distances
+
+    # keep the candidates that cover the edge, and pick the first one for each edge
+    # (the query results are sorted by edge position and then by line position)
+    is_parent = max_vertex_distances <= tolerance
+    edge_positions = edge_positions[is_parent]
+    line_positions = line_positions[is_parent]
+    parent_edge_positions, first = numpy.unique(edge_positions, return_index=True)
+
+    parent_line_positions = numpy.full(len(edge_geometries), -1, dtype=numpy.int64)
+    parent_line_positions[parent_edge_positions] = line_positions[first]
+    return parent_line_positions
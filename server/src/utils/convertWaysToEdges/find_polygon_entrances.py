@@ -0,0 +1,62 @@
+import geopandas
+import numpy
+import pandas
+import shapely
+
+from get_line_termini import get_line_termini
+
+
+def get_entrance_tolerance(precision_grid: float | None = None) -> float:
+    """
+    Get the distance from a polygon boundary within which a line terminus is an entrance.
+
+    The line ends that were connected to polygons end an overshoot of 0.000001 beyond their
+    boundaries (see resolve_unconnected_line_ends), and when the lines and polygons are snapped to
+    a precision grid separately, the line ends that were on a boundary can move off it by up to the
+    diagonal of a grid cell. The tolerance is twice the sum of both, so that the termini are not
+    lost to rounding at the edge of the tolerance.
+    """
+    return 2 * (0.000001 + (precision_grid or 0.0))
+
+
+def find_polygon_entrances(edges: geopandas.GeoDataFrame, polygons: geopandas.GeoDataFrame, tolerance: float = 0.000001) -> geopandas.GeoDataFrame:
+    """
+    Given a GeoDataFrame of edges and a GeoDataFrame of polygons, find the edge termini that touch
+    each polygon's boundary (i.e., the entrances to buildings, plazas, etc.).
+
+    All termini are matched against the prepared polygon boundaries with a single spatial index query.
+    Termini with the same coordinates on the same polygon are only included once.
+
+    Returns a GeoDataFrame of entrance points with the index label of the polygon (`polygon_index`)
+    and of the edge (`line_index`) to which each entrance belongs, ordered by polygon and then by
+    the order of the edges.
+    """
+    line_termini = get_line_termini(edges)
+    line_termini = line_termini[line_termini.geometry.notna()]
+
+    # find the termini within the tolerance of each polygon boundary
+    boundaries = shapely.boundary(polygons.geometry.to_numpy())
+    shapely.prepare(boundaries)
+    boundaries_tree = shapely.STRtree(boundaries)
+    terminus_positions, polygon_positions = boundaries_tree.query(
+        line_termini.geometry.to_numpy(), predicate='dwithin', distance=tolerance)
+
+    # order by polygon, then by terminus
+    order = numpy.lexsort((terminus_positions, polygon_positions))
+    terminus_positions = terminus_positions[order]
+    polygon_positions = polygon_positions[order]
+
+    entrances = geopandas.GeoDataFrame(
+        {
+            'polygon_index': polygons.index.to_numpy()[polygon_positions],
+            'line_index': line_termini['line_index'].to_numpy()[terminus_positions],
+        },
+        geometry=line_termini.geometry.to_numpy()[terminus_positions],
+        crs=edges.crs,
+    )
+
+    # only keep the first terminus at each location on each polygon
+    coords = shapely.get_coordinates(entrances.geometry.to_numpy())
+    is_duplicate = pandas.DataFrame(
+        {'polygon': polygon_positions, 'x': coords[:, 0], 'y': coords[:, 1]}).duplicated().to_numpy()
+    return entrances[~is_duplicate].reset_index(drop=True)
@@ -1,26 +1,79 @@
+from typing import TypedDict
+
 import geopandas
-from shapely import LineString, MultiLineString, Point
+import numpy
+import shapely
+
+
+class LineTerminiCoordinates(TypedDict):
+    start: numpy.ndarray
+    end: numpy.ndarray
+    has_termini: numpy.ndarray
+
+
+def _get_first_parts(geometries: numpy.ndarray) -> numpy.ndarray:
+    """
+    Replace each MultiLineString with its first part.
+    """
+    first_parts = geometries.copy()
+    is_multi = shapely.get_type_id(geometries) == shapely.GeometryType.MULTILINESTRING
+    first_parts[is_multi] = shapely.get_geometry(geometries[is_multi], 0)
+    return first_parts
+
+
+def get_line_termini_coordinates(lines: geopandas.GeoDataFrame | geopandas.GeoSeries) -> LineTerminiCoordinates:
+    """
+    Given line geometries, return the XY coordinates of their terminal points (start and end) as
+    NumPy arrays with one row per line, in the same order as the lines.
+
+    For MultiLineStrings, the termini of the first part are used. Geometries that are not lines
+    have no termini; their rows are NaN and are marked as False in `has_termini`.
+    """
+    first_parts = _get_first_parts(lines.geometry.to_numpy())
+
+    # only LineStrings (including LinearRings) with at least one coordinate have termini
+    has_termini = numpy.isin(shapely.get_type_id(first_parts), [
+        shapely.GeometryType.LINESTRING, shapely.GeometryType.LINEARRING]) & ~shapely.is_empty(first_parts)
+
+    start = numpy.full((len(first_parts), 2), numpy.nan)
+    end = numpy.full((len(first_parts), 2), numpy.nan)
+    start[has_termini] = shapely.get_coordinates(shapely.get_point(first_parts[has_termini], 0))
+    end[has_termini] = shapely.get_coordinates(shapely.get_point(first_parts[has_termini], -1))
+
+    return {
+        'start': start,
+        'end': end,
+        'has_termini': has_termini,
+    }
 
 
 def get_line_termini(lines: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
     """
     Given a GeoDataFrame of line geometries, return a GeoDataFrame of their terminal points (start and end).
     Each terminal point will have attributes indicating whether it is a start or end point, and the index of the line to which it belongs.
+
+    Use get_line_termini_coordinates instead if only the coordinates are needed.
     """
+    first_parts = _get_first_parts(lines.geometry.to_numpy())
+
+    # geometries that are not lines have no termini (None)
+    is_line = numpy.isin(shapely.get_type_id(first_parts), [
+        shapely.GeometryType.LINESTRING, shapely.GeometryType.LINEARRING])
+    first_parts[~is_line] = None
+
+    # interleave the start and end points so that each line's termini are adjacent
+    terminal_points = numpy.column_stack([
+        shapely.get_point(first_parts, 0),
+        shapely.get_point(first_parts, -1),
+    ]).ravel()
 
-    def get_first_last(geom):
-        if isinstance(geom, LineString):
-            coords = list(geom.coords)
-        elif isinstance(geom, MultiLineString):
-            coords = list(geom.geoms[0].coords)
-        else:
-            return (None, None)
-        return Point(coords[0]), Point(coords[-1])
-
-    terminal_nodes_list = []
-    for line_index, (start, end) in lines["geometry"].apply(get_first_last).items():
-        terminal_nodes_list.append({'geometry': start, 'line_index': line_index, 'type': 'start'})
-        terminal_nodes_list.append({'geometry': end, 'line_index': line_index, 'type': 'end'})
     terminal_nodes = geopandas.GeoDataFrame(
-        terminal_nodes_list, geometry='geometry', crs=lines.crs)
+        {
+            'geometry': terminal_points,
+            'line_index': numpy.repeat(lines.index.to_numpy(), 2),
+            'type': numpy.tile(['start', 'end'], len(lines)),
+        },
+        geometry='geometry',
+        crs=lines.crs,
+    )
     return terminal_nodes
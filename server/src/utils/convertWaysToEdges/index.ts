@@ -1,5 +1,10 @@
-import path from 'path';
-import { exec } from '../exec.js';
+import { ConvertWaysToEdgesWorker, type ConvertWaysToEdgesIoOptions } from './worker.js';
+
+/**
+ * The worker process that runs the conversions. It is started on the first conversion
+ * and reused for later conversions.
+ */
+export const convertWaysToEdgesWorker = new ConvertWaysToEdgesWorker();
 
 /**
  * Converts an input geospatial file containing 'ways' into 'edges' suitable for routing.
@@ -8,53 +13,58 @@ import { exec } from '../exec.js';
  *
  * The connection tolerance is specified in the units of the input data's coordinate reference system (CRS).
  *
+ * The conversion runs in a long-lived Python worker process (see worker.ts) that is shared by all conversions.
+ * The time, memory, and feature counts of each stage are logged as NDJSON and returned.
+ *
+ * The edges may be saved to several files at once (e.g., a GeoPackage and a GeoJSON file). The ways are
+ * only converted once, and the files are written in parallel. Use a '.parquet' extension for GeoParquet,
+ * or a '.pgcopy' extension for a PostgreSQL binary COPY stream that can be loaded with loadRoutingTables.
+ *
+ * The vertices and orphans are saved next to each edges file with '_vertices' and '_orphans' suffixes
+ * (e.g., edges_vertices.gpkg and edges_orphans.gpkg). Each edge references its vertices in the
+ * `start_vertex` and `end_vertex` columns.
+ *
+ * If an incremental state path is provided, the edges from the previous conversion are stored there,
+ * and only the ways that changed since then (and the ways near them) are converted again. Unchanged
+ * edges keep their `edge_id`. The input ways must have a stable, unique `way_id` column.
+ *
+ * For large files, the I/O options can limit the columns and area of the ways that are read, and can
+ * switch reading and writing to pyogrio's Arrow-based I/O. Use a FlatGeobuf or GeoPackage ways file
+ * for bounding box reads that use the file's spatial index.
+ *
  * @param waysPath - The file path to the input 'ways' geospatial data.
- * @param edgesPath - The file path where the output 'edges' geospatial data will be saved.
+ * @param edgesPaths - The file path(s) where the output 'edges' geospatial data will be saved.
  * @param connectionTolerance - The distance tolerance for connecting nodes (default is 5 units).
  * @param allowOrphans - Whether to allow orphaned nodes (default is false).
  * @param intermediateCrs - The intermediate CRS to use for processing (default is 'EPSG:3857'). Use a project coordinate system for best results.
+ * @param incrementalStatePath - The file path where the incremental conversion state is stored (optional).
+ * @param ioOptions - Options for reading the ways and writing the edges (optional).
  */
 export async function convertWaysToEdges(
   waysPath: string,
-  edgesPath: string,
+  edgesPaths: string | string[],
   connectionTolerance = 3.2,
   minimumEdgeLength = 1.6,
   allowOrphans = false,
-  intermediateCrs = 'EPSG:3857'
+  intermediateCrs = 'EPSG:3857',
+  incrementalStatePath?: string,
+  ioOptions: ConvertWaysToEdgesIoOptions = {}
 ) {
-  const outputExtension = path.extname(edgesPath).toLowerCase();
-  const nodesPath =
-    path.dirname(edgesPath) + '/' + path.basename(edgesPath, outputExtension) + '_vertices' + outputExtension;
-  const orphansPath =
-    path.dirname(edgesPath) + '/' + path.basename(edgesPath, outputExtension) + '_orphans' + outputExtension;
-
-  const pythonCode = `
-from convert_ways_to_edges import convert_ways_to_edges
-from pathlib import Path
-
-# convert ways to edges and nodes/vertices
-ways_path = Path('${waysPath}')
-result = convert_ways_to_edges(ways_path, ${connectionTolerance}, ${minimumEdgeLength}, ${
-    allowOrphans ? 'False' : 'True'
-  }, '${intermediateCrs}')
-
-# remove fid columns (edge_id is and way_id are our new unique identifiers)
-# (any column named fid or fid{number} will be removed)
-fid_columns = [col for col in result['edges'].columns if col == 'fid' or col.startswith('fid') and col[3:].isdigit()]
-result['edges'] = result['edges'].drop(columns=fid_columns)
-
-# save edges to geopackage
-print('Saving edges to ${edgesPath}...')
-result['edges'].to_file('${edgesPath}')
-#result['nodes'].to_file('${nodesPath}')
-#result['orphans'].to_file('${orphansPath}')
-`;
+  const { report } = await convertWaysToEdgesWorker.run({
+    waysPath,
+    edgesPaths: Array.isArray(edgesPaths) ? edgesPaths : [edgesPaths],
+    connectionTolerance,
+    minimumEdgeLength,
+    noOrphans: !allowOrphans,
+    intermediateCrs,
+    incrementalStatePath,
+    ...ioOptions,
+  });
 
-  const command = `
-  $(conda info --base)/bin/conda run --live-stream --name convert-ways-to-edges --cwd "${
-    import.meta.dirname
-  }" python -u -c """${pythonCode}"""
-`;
+  console.log('Convert ways to edges stage report:');
+  for (const record of report) {
+    console.log(JSON.stringify(record));
+  }
 
-  await exec(command, true, true);
+  return report;
 }
@@ -1,9 +1,13 @@
-from typing import TypedDict
+from typing import Literal, TypedDict, cast
 import geopandas
-from shapely import LineString, MultiLineString
+import pandas
+from shapely import GeometryCollection, LineString, MultiLineString
 from shapely.ops import split
 
 from find_orphan_lines import find_orphan_lines
+from find_parent_lines import find_parent_lines
+from node_lines_tiled import node_lines_tiled
+from stage_report import stage
 
 
 class LinesToEdgesResult(TypedDict):
@@ -11,36 +15,24 @@ class LinesToEdgesResult(TypedDict):
     orphans: geopandas.GeoDataFrame
 
 
-def lines_to_edges(lines: geopandas.GeoDataFrame, no_orphans: bool = True, *, additional_split_polygons: geopandas.GeoDataFrame | None = None) -> LinesToEdgesResult:
+def lines_to_edges(lines: geopandas.GeoDataFrame, no_orphans: bool = True, *, additional_split_polygons: geopandas.GeoDataFrame | None = None, tile_size: float | None = None, tile_margin: float | None = None, grid_size: float | None = None, max_workers: int | None = None, attribute_transfer: Literal['buffer', 'lineage'] = 'buffer') -> LinesToEdgesResult:
     """
     Given a GeoDataFrame of line geometries, split lines at their intersection points.
     Returns a new GeoDataFrame with the split lines.
-    """
-
-    # create a union of all lines
-    print('  Finding intersections and splitting lines...')
-    all_lines_union = lines.union_all()
-    if not isinstance(all_lines_union, (LineString, MultiLineString)):
-        raise ValueError(
-            'Union of lines did not result in LineString or MultiLineString geometry.')
 
-    # if the union is a LineString, that means there was only one line in lines
-    if isinstance(all_lines_union, LineString):
-        # convert to MultiLineString for consistency
-        all_lines_union = MultiLineString([all_lines_union])
+    If a grid size is specified, the intersections are snap-rounded to a grid of that size.
+    If a tile size is specified, the lines are split in square tiles of that size (expanded by
+    the tile margin) in parallel processes instead of with a single union of all lines, always on
+    a grid (0.000001 unless a grid size is specified), so that the edges are the same as the edges
+    split without tiles on the same grid. See node_lines_tiled for details.
 
-    # detect orphan lines
-    print('  Detecting orphan lines...')
-    orphans_list = find_orphan_lines(all_lines_union)
-    if orphans_list:
-        if no_orphans:
-            raise ValueError(
-                f'    Found {len(orphans_list)} orphan lines. Cannot proceed with splitting at intersections.')
-        else:
-            print(
-                f'    Warning: Found {len(orphans_list)} orphan lines. Orphan lines indicate connectivity issues in the input data.')
+    Attributes are transferred from the lines to the edges with a spatial join against slightly
+    buffered lines by default. With the 'lineage' attribute transfer, each edge instead gets the
+    attributes of the first line that covers it (see find_parent_lines), which never duplicates
+    edges and does not require buffering.
+    """
 
-    # split the unioned lines by any additional polygons that are provided
+    # validate the additional split polygons
     if additional_split_polygons is not None and not additional_split_polygons.empty:
         # require valid geometries
         additional_split_polygons = additional_split_polygons[additional_split_polygons.is_valid &
@@ -53,33 +45,94 @@ def lines_to_edges(lines: geopandas.GeoDataFrame, no_orphans: bool = True, *, ad
             raise ValueError(
                 f'All geometries in the input ways GeoDataFrame must be Polygon or MultiPolygon types. Found geometry types: {found_types}')
 
-        print('  Splitting lines by additional polygons...')
-        polygons_union = additional_split_polygons.union_all()
-        if not polygons_union.is_empty:
-            all_lines_union = split(all_lines_union, polygons_union)
-
-    # extract each individual line from the unioned geometry
-    print('  Exploding split lines...')
-    split_lines = []
-    for geom in all_lines_union.geoms:
-        if isinstance(geom, LineString):
-            split_lines.append(geom)
+    # create a union of all lines
+    print('  Finding intersections and splitting lines...')
+    tiled_split_lines: list[LineString] | None = None
+    with stage('node', input_count=len(lines)) as record:
+        if tile_size is None:
+            all_lines_union = lines.union_all(grid_size=grid_size)
+        else:
+            node_lines_tiled_result = node_lines_tiled(
+                lines, tile_size, margin=tile_margin, grid_size=grid_size if grid_size is not None else 0.000001,
+                split_polygons=additional_split_polygons, max_workers=max_workers)
+            all_lines_union = MultiLineString(node_lines_tiled_result['noded_lines'])
+            tiled_split_lines = node_lines_tiled_result['split_lines']
+        if not isinstance(all_lines_union, (LineString, MultiLineString)):
+            raise ValueError(
+                'Union of lines did not result in LineString or MultiLineString geometry.')
+
+        # if the union is a LineString, that means there was only one line in lines
+        if isinstance(all_lines_union, LineString):
+            # convert to MultiLineString for consistency
+            all_lines_union = MultiLineString([all_lines_union])
+        record['output_count'] = len(all_lines_union.geoms)
+
+    # detect orphan lines
+    print('  Detecting orphan lines...')
+    with stage('orphans', input_count=len(all_lines_union.geoms)) as record:
+        orphans_list = find_orphan_lines(all_lines_union)
+        if orphans_list:
+            if no_orphans:
+                raise ValueError(
+                    f'    Found {len(orphans_list)} orphan lines. Cannot proceed with splitting at intersections.')
+            else:
+                print(
+                    f'    Warning: Found {len(orphans_list)} orphan lines. Orphan lines indicate connectivity issues in the input data.')
+        record['output_count'] = len(orphans_list)
+
+    # split the lines by the additional polygons
+    with stage('split', input_count=len(all_lines_union.geoms)) as record:
+        split_lines: list[LineString] = []
+
+        # the tiles have already been split by the additional polygons
+        if tiled_split_lines is not None:
+            split_lines = tiled_split_lines
+
+        else:
+            # split the unioned lines by any additional polygons that are provided
+            split_geometries: MultiLineString | GeometryCollection = all_lines_union
+            if additional_split_polygons is not None and not additional_split_polygons.empty:
+                print('  Splitting lines by additional polygons...')
+                polygons_union = additional_split_polygons.union_all()
+                if not polygons_union.is_empty:
+                    split_geometries = split(all_lines_union, polygons_union)
+
+            # extract each individual line from the unioned geometry
+            print('  Exploding split lines...')
+            for geom in split_geometries.geoms:
+                if isinstance(geom, LineString):
+                    split_lines.append(geom)
+        record['output_count'] = len(split_lines)
     edges = geopandas.GeoDataFrame(geometry=split_lines, crs=lines.crs)
 
-    # buffer the original lines slightly
     print('  Associating attributes from original lines to edges...')
-    print('    Copying lines')
-    lines_buffered = lines.copy()
-    print('    Buffering lines slightly to ensure proper spatial join')
-    lines_buffered.geometry = lines_buffered.geometry.buffer(0.01)
-
-    # apply columns from lines to edges based on whether it is within the buffered lines
-    print('    Performing spatial join to assign attributes to edges')
-    edges = edges.sjoin(lines_buffered, how='left', predicate='within')
-    try:
-        edges = edges.drop(columns=['index_right'])
-    except KeyError:
-        pass  # index_right column does not exist
+    with stage('attributes', input_count=len(edges)) as record:
+        if attribute_transfer == 'lineage':
+            # find the original line that covers each edge
+            print('    Finding the original line of each edge')
+            parent_line_positions = find_parent_lines(edges, lines)
+
+            # apply columns from the original lines to the edges (edges without an original line get empty values)
+            print('    Copying attributes from the original lines to edges')
+            line_attributes = pandas.DataFrame(lines.drop(columns=lines.geometry.name)).reset_index(drop=True)
+            line_attributes = line_attributes.reindex(parent_line_positions).set_index(edges.index)
+            edges = cast(geopandas.GeoDataFrame, pandas.concat([edges, line_attributes], axis=1))
+
+        else:
+            # buffer the original lines slightly
+            print('    Copying lines')
+            lines_buffered = lines.copy()
+            print('    Buffering lines slightly to ensure proper spatial join')
+            lines_buffered.geometry = lines_buffered.geometry.buffer(0.01)
+
+            # apply columns from lines to edges based on whether it is within the buffered lines
+            print('    Performing spatial join to assign attributes to edges')
+            edges = edges.sjoin(lines_buffered, how='left', predicate='within')
+            try:
+                edges = edges.drop(columns=['index_right'])
+            except KeyError:
+                pass  # index_right column does not exist
+        record['output_count'] = len(edges)
 
     # generate ids for each final edge
     print('  Generating edge IDs...')
@@ -0,0 +1,94 @@
+import math
+import os
+from typing import TypedDict
+
+import geopandas
+import pandas
+import shapely
+from pyproj import CRS
+
+from stage_report import get_peak_rss_bytes
+
+# the approximate peak memory that a single union uses to node the lines, per input coordinate
+# (measured on synthetic street grids)
+NODING_BYTES_PER_COORDINATE = 1024
+
+WAY_POSITION_COLUMN = '__way_position'
+
+
+class SeparateAttributesResult(TypedDict):
+    lines: geopandas.GeoDataFrame
+    attributes: pandas.DataFrame
+
+
+class BudgetTiling(TypedDict):
+    tile_size: float | None
+    max_workers: int | None
+
+
+def separate_attributes(lines: geopandas.GeoDataFrame) -> SeparateAttributesResult:
+    """
+    Split lines into a frame with only their geometries and the position of each line
+    (`__way_position`), and a separate table of their attributes indexed by that position.
+
+    The slim lines can be split, connected, and filtered without copying the attributes at every
+    step, and the attributes are joined back onto the resulting edges with join_attributes.
+    """
+    attributes = pandas.DataFrame(lines.drop(columns=lines.geometry.name)).reset_index(drop=True)
+    slim_lines = geopandas.GeoDataFrame(
+        {WAY_POSITION_COLUMN: range(len(lines))},
+        geometry=lines.geometry.to_numpy(),
+        index=lines.index,
+        crs=lines.crs,
+    )
+    return {
+        'lines': slim_lines,
+        'attributes': attributes,
+    }
+
+
+def join_attributes(edges: geopandas.GeoDataFrame, attributes: pandas.DataFrame) -> geopandas.GeoDataFrame:
+    """
+    Join the attributes that were separated with separate_attributes back onto the edges by the
+    position of the line of each edge. Edges without a line get empty attributes.
+    """
+    positions = edges[WAY_POSITION_COLUMN].fillna(-1).astype('int64').to_numpy()
+    edge_attributes = attributes.reindex(positions).set_index(edges.index)
+    return geopandas.GeoDataFrame(
+        pandas.concat([edges.drop(columns=[WAY_POSITION_COLUMN]), edge_attributes], axis=1),
+        geometry=edges.geometry.name,
+        crs=edges.crs,
+    )
+
+
+def to_crs_in_place(gdf: geopandas.GeoDataFrame, crs: CRS) -> geopandas.GeoDataFrame:
+    """
+    Reproject the geometries of a GeoDataFrame without copying its other columns.
+    """
+    gdf.geometry = gdf.geometry.to_crs(crs)
+    return gdf
+
+
+def get_budget_tiling(lines: geopandas.GeoDataFrame, memory_budget: int, *, max_workers: int | None = None) -> BudgetTiling:
+    """
+    Choose how to node the lines within a memory budget (in bytes, for the whole process).
+
+    The memory that noding needs is estimated from the number of coordinates of the lines. If it
+    does not fit in the part of the budget that is still available, the lines are noded in square
+    tiles (see node_lines_tiled) that are small enough for the parallel processes to fit in the
+    budget together. Returns no tile size if the lines can be noded in a single union.
+    """
+    estimated_bytes = int(shapely.get_num_coordinates(lines.geometry.to_numpy()).sum()) * NODING_BYTES_PER_COORDINATE
+    available_bytes = max(memory_budget - get_peak_rss_bytes(), memory_budget // 4, 1)
+    if estimated_bytes <= available_bytes or lines.empty:
+        return {'tile_size': None, 'max_workers': max_workers}
+
+    # split the estimate into enough tiles that each process gets an equal share of the budget
+    # (but no more tiles than lines, which would not reduce the memory any further)
+    workers = max_workers or os.cpu_count() or 1
+    tile_count = min(math.ceil(estimated_bytes * workers / available_bytes), len(lines))
+    minx, miny, maxx, maxy = lines.total_bounds
+    area = max((maxx - minx) * (maxy - miny), 1.0)
+    print(f'  The estimated {estimated_bytes / 1024 ** 2:.0f} MiB for noding exceeds the memory budget. '
+          f'Noding in about {tile_count} tiles with {workers} processes...')
+    return {'tile_size': math.sqrt(area / tile_count), 'max_workers': workers}
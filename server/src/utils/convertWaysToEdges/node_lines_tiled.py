@@ -0,0 +1,230 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TypedDict
+
+import geopandas
+import numpy
+import shapely
+from shapely import LineString, MultiLineString
+from shapely.ops import split
+
+
+class NodeLinesTiledResult(TypedDict):
+    noded_lines: list[LineString]
+    split_lines: list[LineString]
+
+
+class _TileResult(TypedDict):
+    noded_lines: numpy.ndarray
+    split_lines: numpy.ndarray
+    seam_lines: numpy.ndarray
+
+
+class _Grid(TypedDict):
+    minx: float
+    miny: float
+    tile_size: float
+    columns: int
+    rows: int
+
+
+def _get_tile_ids(points: numpy.ndarray, grid: _Grid) -> numpy.ndarray:
+    """
+    Get the id of the tile that contains each point (tiles are half-open, except at the
+    maximum edges of the grid).
+    """
+    coords = shapely.get_coordinates(points)
+    columns = numpy.clip(numpy.floor((coords[:, 0] - grid['minx']) / grid['tile_size']),
+                         0, grid['columns'] - 1).astype(numpy.int64)
+    rows = numpy.clip(numpy.floor((coords[:, 1] - grid['miny']) / grid['tile_size']),
+                      0, grid['rows'] - 1).astype(numpy.int64)
+    return rows * grid['columns'] + columns
+
+
+def _is_within_expanded_tile(lines: numpy.ndarray, tile_ids: numpy.ndarray, grid: _Grid, margin: float) -> numpy.ndarray:
+    """
+    Check whether each line is within its tile (given by id), expanded by the margin.
+    """
+    rows, columns = numpy.divmod(tile_ids, grid['columns'])
+    minx = grid['minx'] + columns * grid['tile_size']
+    miny = grid['miny'] + rows * grid['tile_size']
+    bounds = shapely.bounds(lines)
+    return (bounds[:, 0] >= minx - margin) & (bounds[:, 1] >= miny - margin) & \
+        (bounds[:, 2] <= minx + grid['tile_size'] + margin) & (bounds[:, 3] <= miny + grid['tile_size'] + margin)
+
+
+def _get_owner_tile_ids(lines: numpy.ndarray, grid: _Grid) -> numpy.ndarray:
+    """
+    Get the id of the tile that owns each line, which is the tile that contains its midpoint.
+    """
+    return _get_tile_ids(shapely.line_interpolate_point(lines, 0.5, normalized=True), grid)
+
+
+def _node(lines: numpy.ndarray, grid_size: float) -> numpy.ndarray:
+    """
+    Node lines at their intersections with a union on a grid of the given size, returning the
+    resulting LineStrings.
+
+    On a fixed grid, the intersections are snap-rounded to the grid, so that the same lines are
+    noded the same way no matter which other lines are noded with them. (Without a grid, the
+    union falls back to snapping vertices together when the intersections cannot be computed
+    exactly, which depends on every line in the union.)
+    """
+    parts = shapely.get_parts(shapely.union_all(lines, grid_size=grid_size))
+    return parts[shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING]
+
+
+def _split(lines: numpy.ndarray, polygons: numpy.ndarray) -> numpy.ndarray:
+    """
+    Split lines by the union of the polygons, returning the resulting LineStrings.
+    """
+    if len(lines) == 0 or len(polygons) == 0:
+        return lines
+    polygons_union = shapely.union_all(polygons)
+    if polygons_union.is_empty:
+        return lines
+    split_geometries = split(MultiLineString(list(lines)), polygons_union)
+    return numpy.array([geom for geom in split_geometries.geoms if isinstance(geom, LineString)],
+                       dtype=object)
+
+
+def _node_tile(lines: numpy.ndarray, polygons: numpy.ndarray, tile_id: int, grid: _Grid, margin: float, grid_size: float) -> _TileResult:
+    """
+    Node the lines that intersect a tile (expanded by the margin).
+
+    A noded line is only correct if every line that intersects it was included in the tile, which
+    is guaranteed for noded lines that are fully within the expanded tile. Those lines are kept if
+    their midpoints are in this tile, so that each noded line is kept by exactly one tile. Noded
+    lines that extend beyond the expanded tile and intersect this tile are returned as seam lines
+    so that they can be noded again with all of the lines they intersect.
+    """
+    row, column = divmod(tile_id, grid['columns'])
+    minx = grid['minx'] + column * grid['tile_size']
+    miny = grid['miny'] + row * grid['tile_size']
+
+    noded_lines = _node(lines, grid_size)
+
+    is_within_expanded_tile = _is_within_expanded_tile(
+        noded_lines, numpy.full(len(noded_lines), tile_id), grid, margin)
+    is_owned = _get_owner_tile_ids(noded_lines, grid) == tile_id
+    intersects_tile = shapely.intersects(
+        noded_lines, shapely.box(minx, miny, minx + grid['tile_size'], miny + grid['tile_size']))
+
+    certified_lines = noded_lines[is_within_expanded_tile & is_owned]
+    return {
+        'noded_lines': certified_lines,
+        'split_lines': _split(certified_lines, polygons),
+        'seam_lines': noded_lines[~is_within_expanded_tile & intersects_tile],
+    }
+
+
+def node_lines_tiled(lines: geopandas.GeoDataFrame, tile_size: float, *, margin: float | None = None, grid_size: float = 0.000001, split_polygons: geopandas.GeoDataFrame | None = None, max_workers: int | None = None) -> NodeLinesTiledResult:
+    """
+    Node lines at their intersections, and optionally split them by polygons, by cutting the
+    extent of the lines into square tiles that are each noded in a separate process.
+
+    The intersections are snap-rounded to a grid of `grid_size` (see _node), so the result
+    contains the same lines as a single union of all lines on that grid
+    (`lines.union_all(grid_size=grid_size)`, split by the union of all polygons), but the lines
+    are ordered by tile instead of by the order in which the union produces them.
+
+    Args:
+        lines (GeoDataFrame): The lines to node.
+        tile_size (float): The width and height of each tile, in the units of the lines' CRS.
+        margin (float, optional): How far each tile is expanded when selecting the lines to node
+            together. Lines that are longer than the margin and cross tile boundaries are noded
+            again after the tiles are processed. Defaults to a tenth of the tile size.
+        grid_size (float, optional): The size of the grid that the intersections are snapped to,
+            in the units of the lines' CRS. Defaults to 0.000001.
+        split_polygons (GeoDataFrame, optional): Polygons whose boundaries should split the lines.
+        max_workers (int, optional): The maximum number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        NodeLinesTiledResult: The noded lines, and the noded lines after splitting by the polygons.
+    """
+    if margin is None:
+        margin = tile_size / 10
+    polygons = split_polygons if split_polygons is not None else geopandas.GeoDataFrame(
+        geometry=[], crs=lines.crs)
+
+    # cut the extent of the lines into tiles
+    minx, miny, maxx, maxy = lines.total_bounds
+    grid: _Grid = {
+        'minx': float(minx),
+        'miny': float(miny),
+        'tile_size': tile_size,
+        'columns': max(1, math.ceil((maxx - minx) / tile_size)),
+        'rows': max(1, math.ceil((maxy - miny) / tile_size)),
+    }
+
+    # find the lines and polygons that intersect each tile (expanded by the margin)
+    line_geometries = lines.geometry.to_numpy()
+    polygon_geometries = polygons.geometry.to_numpy()
+    tile_jobs: list[tuple[numpy.ndarray, numpy.ndarray, int]] = []
+    for tile_id in range(grid['columns'] * grid['rows']):
+        row, column = divmod(tile_id, grid['columns'])
+        expanded_tile = shapely.box(
+            grid['minx'] + column * tile_size - margin,
+            grid['miny'] + row * tile_size - margin,
+            grid['minx'] + (column + 1) * tile_size + margin,
+            grid['miny'] + (row + 1) * tile_size + margin,
+        )
+        tile_line_positions = numpy.sort(lines.sindex.query(expanded_tile, predicate='intersects'))
+        if len(tile_line_positions) == 0:
+            continue
+        tile_polygon_positions = numpy.sort(polygons.sindex.query(
+            expanded_tile, predicate='intersects')) if not polygons.empty else numpy.array([], dtype=int)
+        tile_jobs.append((line_geometries[tile_line_positions],
+                         polygon_geometries[tile_polygon_positions], tile_id))
+
+    # node each tile, in parallel if there is more than one tile (the processes are spawned instead
+    # of forked because forking copies the state of other threads, e.g., the message thread and
+    # redirected output of the worker, into processes without them)
+    print(f'    Noding {len(tile_jobs)} tiles...')
+    tile_results: list[_TileResult]
+    if len(tile_jobs) == 1:
+        tile_results = [_node_tile(*tile_jobs[0], grid, margin, grid_size)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_node_tile, *tile_job, grid, margin, grid_size) for tile_job in tile_jobs]
+            tile_results = [future.result() for future in futures]
+
+    noded_lines = [tile_result['noded_lines'] for tile_result in tile_results]
+    split_lines = [tile_result['split_lines'] for tile_result in tile_results]
+
+    # stitch the seams by noding the lines near the seam lines together, and keep each resulting
+    # line that is on a seam line from the tile that owns it (so that every line it intersects
+    # was included) unless it is within the expanded tile (so that the tile has already kept it)
+    # (the lines within a grid cell of a seam line are included because snap rounding can move the
+    # seam line onto their nodes)
+    seam_lines = numpy.concatenate([tile_result['seam_lines'] for tile_result in tile_results])
+    seam_tile_ids = numpy.concatenate([
+        numpy.full(len(tile_result['seam_lines']), tile_id)
+        for (_, _, tile_id), tile_result in zip(tile_jobs, tile_results)])
+    if len(seam_lines) > 0:
+        print(f'    Stitching {len(seam_lines)} lines that cross tile seams...')
+        seam_line_positions = numpy.unique(lines.sindex.query(
+            seam_lines, predicate='dwithin', distance=grid_size)[1])
+        renoded_lines = _node(line_geometries[seam_line_positions], grid_size)
+        midpoints = shapely.line_interpolate_point(renoded_lines, 0.5, normalized=True)
+        renoded_tile_ids = _get_tile_ids(midpoints, grid)
+        midpoint_positions, seam_positions = shapely.STRtree(seam_lines).query(
+            midpoints, predicate='dwithin', distance=grid_size)
+        is_on_owned_seam_line = numpy.zeros(len(renoded_lines), dtype=bool)
+        is_on_owned_seam_line[midpoint_positions[
+            seam_tile_ids[seam_positions] == renoded_tile_ids[midpoint_positions]]] = True
+        stitched_lines = renoded_lines[is_on_owned_seam_line & ~_is_within_expanded_tile(
+            renoded_lines, renoded_tile_ids, grid, margin)]
+
+        stitched_polygon_positions = numpy.unique(polygons.sindex.query(
+            stitched_lines, predicate='intersects')[1]) if not polygons.empty else numpy.array([], dtype=int)
+        noded_lines.append(stitched_lines)
+        split_lines.append(_split(stitched_lines, polygon_geometries[stitched_polygon_positions]))
+
+    return {
+        'noded_lines': list(numpy.concatenate(noded_lines)),
+        'split_lines': list(numpy.concatenate(split_lines)),
+    }
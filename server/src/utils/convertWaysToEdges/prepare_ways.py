@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, TypedDict
+
+import geopandas
+import numpy
+import pandas
+import shapely
+from pyproj import CRS
+
+from read_ways import read_ways
+from stage_report import stage
+
+
+class PrepareWaysResult(TypedDict):
+    ways: geopandas.GeoDataFrame
+    original_crs: CRS
+    repaired_way_ids: list[Any]
+    dropped_way_ids: list[Any]
+
+
+def _make_valid_chunked(geometries: numpy.ndarray, *, chunk_size: int, max_workers: int | None) -> numpy.ndarray:
+    """
+    Repair the geometries with make_valid, in chunks in parallel processes if there is more
+    than one chunk.
+    """
+    if len(geometries) <= chunk_size:
+        return shapely.make_valid(geometries)
+
+    # repair the chunks in parallel (in spawned processes, see node_lines_tiled)
+    chunks = [geometries[start:start + chunk_size] for start in range(0, len(geometries), chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        return numpy.concatenate(list(executor.map(shapely.make_valid, chunks)))
+
+
+def _format_ids(ids: list[Any], limit: int = 20) -> str:
+    if len(ids) == 0:
+        return ''
+    if len(ids) <= limit:
+        return ': ' + ', '.join(str(id) for id in ids)
+    return ': ' + ', '.join(str(id) for id in ids[:limit]) + f', and {len(ids) - limit} more'
+
+
+def prepare_ways(ways: geopandas.GeoDataFrame | Path, intermediate_crs: str, *, repair_chunk_size: int = 10000, max_workers: int | None = None) -> PrepareWaysResult:
+    """
+    Given a GeoDataFrame of ways (or a path to a file containing them, see read_ways), prepare
+    them for conversion to edges: reproject them to the intermediate CRS, repair or drop invalid
+    geometries, lowercase the column names, and check that the geometry types are supported.
+
+    Only the invalid geometries are repaired. If there are more than `repair_chunk_size` of them,
+    they are repaired in chunks in up to `max_workers` parallel processes.
+
+    Returns the prepared ways, the CRS of the input ways (so that the results can be
+    reprojected back to it), and the way ids (or index labels if there is no `way_id` column)
+    of the geometries that were repaired and of those that were dropped because they could not
+    be repaired.
+    """
+    # if a path was provided instead, read it to a GeoDataFrame
+    if isinstance(ways, Path):
+        ways = read_ways(ways)
+
+    # reproject to intermediate CRS for processing
+    old_crs = ways.crs
+    if not old_crs:
+        raise ValueError('Input ways GeoDataFrame has no CRS defined.')
+    ways = ways.to_crs(intermediate_crs)
+
+    # lowercase all column names for consistency
+    ways.columns = [col.lower() for col in ways.columns]
+
+    # check for invalid geometries
+    print('Checking for invalid geometries...')
+    repaired_way_ids: list[Any] = []
+    dropped_way_ids: list[Any] = []
+    with stage('validate', input_count=len(ways)) as record:
+        geometries = ways.geometry.to_numpy()
+        invalid_mask = ~shapely.is_valid(geometries) | shapely.is_empty(geometries)
+        invalid_count = int(invalid_mask.sum())
+        if invalid_count > 0:
+            print(f"  Found {invalid_count} invalid or empty geometries.")
+
+            print("  Reasons for invalid geometries:")
+            invalid_geometries = geometries[invalid_mask]
+            reasons = pandas.Series(shapely.is_valid_reason(invalid_geometries), dtype=object)
+            reasons[shapely.is_empty(invalid_geometries)] = 'Empty geometry'
+            reasons = reasons.fillna('Missing geometry')
+
+            # group the reasons without the location of each problem (e.g., 'Self-intersection[x y]')
+            reasons = reasons.str.replace(r'\[[^\]]*\]$', '', regex=True)
+            for reason, count in reasons.value_counts().items():
+                print(f"    {reason}: {count}")
+
+            # only the invalid geometries are repaired
+            print("  Attempting repair with make_valid...")
+            repaired_geometries = _make_valid_chunked(
+                invalid_geometries, chunk_size=repair_chunk_size, max_workers=max_workers)
+
+            # drop any geometry that still fails after repair
+            repaired_mask = shapely.is_valid(repaired_geometries) & ~shapely.is_empty(repaired_geometries)
+            way_ids = ways['way_id'] if 'way_id' in ways.columns else ways.index.to_series()
+            invalid_way_ids = way_ids[invalid_mask].to_numpy()
+            repaired_way_ids = invalid_way_ids[repaired_mask].tolist()
+            dropped_way_ids = invalid_way_ids[~repaired_mask].tolist()
+
+            dropped_mask = invalid_mask.copy()
+            dropped_mask[invalid_mask] = ~repaired_mask
+            geometries = geometries.copy()
+            geometries[invalid_mask] = repaired_geometries
+            ways = ways.copy()
+            ways[ways.geometry.name] = geopandas.GeoSeries(geometries, index=ways.index, crs=ways.crs)
+            ways = ways[~dropped_mask].copy()
+
+            print(f"  Repaired {len(repaired_way_ids)} geometries{_format_ids(repaired_way_ids)}.")
+            print(f"  Dropped {len(dropped_way_ids)} geometries that could not be repaired{_format_ids(dropped_way_ids)}.")
+            print(f"  {len(ways)} geometries remain after cleaning.")
+        record['output_count'] = len(ways)
+
+    # force geometry requirements
+    if not all(ways.geometry.type.isin(['LineString', 'MultiLineString', 'Polygon', 'MultiPolygon'])):
+        found_types = ways.geometry.type.unique()
+        raise ValueError(
+            f'All geometries in the input ways GeoDataFrame must be LineString, MultiLineString, Polygon, or MultiPolygon types. Found geometry types: {found_types}')
+    if not any(ways.geometry.type.isin(['LineString', 'MultiLineString'])):
+        raise ValueError(
+            'No LineString or MultiLineString geometries found in the input ways GeoDataFrame.')
+
+    return {
+        'ways': ways,
+        'original_crs': old_crs,
+        'repaired_way_ids': repaired_way_ids,
+        'dropped_way_ids': dropped_way_ids,
+    }
@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+import geopandas
+
+
+def read_ways(ways_path: Path, *, columns: list[str] | None = None, bbox: tuple[float, float, float, float] | None = None, use_arrow: bool = False) -> geopandas.GeoDataFrame:
+    """
+    Read the ways from a file. GeoParquet is used for .parquet files, and any format supported
+    by geopandas otherwise (e.g., .fgb, .gpkg).
+
+    Only the attribute `columns` are read if specified (the geometry column is always read).
+    Only the ways that intersect the `bbox` (minx, miny, maxx, maxy in the CRS of the file) are
+    read if specified, which uses the spatial index of the file if it has one (e.g., FlatGeobuf
+    and GeoPackage files, or GeoParquet files written with a bbox covering column).
+
+    If `use_arrow` is True, other formats are read with pyogrio's Arrow reader instead of row by
+    row, which avoids creating Python objects for every attribute value. It requires pyarrow.
+    """
+    if (not ways_path.exists()) or (not ways_path.is_file()):
+        raise FileNotFoundError(f'Ways file not found: {ways_path}')
+
+    # parquet file
+    if ways_path.suffix == '.parquet':
+        if columns is not None:
+            geometry_column = _get_parquet_geometry_column(ways_path)
+            columns = [*columns, geometry_column] if geometry_column not in columns else columns
+        return geopandas.read_parquet(ways_path, columns=columns, bbox=bbox)
+
+    # any other file type supported by geopandas
+    if use_arrow:
+        return geopandas.read_file(ways_path, engine='pyogrio', use_arrow=True, columns=columns, bbox=bbox)
+    return geopandas.read_file(ways_path, columns=columns, bbox=bbox)
+
+
+def _get_parquet_geometry_column(parquet_path: Path) -> str:
+    import pyarrow.parquet  # type: ignore[import-untyped]
+
+    metadata = pyarrow.parquet.read_schema(parquet_path).metadata or {}
+    if b'geo' not in metadata:
+        raise ValueError(f'Ways file is not a GeoParquet file: {parquet_path}')
+    return json.loads(metadata[b'geo'])['primary_column']
@@ -1,8 +1,9 @@
 import geopandas
-import pandas
-from shapely import LineString, MultiLineString, Point
+import numpy
+import shapely
 
-from get_line_termini import get_line_termini
+from get_line_termini import get_line_termini_coordinates
+from stage_report import stage
 
 
 def resolve_unconnected_line_ends(lines: geopandas.GeoDataFrame, distance_threshold: float = 1.0, overshoot: float = 0.0, *, polygons: geopandas.GeoDataFrame | None = None) -> geopandas.GeoDataFrame:
@@ -12,132 +13,138 @@ def resolve_unconnected_line_ends(lines: geopandas.GeoDataFrame, distance_thresh
 
     If polygons are specified, unconnected line ends will be extended to the nearest line or polygon edge.
 
+    All terminal nodes are queried against the spatial index in one call, and the closest points,
+    extension points, and extended lines are computed with vectorized shapely and numpy operations.
+
     Parameters:
     - lines: GeoDataFrame containing LineString geometries.
     - distance_threshold: Maximum distance within which to search for a line to connect to.
     - overshoot: Additional distance to extend beyond the nearest line when connecting.
     - polygons (optional): GeoDataFrame containing Polygon geometries.
     """
-    lines_spatial_index = lines.sindex
-    polygons_spatial_index = polygons.sindex if polygons is not None else None
-
-    # find all terminal nodes
-    terminal_nodes = get_line_termini(lines)
-
-    # find the closest line for each terminal node within the distance threshold that is not the node
-    # from which it originates, and then extend the terminus to the closest line
-    extended_lines = lines.copy()
-    for index, node in terminal_nodes.iterrows():
-
-        # find candidate lines within the distance threshold
-        candidate_lines_indices = list(lines_spatial_index.query(
-            node.geometry, predicate='dwithin', distance=distance_threshold, sort=True))
-        candidate_lines = lines.iloc[candidate_lines_indices]
-
-        # exclude candidate lines that are the same as the node's line
-        candidate_lines = candidate_lines[candidate_lines.index != node.line_index]
-        if not isinstance(candidate_lines, geopandas.GeoDataFrame) or candidate_lines.empty:
-            candidate_lines = geopandas.GeoDataFrame(columns=lines.columns, crs=lines.crs)
-
-        # calculate the distance between the node and each candidate line
-        candidate_lines['distance'] = candidate_lines.geometry.apply(
-            lambda geom: node.geometry.distance(geom))
-
-        # sort by distance (ascending; closest first)
-        candidate_lines = candidate_lines.sort_values(by='distance', ascending=True)
-
-        # skip if there is a candidate with distance 0
-        if not candidate_lines.empty and candidate_lines.iloc[0]['distance'] == 0:
-            continue
-
-        # if there are no candidate lines AND polygons are provided, also consider polygons
-        candidate_polygons: None | geopandas.GeoDataFrame = None
-        if candidate_lines.empty and polygons is not None and not polygons.empty and polygons_spatial_index is not None:
-
-            # find candidate polygons within the distance threshold
-            candidate_polygons_indices = list(polygons_spatial_index.query(
-                node.geometry, predicate='dwithin', distance=distance_threshold, sort=True))
-            candidate_polygons = polygons.iloc[candidate_polygons_indices]
-
-            # calculate the distance between the node and each candidate polygon
-            candidate_polygons['distance'] = candidate_polygons.geometry.apply(
-                lambda geom: node.geometry.distance(geom))
-
-            # sort by distance (ascending; closest first)
-            candidate_polygons = candidate_polygons.sort_values(by='distance', ascending=True)
-
-            # convert polygons to lines (exterior boundaries)
-            candidate_lines = geopandas.GeoDataFrame(
-                geometry=candidate_polygons.geometry.boundary,
-                index=candidate_polygons.index,
-                crs=polygons.crs
-            )
-
-        # if there is not a candidate, skip further processing
-        if candidate_lines.empty:
-            continue
-        best_candidate = candidate_lines.iloc[0]
-
-        # ensure the best candidate is a LineString or MultiLineString
-        if not isinstance(best_candidate.geometry, (LineString, MultiLineString)):
-            continue
-
-        # find the closest point on the candidate line to the terminal node
-        terminal_point = node.geometry
-        distance_along_candidate_line_to_closest_point = best_candidate.geometry.project(
-            terminal_point)
-        closest_point_on_candidate_line = best_candidate.geometry.interpolate(
-            distance_along_candidate_line_to_closest_point)
-
-        # verify that the existing line is a LineString
-        existing_line = extended_lines.loc[node.line_index].geometry
-        if not isinstance(existing_line, LineString):
-            continue
-
-        # compute a vector from the existing line terminus to the closest point on the candidate line
-        extension_vector_origin = Point(existing_line.coords[0]) if (
-            node.type == 'start') else Point(existing_line.coords[-1])
-        extension_vector = (
-            closest_point_on_candidate_line.x - extension_vector_origin.x,
-            closest_point_on_candidate_line.y - extension_vector_origin.y
-        )
-
-        # compute the magnitude (length) and unit vector
-        extension_vector_magnitude = (extension_vector[0]**2 + extension_vector[1]**2)**0.5
-        if extension_vector_magnitude == 0:
-            continue  # cannot extend if the vector magnitude is zero
-        extension_unit_vector = (
-            extension_vector[0] / extension_vector_magnitude,
-            extension_vector[1] / extension_vector_magnitude
-        )
-
-        # compute the extension point, applying overshoot if specified
-        overshoot_vector = (  # will be (0, 0) if overshoot is 0
-            extension_unit_vector[0] * overshoot,
-            extension_unit_vector[1] * overshoot
-        )
-        extension_point = Point(
-            closest_point_on_candidate_line.x + overshoot_vector[0],
-            closest_point_on_candidate_line.y + overshoot_vector[1]
-        )
-
-        # create a new line that extends the existing line to the closest point on the candidate way
-        new_line: LineString
-        if (node.type == 'start'):
-            new_line = LineString([extension_point] + list(existing_line.coords))
-        else:  # node.type == 'end'
-            new_line = LineString(list(existing_line.coords) + [extension_point])
-
-        # update the way geometry
-        extended_lines.at[node.line_index, 'geometry'] = new_line  # type: ignore[assignment]
-
-    # get the outlines of the polygons
-    polygon_outlines: None | geopandas.GeoDataFrame = None
-    if polygons is not None and not polygons.empty:
-        polygon_outlines = geopandas.GeoDataFrame(
-            geometry=polygons.geometry.boundary,
-            index=polygons.index,
-            crs=polygons.crs
-        )
+    line_geometries = lines.geometry.to_numpy()
+    polygon_geometries = polygons.geometry.to_numpy() if polygons is not None else None
+
+    # find all terminal nodes (the start and end of each line are adjacent)
+    termini = get_line_termini_coordinates(lines)
+    terminal_coords = numpy.column_stack([termini['start'], termini['end']]).reshape(-1, 2)
+    has_point = numpy.repeat(termini['has_termini'], 2)
+    points = numpy.full(len(terminal_coords), None, dtype=object)
+    points[has_point] = shapely.points(terminal_coords[has_point])
+    line_labels = numpy.repeat(lines.index.to_numpy(), 2)
+    is_start = numpy.tile([True, False], len(lines))
+
+    # the geometry to connect to for each terminal node (None if the node will not be extended)
+    targets = numpy.full(len(points), None, dtype=object)
+
+    with stage('nearest', input_count=int(has_point.sum())) as record:
+        # find the closest line for each terminal node within the distance threshold that is not the
+        # line from which it originates (nodes that already touch another line are left as-is)
+        node_positions, line_positions, line_distances = _find_nearest_candidates(
+            points[has_point], lines, distance_threshold, line_labels[has_point])
+        node_positions = numpy.flatnonzero(has_point)[node_positions]
+        not_touching = line_distances != 0
+        targets[node_positions[not_touching]] = line_geometries[line_positions[not_touching]]
+
+        # if there are no candidate lines for a node AND polygons are provided, also consider the
+        # polygon boundaries
+        if polygons is not None and polygon_geometries is not None and not polygons.empty:
+            has_no_line = has_point.copy()
+            has_no_line[node_positions] = False
+            polygon_node_positions, polygon_positions, _ = _find_nearest_candidates(
+                points[has_no_line], polygons, distance_threshold)
+            polygon_node_positions = numpy.flatnonzero(has_no_line)[polygon_node_positions]
+            targets[polygon_node_positions] = shapely.boundary(polygon_geometries[polygon_positions])
+
+        record['output_count'] = int(shapely.is_geometry(targets).sum())
+
+    with stage('extend', input_count=int(shapely.is_geometry(targets).sum())) as record:
+        # only extend LineString lines, and only to LineString or MultiLineString targets
+        # (lines that share their index label with another line cannot be looked up, so they are
+        # never extended)
+        line_positions_by_node = numpy.repeat(numpy.arange(len(lines)), 2)
+        should_extend = numpy.isin(shapely.get_type_id(targets), [1, 5]) & (
+            shapely.get_type_id(line_geometries[line_positions_by_node]) == 1) & (
+            ~lines.index.duplicated(keep=False)[line_positions_by_node])
+
+        # find the closest point on the target line to each terminal node
+        node_positions = numpy.flatnonzero(should_extend)
+        closest_points = shapely.line_interpolate_point(
+            targets[node_positions],
+            shapely.line_locate_point(targets[node_positions], points[node_positions]))
+
+        # compute vectors from the line termini to the closest points on the target lines
+        origins = terminal_coords[node_positions]
+        closest_coords = shapely.get_coordinates(closest_points)
+        extension_vectors = closest_coords - origins
+
+        # compute the magnitudes (lengths) and skip any vectors with a magnitude of zero
+        magnitudes = numpy.sqrt(extension_vectors[:, 0]**2 + extension_vectors[:, 1]**2)
+        nonzero = magnitudes != 0
+        node_positions = node_positions[nonzero]
+        extension_vectors = extension_vectors[nonzero]
+        magnitudes = magnitudes[nonzero]
+        closest_coords = closest_coords[nonzero]
+
+        # compute the extension points, applying overshoot if specified
+        extension_coords = closest_coords + extension_vectors / magnitudes[:, None] * overshoot
+
+        # rebuild the lines that have at least one extended terminus, prepending extension points
+        # for start nodes and appending extension points for end nodes
+        extended_lines = lines.copy()
+        if len(node_positions) == 0:
+            record['output_count'] = 0
+            return extended_lines
+        extended_line_positions = line_positions_by_node[node_positions]
+        changed_line_positions = numpy.unique(extended_line_positions)
+        line_coords, line_coord_indices = shapely.get_coordinates(
+            line_geometries[changed_line_positions], return_index=True)
+        line_coord_positions = changed_line_positions[line_coord_indices]
+        extension_order = numpy.where(is_start[node_positions], -1, len(line_coords))
+        all_coords = numpy.concatenate([line_coords, extension_coords])
+        all_positions = numpy.concatenate([line_coord_positions, extended_line_positions])
+        all_order = numpy.concatenate([numpy.arange(len(line_coords)), extension_order])
+        order = numpy.lexsort((all_order, all_positions))
+        rebuilt_lines = shapely.linestrings(
+            all_coords[order], indices=numpy.searchsorted(changed_line_positions, all_positions[order]))
+
+        # update the line geometries
+        extended_geometries = line_geometries.copy()
+        extended_geometries[changed_line_positions] = rebuilt_lines
+        extended_lines.geometry = geopandas.GeoSeries(
+            extended_geometries, index=lines.index, crs=lines.crs)
+
+        record['output_count'] = len(changed_line_positions)
 
     return extended_lines
+
+
+def _find_nearest_candidates(points: numpy.ndarray, candidates: geopandas.GeoDataFrame, distance_threshold: float, excluded_labels: numpy.ndarray | None = None) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Query all points against the spatial index of the candidates in a single call and find the
+    nearest candidate for each point.
+
+    Ties are resolved in favor of the candidate that comes first in the candidates GeoDataFrame.
+
+    Returns the positions of the points with at least one candidate, the positions of their
+    nearest candidates, and the distances to those candidates.
+    """
+    point_positions, candidate_positions = candidates.sindex.query(
+        points, predicate='dwithin', distance=distance_threshold, sort=True)
+
+    # exclude candidates that are the same as the line from which the point originates
+    if excluded_labels is not None:
+        keep = candidates.index.to_numpy()[candidate_positions] != excluded_labels[point_positions]
+        point_positions = point_positions[keep]
+        candidate_positions = candidate_positions[keep]
+
+    # calculate the distance between each point and each of its candidates
+    distances = shapely.distance(points[point_positions],
+                                 candidates.geometry.to_numpy()[candidate_positions])
+
+    # sort by point, then distance, then candidate order, and keep the first candidate for each point
+    order = numpy.lexsort((candidate_positions, distances, point_positions))
+    point_positions = point_positions[order]
+    unique_point_positions, first = numpy.unique(point_positions, return_index=True)
+
+    return unique_point_positions, candidate_positions[order][first], distances[order][first]
@@ -0,0 +1,164 @@
+"""
+Route over a graph that was exported by export_graph without a database.
+
+Example:
+    python routing_graph.py path/to/graph 12 345
+"""
+
+import argparse
+import heapq
+import json
+import math
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Literal, TypedDict
+
+import numpy
+
+from export_graph import GRAPH_FORMAT_VERSION
+
+
+class ShortestPath(TypedDict):
+    node_ids: list[int]
+    edge_ids: list[int]
+    cost: float
+
+
+class RoutingGraph:
+    """
+    A directed graph in CSR form that is memory-mapped from the arrays written by export_graph,
+    so it loads instantly and its pages are shared between processes that route over it.
+
+    Shortest paths are found with Dijkstra's algorithm or with A* using the straight-line
+    distance to the target (scaled so that it never overestimates the cost) as the heuristic.
+    The costs from a set of sources to many targets are found with a multi-source Dijkstra.
+    """
+
+    def __init__(self, graph_dir: Path):
+        metadata = json.loads((graph_dir / 'graph.json').read_text(encoding='utf-8'))
+        if metadata['format_version'] != GRAPH_FORMAT_VERSION:
+            raise ValueError(f'Unsupported routing graph format version: {metadata["format_version"]}')
+        self.crs: str = metadata['crs']
+        self.heuristic_scale: float = metadata['heuristic_scale']
+
+        self.node_ids = numpy.load(graph_dir / 'node_ids.npy', mmap_mode='r')
+        self.node_coordinates = numpy.load(graph_dir / 'node_coordinates.npy', mmap_mode='r')
+        self.indptr = numpy.load(graph_dir / 'indptr.npy', mmap_mode='r')
+        self.arc_targets = numpy.load(graph_dir / 'arc_targets.npy', mmap_mode='r')
+        self.arc_costs = numpy.load(graph_dir / 'arc_costs.npy', mmap_mode='r')
+        self.arc_edge_ids = numpy.load(graph_dir / 'arc_edge_ids.npy', mmap_mode='r')
+
+    def get_node_position(self, node_id: int) -> int:
+        position = int(numpy.searchsorted(self.node_ids, node_id))
+        if position >= len(self.node_ids) or self.node_ids[position] != node_id:
+            raise KeyError(f'Node not found in routing graph: {node_id}')
+        return position
+
+    def shortest_path(self, source_node_id: int, target_node_id: int, *, algorithm: Literal['dijkstra', 'astar'] = 'astar') -> ShortestPath | None:
+        """
+        Find the cheapest path between two nodes. Returns None if the target cannot be reached.
+        """
+        source = self.get_node_position(source_node_id)
+        target = self.get_node_position(target_node_id)
+
+        target_x, target_y = self.node_coordinates[target]
+        heuristic_scale = self.heuristic_scale if algorithm == 'astar' else 0.0
+
+        def heuristic(position: int) -> float:
+            if heuristic_scale == 0.0:
+                return 0.0
+            x, y = self.node_coordinates[position]
+            return heuristic_scale * math.hypot(x - target_x, y - target_y)
+
+        # the cheapest known cost to each visited node and the arc that reached it
+        costs: dict[int, float] = {source: 0.0}
+        previous_arcs: dict[int, int] = {}
+        settled: set[int] = set()
+        queue: list[tuple[float, int]] = [(heuristic(source), source)]
+
+        while queue:
+            _, position = heapq.heappop(queue)
+            if position in settled:
+                continue
+            if position == target:
+                break
+            settled.add(position)
+
+            cost = costs[position]
+            start, end = int(self.indptr[position]), int(self.indptr[position + 1])
+            arc_targets = self.arc_targets[start:end].tolist()
+            arc_costs = self.arc_costs[start:end].tolist()
+            for arc, (next_position, arc_cost) in enumerate(zip(arc_targets, arc_costs), start):
+                next_cost = cost + arc_cost
+                if next_position not in settled and next_cost < costs.get(next_position, math.inf):
+                    costs[next_position] = next_cost
+                    previous_arcs[next_position] = arc
+                    heapq.heappush(queue, (next_cost + heuristic(next_position), next_position))
+
+        if target not in costs:
+            return None
+
+        # walk back from the target to the source
+        arcs: list[int] = []
+        node_positions = [target]
+        while node_positions[-1] != source:
+            arc = previous_arcs[node_positions[-1]]
+            arcs.append(arc)
+            node_positions.append(int(numpy.searchsorted(self.indptr, arc, side='right')) - 1)
+        arcs.reverse()
+        node_positions.reverse()
+
+        return {
+            'node_ids': [int(self.node_ids[position]) for position in node_positions],
+            'edge_ids': [int(self.arc_edge_ids[arc]) for arc in arcs],
+            'cost': costs[target],
+        }
+
+    def shortest_costs(self, source_node_ids: Sequence[int], target_node_ids: Sequence[int]) -> numpy.ndarray:
+        """
+        Find the cost of the cheapest path from any of the source nodes to each of the target nodes
+        with a single run of Dijkstra's algorithm that starts from all sources at once and stops
+        when every target is settled. Unreachable targets have an infinite cost.
+        """
+        sources = [self.get_node_position(node_id) for node_id in source_node_ids]
+        targets = [self.get_node_position(node_id) for node_id in target_node_ids]
+
+        costs: dict[int, float] = {source: 0.0 for source in sources}
+        settled: set[int] = set()
+        remaining_targets = set(targets)
+        queue: list[tuple[float, int]] = [(0.0, source) for source in set(sources)]
+        heapq.heapify(queue)
+
+        while queue and remaining_targets:
+            cost, position = heapq.heappop(queue)
+            if position in settled:
+                continue
+            settled.add(position)
+            remaining_targets.discard(position)
+
+            start, end = int(self.indptr[position]), int(self.indptr[position + 1])
+            arc_targets = self.arc_targets[start:end].tolist()
+            arc_costs = self.arc_costs[start:end].tolist()
+            for next_position, arc_cost in zip(arc_targets, arc_costs):
+                next_cost = cost + arc_cost
+                if next_position not in settled and next_cost < costs.get(next_position, math.inf):
+                    costs[next_position] = next_cost
+                    heapq.heappush(queue, (next_cost, next_position))
+
+        return numpy.array([costs.get(target, math.inf) for target in targets], dtype=numpy.float64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Find the shortest path between two nodes of an exported routing graph.')
+    parser.add_argument('graph_dir', type=Path, help='The directory of the exported routing graph.')
+    parser.add_argument('source', type=int, help='The id of the start node.')
+    parser.add_argument('target', type=int, help='The id of the end node.')
+    parser.add_argument('--algorithm', choices=['dijkstra', 'astar'], default='astar')
+    args = parser.parse_args()
+
+    path = RoutingGraph(args.graph_dir).shortest_path(args.source, args.target, algorithm=args.algorithm)
+    print(json.dumps(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+from typing import TypedDict, cast
+
+import numpy
+import shapely
+from numpy.typing import ArrayLike
+
+from export_graph import GRAPH_FORMAT_VERSION
+
+
+class SnapResult(TypedDict):
+    edge_ids: numpy.ndarray
+    fractions: numpy.ndarray
+    points: numpy.ndarray
+    distances: numpy.ndarray
+
+
+class SnapIndex:
+    """
+    A spatial index over the edges of a graph that was exported by export_graph, for snapping
+    arbitrary points (e.g., clicked map locations) onto the network.
+
+    The edge coordinates are memory-mapped from the graph directory, and the STRtree is built
+    once when the index is loaded so that every snap is a single vectorized query.
+    """
+
+    def __init__(self, graph_dir: Path):
+        metadata = json.loads((graph_dir / 'graph.json').read_text(encoding='utf-8'))
+        if metadata['format_version'] != GRAPH_FORMAT_VERSION:
+            raise ValueError(f'Unsupported routing graph format version: {metadata["format_version"]}')
+        self.crs: str = metadata['crs']
+
+        self.edge_ids = numpy.load(graph_dir / 'edge_ids.npy', mmap_mode='r')
+        coordinates = numpy.load(graph_dir / 'edge_coordinates.npy', mmap_mode='r')
+        offsets = numpy.load(graph_dir / 'edge_coordinate_offsets.npy', mmap_mode='r')
+
+        # rebuild the edge geometries and their spatial index
+        line_positions = numpy.repeat(numpy.arange(len(self.edge_ids)), numpy.diff(offsets))
+        self.edges = cast(numpy.ndarray, shapely.linestrings(coordinates, indices=line_positions))
+        self.tree = shapely.STRtree(self.edges)
+
+    def snap(self, coordinates: ArrayLike, *, max_distance: float | None = None) -> SnapResult:
+        """
+        Snap each point (an N x 2 array of XY coordinates in the CRS of the graph) to its nearest
+        edge. Ties are resolved in favor of the edge that was exported first.
+
+        Returns, for each point, the id of the nearest edge, the fraction of the edge's length from
+        its start vertex to the snapped point, the XY coordinates of the snapped point, and the
+        distance to it. Points without an edge within `max_distance` get an edge id of -1 and
+        NaN for the other values.
+        """
+        coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        points = cast(numpy.ndarray, shapely.points(coordinates))
+
+        # query all points against the index in a single call and keep the nearest edge of each
+        (point_positions, edge_positions), distances = self.tree.query_nearest(
+            points, max_distance=max_distance, return_distance=True, all_matches=True)
+        order = numpy.lexsort((edge_positions, point_positions))
+        point_positions, edge_positions, distances = \
+            point_positions[order], edge_positions[order], distances[order]
+        point_positions, first = numpy.unique(point_positions, return_index=True)
+        edge_positions, distances = edge_positions[first], distances[first]
+
+        # find the closest point on each nearest edge
+        edges = self.edges[edge_positions]
+        fractions = shapely.line_locate_point(edges, points[point_positions], normalized=True)
+        snapped_points = shapely.get_coordinates(shapely.line_interpolate_point(edges, fractions, normalized=True))
+
+        result: SnapResult = {
+            'edge_ids': numpy.full(len(points), -1, dtype=numpy.int64),
+            'fractions': numpy.full(len(points), numpy.nan),
+            'points': numpy.full((len(points), 2), numpy.nan),
+            'distances': numpy.full(len(points), numpy.nan),
+        }
+        result['edge_ids'][point_positions] = self.edge_ids[edge_positions]
+        result['fractions'][point_positions] = fractions
+        result['points'][point_positions] = snapped_points
+        result['distances'][point_positions] = distances
+        return result
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import pickle
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypeVar
+
+import geopandas
+import pandas
+
+T = TypeVar('T')
+
+
+def hash_ways_input(ways: geopandas.GeoDataFrame | Path) -> str:
+    """
+    Compute a content hash of the input ways: the bytes of the file if a path is provided, or the
+    columns, CRS, attributes, and geometries of the GeoDataFrame.
+    """
+    digest = hashlib.sha256()
+    if isinstance(ways, Path):
+        with open(ways, 'rb') as ways_file:
+            for chunk in iter(lambda: ways_file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    digest.update(json.dumps([str(column) for column in ways.columns]).encode('utf-8'))
+    digest.update(str(ways.crs).encode('utf-8'))
+    contents = pandas.DataFrame(ways.drop(columns=ways.geometry.name))
+    contents['__wkb'] = ways.geometry.to_wkb()
+    digest.update(pandas.util.hash_pandas_object(contents, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    A content-addressed on-disk cache of the outputs of conversion stages.
+
+    Each checkpoint is stored as a pickle named by the hash of the stage name and the values it
+    depends on (typically the key of the previous checkpoint and the stage's parameters), so a
+    changed input or parameter only invalidates the checkpoints that depend on it. When the cache
+    grows beyond `max_bytes`, the least recently used checkpoints are deleted.
+    """
+
+    def __init__(self, cache_dir: Path, *, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def make_key(self, stage: str, *parts: Any) -> str:
+        return hashlib.sha256(json.dumps([stage, *parts], default=str).encode('utf-8')).hexdigest()
+
+    def _get_path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}.pkl'
+
+    def get(self, key: str) -> Any | None:
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as checkpoint_file:
+                value = pickle.load(checkpoint_file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # mark the checkpoint as recently used
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        # write to a temporary file first so that an interrupted write never leaves a partial checkpoint
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._get_path(key)
+        temporary_path = path.with_name(path.name + '.tmp')
+        with open(temporary_path, 'wb') as checkpoint_file:
+            pickle.dump(value, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+        temporary_path.replace(path)
+        self._evict(keep=path)
+
+    def _evict(self, keep: Path) -> None:
+        """
+        Delete the least recently used checkpoints until the cache fits in the size cap.
+        """
+        checkpoints = [(path.stat(), path) for path in self.cache_dir.glob('*.pkl')]
+        total_bytes = sum(stat.st_size for stat, _ in checkpoints)
+        for stat, path in sorted(checkpoints, key=lambda checkpoint: checkpoint[0].st_mtime):
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total_bytes -= stat.st_size
+
+    def checkpoint(self, stage: str, key: str, compute: Callable[[], T]) -> T:
+        """
+        Return the cached output of a stage, or compute and cache it.
+        """
+        value = self.get(key)
+        if value is not None:
+            print(f'  Resuming from the cached {stage} checkpoint.')
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
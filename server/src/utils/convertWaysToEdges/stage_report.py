@@ -0,0 +1,179 @@
+import cProfile
+import json
+import resource
+import sys
+import time
+from collections.abc import Callable, Collection, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Literal, TypedDict
+
+
+class StageRecord(TypedDict):
+    stage: str
+    depth: int
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_bytes: int
+    input_count: int | None
+    output_count: int | None
+    profile_path: str | None
+
+
+class StageReport:
+    """
+    Collects timing and memory measurements for the stages of the conversion.
+
+    Each stage is recorded with its path (e.g., 'e1/node' for the noding stage inside step 1),
+    its wall time, its CPU time (including the time of child processes that finished during the
+    stage), the peak resident set size of the process at the end of the stage, and the number of
+    input and output features if the stage reports them. Parent stages are recorded before their
+    child stages.
+
+    If a profiler is specified, the stages in `profile_stages` (or all top-level stages if not
+    specified) are profiled, and the profiles are saved to `profile_dir`: a .prof file for
+    cProfile or an .html file for pyinstrument (which must be installed separately). Stages inside
+    a profiled stage are not profiled separately because profilers cannot be nested.
+
+    If `check_cancelled` is specified, it is called when each stage starts and when it finishes,
+    so that it can stop the conversion between stages by raising an exception.
+
+    Activate a report with use_report to record the stages of any code that runs inside it.
+    """
+
+    def __init__(self, *, profiler: Literal['cprofile', 'pyinstrument'] | None = None, profile_stages: Collection[str] | None = None, profile_dir: Path | None = None, check_cancelled: Callable[[], None] | None = None):
+        if profiler is not None and profile_dir is None:
+            raise ValueError('A profile directory is required to save stage profiles.')
+        self.records: list[StageRecord] = []
+        self.profiler = profiler
+        self.profile_stages = profile_stages
+        self.profile_dir = profile_dir
+        self.check_cancelled = check_cancelled
+        self._stage_path: list[str] = []
+        self._is_profiling = False
+
+    def to_json(self) -> str:
+        return json.dumps(self.records)
+
+    def to_ndjson(self) -> str:
+        return '\n'.join(json.dumps(record) for record in self.records)
+
+    def _should_profile(self, stage_path: str) -> bool:
+        if self.profiler is None or self._is_profiling:
+            return False
+        if self.profile_stages is None:
+            return len(self._stage_path) == 1
+        return stage_path in self.profile_stages
+
+    @contextmanager
+    def stage(self, name: str, *, input_count: int | None = None) -> Iterator[StageRecord]:
+        if self.check_cancelled is not None:
+            self.check_cancelled()
+
+        self._stage_path.append(name)
+        stage_path = '/'.join(self._stage_path)
+        record: StageRecord = {
+            'stage': stage_path,
+            'depth': len(self._stage_path) - 1,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'peak_rss_bytes': 0,
+            'input_count': input_count,
+            'output_count': None,
+            'profile_path': None,
+        }
+        self.records.append(record)
+
+        profiler: Any = None
+        if self._should_profile(stage_path):
+            self._is_profiling = True
+            if self.profiler == 'pyinstrument':
+                from pyinstrument import Profiler  # type: ignore[import-not-found]
+                profiler = Profiler()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+        start_wall_time = time.perf_counter()
+        start_cpu_time = _get_cpu_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - start_wall_time
+            record['cpu_seconds'] = _get_cpu_time() - start_cpu_time
+            record['peak_rss_bytes'] = get_peak_rss_bytes()
+            self._stage_path.pop()
+
+            if profiler is not None:
+                self._is_profiling = False
+                assert self.profile_dir is not None
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profile_name = stage_path.replace('/', '.')
+                if self.profiler == 'pyinstrument':
+                    profiler.stop()
+                    profile_path = self.profile_dir / f'{profile_name}.html'
+                    profile_path.write_text(profiler.output_html(), encoding='utf-8')
+                else:
+                    profiler.disable()
+                    profile_path = self.profile_dir / f'{profile_name}.prof'
+                    profiler.dump_stats(profile_path)
+                record['profile_path'] = str(profile_path)
+
+        if self.check_cancelled is not None:
+            self.check_cancelled()
+
+
+def _get_cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime
+
+
+def get_peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+_active_report: ContextVar[StageReport | None] = ContextVar('active_report', default=None)
+
+
+@contextmanager
+def use_report(report: StageReport | None) -> Iterator[StageReport | None]:
+    """
+    Record the stages that run inside this context in the report.
+    """
+    token = _active_report.set(report)
+    try:
+        yield report
+    finally:
+        _active_report.reset(token)
+
+
+@contextmanager
+def stage(name: str, *, input_count: int | None = None) -> Iterator[StageRecord]:
+    """
+    Measure a stage of the conversion in the active report (see use_report). If there is no
+    active report, nothing is recorded.
+
+    Set `output_count` on the yielded record to report the number of output features.
+    """
+    report = _active_report.get()
+    if report is None:
+        yield {
+            'stage': name,
+            'depth': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'peak_rss_bytes': 0,
+            'input_count': input_count,
+            'output_count': None,
+            'profile_path': None,
+        }
+        return
+
+    with report.stage(name, input_count=input_count) as record:
+        yield record
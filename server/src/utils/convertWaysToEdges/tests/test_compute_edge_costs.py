@@ -0,0 +1,21 @@
+import geopandas
+import pytest
+import shapely
+from pyproj import Geod
+
+from compute_edge_costs import compute_edge_costs
+
+
+def test_costs_use_geodesic_metres() -> None:
+    # a north-south and an east-west line near the campus, measured in web mercator (where they are
+    # about 1/cos(35°) = 1.22 times too long)
+    lines = [shapely.LineString([(-82.44, 34.92), (-82.44, 34.929)]),
+             shapely.MultiLineString([[(-82.44, 34.92), (-82.435, 34.92)], [(-82.435, 34.92), (-82.43, 34.92)]])]
+    edges = geopandas.GeoDataFrame(geometry=lines, crs='EPSG:4326').to_crs('EPSG:3857')
+
+    costs = compute_edge_costs(edges, {'distance': {'multiplier': 2.0}})
+
+    geod = Geod(ellps='WGS84')
+    assert costs['cost__distance'].tolist() == pytest.approx([2 * geod.geometry_length(line) for line in lines])
+    assert costs['reverse_cost__distance'].tolist() == costs['cost__distance'].tolist()
+    assert costs['cost__distance'].tolist() != pytest.approx((2 * edges.length).tolist(), rel=0.1)
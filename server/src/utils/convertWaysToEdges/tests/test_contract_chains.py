@@ -0,0 +1,59 @@
+import geopandas
+import shapely
+
+from consolidate_nodes import consolidate_nodes
+from contract_chains import contract_chains
+
+
+def _get_vertices(edges: geopandas.GeoDataFrame, label: int) -> list[int]:
+    return edges.loc[[label], ['start_vertex', 'end_vertex']].to_numpy(dtype=int)[0].tolist()
+
+
+def test_contract_chains() -> None:
+    # a chain from (0, 0) to (3, 0) with its middle edge drawn backwards, a path up from (3, 0)
+    # that becomes stairs at (3, 1), a dangling path down from (3, 0), and a separate square loop
+    lines = [
+        ([(0, 0), (1, 0)], 'path'),
+        ([(2, 0), (1, 0)], 'path'),
+        ([(2, 0), (3, 0)], 'path'),
+        ([(3, 0), (3, 1)], 'path'),
+        ([(3, 1), (3, 2)], 'stairs'),
+        ([(3, 0), (3, -1)], 'path'),
+        ([(10, 0), (11, 0)], 'path'),
+        ([(11, 0), (11, 1)], 'path'),
+        ([(11, 1), (10, 1)], 'path'),
+        ([(10, 1), (10, 0)], 'path'),
+    ]
+    edges = geopandas.GeoDataFrame(
+        {'kind': [kind for _, kind in lines]},
+        geometry=[shapely.LineString(coords) for coords, _ in lines], crs='EPSG:3857')
+    consolidate_nodes_result = consolidate_nodes(edges)
+    nodes = consolidate_nodes_result['nodes']
+    node_ids = {tuple(coords): node_id for coords, node_id in zip(
+        shapely.get_coordinates(nodes.geometry.to_numpy()).tolist(), nodes.index.tolist())}
+
+    result = contract_chains(consolidate_nodes_result['edges'], nodes)
+    contracted_edges = result['edges']
+    edge_mapping = result['edge_mapping']
+
+    # the chain becomes its first edge, and the nodes of degree 2 inside it are removed
+    assert contracted_edges.index.tolist() == [0, 3, 4, 5, 6]
+    assert contracted_edges.geometry[0].equals_exact(shapely.LineString([(0, 0), (1, 0), (2, 0), (3, 0)]), 0)
+    assert _get_vertices(contracted_edges, 0) == [node_ids[(0, 0)], node_ids[(3, 0)]]
+    chain_mapping = edge_mapping[edge_mapping['edge_id'] == 0]
+    assert chain_mapping['original_edge_id'].tolist() == [0, 1, 2]
+    assert chain_mapping['reversed'].tolist() == [False, True, False]
+
+    # the path and the stairs are not merged, so the node between them is kept
+    assert _get_vertices(contracted_edges, 3) == [node_ids[(3, 0)], node_ids[(3, 1)]]
+    assert _get_vertices(contracted_edges, 4) == [node_ids[(3, 1)], node_ids[(3, 2)]]
+
+    # the loop becomes a single edge that starts and ends at the start of its first edge
+    assert contracted_edges.geometry[6].equals_exact(
+        shapely.LineString([(10, 0), (11, 0), (11, 1), (10, 1), (10, 0)]), 0)
+    assert _get_vertices(contracted_edges, 6) == [node_ids[(10, 0)], node_ids[(10, 0)]]
+    assert edge_mapping[edge_mapping['edge_id'] == 6]['original_edge_id'].tolist() == [6, 7, 8, 9]
+
+    assert sorted(result['nodes'].index.tolist()) == sorted(
+        node_ids[coords] for coords in [(0, 0), (3, 0), (3, 1), (3, 2), (3, -1), (10, 0)])
+    assert result['nodes'].at[node_ids[(3, 0)], 'edges'] == [0, 3, 5]
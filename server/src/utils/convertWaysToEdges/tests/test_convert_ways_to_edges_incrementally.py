@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Any
+
+import geopandas
+import numpy
+import shapely
+
+from benchmark import generate_synthetic_ways
+from convert_ways_to_edges import convert_ways_to_edges
+from convert_ways_to_edges_incrementally import convert_ways_to_edges_incrementally
+
+
+def _get_geometries(edges: geopandas.GeoDataFrame) -> list[str]:
+    return sorted(shapely.to_wkt(shapely.normalize(shapely.set_precision(edges.geometry.to_numpy(), 0.0001))))
+
+
+def test_repeated_update_keeps_edges(tmp_path: Path) -> None:
+    # with buffer attribute transfer, the lines that moved onto the precision grid are not within
+    # the buffers of their ways, so many of their edges have no way id
+    options: dict[str, Any] = {'attribute_transfer': 'buffer', 'remove_duplicate_lines': True, 'precision_grid': 0.5}
+    ways = generate_synthetic_ways(200, seed=3)
+    ways = ways[ways.is_valid].reset_index(drop=True)
+    ways['way_id'] = numpy.arange(1, len(ways) + 1)
+
+    # move some lines and delete others
+    line_positions = numpy.flatnonzero(ways.geom_type == 'LineString')
+    geometries = ways.geometry.to_numpy().copy()
+    geometries[line_positions[::8]] = shapely.transform(geometries[line_positions[::8]], lambda xy: xy + [1.0, 0.7])
+    updated_ways = ways.set_geometry(geometries).drop(index=ways.index[line_positions[4::8]])
+
+    # apply the update, undo it, and apply it again
+    state_path = tmp_path / 'state.pkl'
+    results = [
+        convert_ways_to_edges_incrementally(version, state_path, 3.2, 1.6, False, 'EPSG:3857', **options)['edges']
+        for version in [ways, updated_ways, ways, updated_ways]
+    ]
+    full_edges = convert_ways_to_edges(updated_ways, 3.2, 1.6, False, 'EPSG:3857', **options)['edges']
+
+    assert full_edges['way_id'].isna().any()
+    assert len(results[2]) == len(results[0])
+    assert len(results[3]) == len(results[1]) == len(full_edges)
+    assert _get_geometries(results[3]) == _get_geometries(full_edges)
@@ -0,0 +1,20 @@
+import numpy
+import pytest
+
+from create_polygon_skeletons import get_entrance_pairs
+
+
+@pytest.mark.parametrize('nearest_k', [1, 3, 5])
+def test_nearest_pairs_match_distance_matrix(nearest_k: int) -> None:
+    # entrances on a coarse grid, so that many distances are tied and some entrances coincide
+    rng = numpy.random.default_rng(5)
+    coords = numpy.round(rng.uniform(0, 100, (150, 2)) / 10) * 10
+
+    deltas = coords[:, None, :] - coords[None, :, :]
+    distances = numpy.hypot(deltas[:, :, 0], deltas[:, :, 1])
+    numpy.fill_diagonal(distances, numpy.inf)
+    nearest = numpy.argsort(distances, axis=1, kind='stable')[:, :nearest_k]
+    expected_pairs = numpy.unique(numpy.sort(numpy.column_stack(
+        [numpy.repeat(numpy.arange(len(coords)), nearest_k), nearest.ravel()]), axis=1), axis=0)
+
+    assert numpy.array_equal(get_entrance_pairs(coords, 'nearest', nearest_k), expected_pairs)
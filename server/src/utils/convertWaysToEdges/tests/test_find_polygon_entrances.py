@@ -0,0 +1,23 @@
+import pytest
+
+from benchmark import generate_synthetic_ways
+from convert_ways_to_edges import convert_ways_to_edges
+
+
+@pytest.mark.parametrize('precision_grid', [0.000001, 0.001])
+def test_precision_grid_keeps_entrances(precision_grid: float) -> None:
+    # a street grid with plazas, rotated so that no line is axis-aligned and moved to web
+    # mercator coordinates of a realistic magnitude (only the valid polygons are kept, because
+    # repairing a self-intersecting polygon leaves entrances that the grid merges)
+    ways = generate_synthetic_ways(300, seed=2)
+    ways = ways[ways.is_valid]
+    ways = ways.set_geometry(ways.geometry.rotate(71.0, origin=(0, 0)).translate(-9177000.123, 4153000.456))
+
+    entrances = convert_ways_to_edges(
+        ways, 3.2, 1.6, False, 'EPSG:3857', remove_duplicate_lines=True)['entrances']
+    snapped_entrances = convert_ways_to_edges(
+        ways, 3.2, 1.6, False, 'EPSG:3857', remove_duplicate_lines=True, precision_grid=precision_grid)['entrances']
+
+    assert len(entrances) > 0
+    assert snapped_entrances.groupby('polygon_id').size().to_dict() == \
+        entrances.groupby('polygon_id').size().to_dict()
@@ -0,0 +1,57 @@
+import geopandas
+import numpy
+import pytest
+import shapely
+
+from lines_to_edges import lines_to_edges
+
+
+def _random_lines(count: int, seed: int) -> geopandas.GeoDataFrame:
+    """
+    Random, non-axis-aligned lines in a web mercator extent, half of which end on (or overshoot
+    by 0.000001) another line like the lines connected by resolve_unconnected_line_ends.
+    """
+    rng = numpy.random.default_rng(seed)
+    origin = numpy.array([-9177000.0, 4153000.0])
+    lines = []
+    for _ in range(count):
+        vertex_count = rng.integers(2, 5)
+        start = origin + rng.uniform(0, 600, 2)
+        lines.append(shapely.LineString(start + numpy.cumsum(rng.uniform(-60, 60, (vertex_count, 2)), axis=0)))
+    for position in range(count // 2):
+        target = lines[rng.integers(count)]
+        end = numpy.array(shapely.line_interpolate_point(target, rng.uniform(0.1, 0.9), normalized=True).coords[0])
+        start = end + rng.uniform(-40, 40, 2)
+        direction = (end - start) / numpy.linalg.norm(end - start)
+        lines.append(shapely.LineString([start, end + direction * 0.000001 * (position % 2)]))
+    return geopandas.GeoDataFrame({'way_id': numpy.arange(len(lines))}, geometry=lines, crs='EPSG:3857')
+
+
+def _get_topology(edges: geopandas.GeoDataFrame) -> tuple[int, int, int]:
+    """
+    Count the edges, the nodes (distinct edge termini), and the pairs of edges that cross without
+    a shared node.
+    """
+    geometries = edges.geometry.to_numpy()
+    termini = numpy.concatenate([
+        shapely.get_coordinates(shapely.get_point(geometries, 0)),
+        shapely.get_coordinates(shapely.get_point(geometries, -1)),
+    ])
+    first, second = shapely.STRtree(geometries).query(geometries, predicate='crosses')
+    return len(geometries), len(numpy.unique(termini, axis=0)), int((first < second).sum())
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('tile_size', [90.0, 250.0])
+def test_tiled_edges_match_untiled_edges(seed: int, tile_size: float) -> None:
+    lines = _random_lines(600, seed)
+
+    untiled_edges = lines_to_edges(lines, False, grid_size=0.000001, attribute_transfer='lineage')['edges']
+    tiled_edges = lines_to_edges(
+        lines, False, tile_size=tile_size, max_workers=2, attribute_transfer='lineage')['edges']
+
+    untiled_topology = _get_topology(untiled_edges)
+    assert _get_topology(tiled_edges) == untiled_topology
+    assert untiled_topology[2] == 0
+    assert sorted(shapely.normalize(tiled_edges.geometry.to_numpy()).tolist(), key=lambda line: line.wkb) == \
+        sorted(shapely.normalize(untiled_edges.geometry.to_numpy()).tolist(), key=lambda line: line.wkb)
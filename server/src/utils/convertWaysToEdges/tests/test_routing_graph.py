@@ -0,0 +1,80 @@
+import itertools
+import math
+from pathlib import Path
+
+import geopandas
+import numpy
+import pytest
+import shapely
+
+from export_graph import export_graph
+from routing_graph import RoutingGraph
+
+
+@pytest.fixture
+def graph(tmp_path: Path) -> RoutingGraph:
+    """
+    A small graph with node ids that are not positions:
+
+        40
+       /  \\
+     10 -- 20 -> 30      50 -- 60
+            \\
+             v
+             25
+
+    The arcs from 20 to 30 and to 25 are one-way (negative reverse costs), so node 25 has no
+    outgoing arcs and the arcs of node 30 start where those of node 25 would.
+    """
+    node_coordinates = {10: (0, 0), 20: (1, 0), 25: (1.5, -1), 30: (2, 0), 40: (1, 1), 50: (5, 5), 60: (6, 5)}
+    edge_rows = [
+        # edge id, start vertex, end vertex, cost, reverse cost
+        (100, 10, 20, 1.0, 1.0),
+        (101, 20, 30, 1.0, -1.0),
+        (102, 10, 40, 1.5, 1.5),
+        (103, 40, 30, 1.5, 1.5),
+        (104, 20, 25, 1.2, -1.0),
+        (105, 50, 60, 1.0, 1.0),
+    ]
+    nodes = geopandas.GeoDataFrame(
+        geometry=shapely.points(list(node_coordinates.values())),
+        index=list(node_coordinates.keys()), crs='EPSG:3857')
+    edges = geopandas.GeoDataFrame({
+        'edge_id': [row[0] for row in edge_rows],
+        'start_vertex': [row[1] for row in edge_rows],
+        'end_vertex': [row[2] for row in edge_rows],
+        'cost__distance': [row[3] for row in edge_rows],
+        'reverse_cost__distance': [row[4] for row in edge_rows],
+    }, geometry=[shapely.LineString([node_coordinates[row[1]], node_coordinates[row[2]]]) for row in edge_rows],
+        crs='EPSG:3857')
+    return RoutingGraph(export_graph({'edges': edges, 'nodes': nodes, 'orphans': edges.iloc[:0]},
+                                     tmp_path, 'EPSG:3857'))
+
+
+def test_shortest_path_rebuilds_arcs(graph: RoutingGraph) -> None:
+    assert graph.shortest_path(10, 30, algorithm='dijkstra') == \
+        {'node_ids': [10, 20, 30], 'edge_ids': [100, 101], 'cost': 2.0}
+    assert graph.shortest_path(10, 25, algorithm='dijkstra') == \
+        {'node_ids': [10, 20, 25], 'edge_ids': [100, 104], 'cost': 2.2}
+
+    # (the first arc of node 30 is at the end of the empty arc range of node 25)
+    assert graph.shortest_path(30, 10, algorithm='dijkstra') == \
+        {'node_ids': [30, 40, 10], 'edge_ids': [103, 102], 'cost': 3.0}
+
+
+def test_negative_costs_are_one_way(graph: RoutingGraph) -> None:
+    assert graph.shortest_path(25, 20) is None
+    assert graph.shortest_path(25, 10) is None
+    numpy.testing.assert_allclose(graph.shortest_costs([30], [20, 25, 10]), [4.0, 5.2, 3.0])
+    numpy.testing.assert_array_equal(graph.shortest_costs([10], [50, 60]), [math.inf, math.inf])
+
+
+def test_astar_matches_dijkstra(graph: RoutingGraph) -> None:
+    for source, target in itertools.permutations([10, 20, 25, 30, 40, 50, 60], 2):
+        dijkstra_path = graph.shortest_path(source, target, algorithm='dijkstra')
+        astar_path = graph.shortest_path(source, target, algorithm='astar')
+        if dijkstra_path is None or astar_path is None:
+            assert dijkstra_path is astar_path is None
+        else:
+            assert astar_path['cost'] == pytest.approx(dijkstra_path['cost'])
+            assert astar_path['cost'] == pytest.approx(graph.shortest_costs([source], [target])[0])
@@ -0,0 +1,26 @@
+import pytest
+
+from stage_report import StageReport, stage, use_report
+
+
+class _Cancelled(BaseException):
+    pass
+
+
+def test_check_cancelled_stops_at_stage_boundaries() -> None:
+    cancelled = False
+
+    def check_cancelled() -> None:
+        if cancelled:
+            raise _Cancelled()
+
+    finished_stages: list[str] = []
+    with use_report(StageReport(check_cancelled=check_cancelled)), pytest.raises(_Cancelled):
+        with stage('first'):
+            # a silent stage is stopped when it finishes
+            cancelled = True
+            finished_stages.append('first')
+        with stage('second'):
+            finished_stages.append('second')
+
+    assert finished_stages == ['first']
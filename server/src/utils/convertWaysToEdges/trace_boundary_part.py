@@ -1,14 +1,136 @@
+from collections.abc import Sequence
+
+import numpy
+import shapely
 from shapely.geometry import LineString, MultiLineString, Point
-from shapely.geometry.base import GeometrySequence
-from shapely.ops import substring
 
 
-def trace_boundary_part(boundaries: GeometrySequence[MultiLineString], start_point: Point, end_point: Point, *, prefer_shortest: bool = True) -> LineString | MultiLineString | None:
+class BoundaryIndex:
+    """
+    A linear-referencing index of the rings of a polygon boundary, built once per polygon so that
+    many boundary parts can be traced without buffering or splitting the rings again.
+
+    The index holds the coordinates of each ring and the cumulative length along the ring at each
+    of its vertices, so each boundary part is the interpolated start and end points and the slice
+    of ring vertices between them (found with a binary search).
+    """
+
+    def __init__(self, boundaries: Sequence[LineString], *, tolerance: float = 0.000001):
+        self.tolerance = tolerance
+        self.rings = numpy.array([boundary for boundary in boundaries if isinstance(boundary, LineString)], dtype=object)
+        self.ring_coordinates: list[numpy.ndarray] = []
+        self.ring_distances: list[numpy.ndarray] = []
+        for ring in self.rings:
+            coordinates = shapely.get_coordinates(ring)
+            segment_lengths = numpy.sqrt(numpy.sum(numpy.diff(coordinates, axis=0) ** 2, axis=1))
+            self.ring_coordinates.append(coordinates)
+            self.ring_distances.append(numpy.concatenate([[0.0], numpy.cumsum(segment_lengths)]))
+        self.ring_lengths = shapely.length(self.rings) if len(self.rings) > 0 else numpy.array([])
+        self.tree = shapely.STRtree(self.rings)
+
+    def find_rings(self, start_points: numpy.ndarray, end_points: numpy.ndarray) -> numpy.ndarray:
+        """
+        Find the position of the first ring that is within the tolerance of both the start point
+        and the end point of each pair, or -1 if there is no such ring.
+        """
+        ring_positions = numpy.full(len(start_points), -1, dtype=numpy.int64)
+        if len(self.rings) == 0:
+            return ring_positions
+
+        # query the rings near the start points and near the end points, and keep the (pair, ring)
+        # keys that are in both (sorted, so the first key of each pair has its first ring)
+        ring_count = len(self.rings)
+        start_pairs, start_rings = self.tree.query(start_points, predicate='dwithin', distance=self.tolerance)
+        end_pairs, end_rings = self.tree.query(end_points, predicate='dwithin', distance=self.tolerance)
+        keys = numpy.intersect1d(start_pairs * ring_count + start_rings, end_pairs * ring_count + end_rings)
+        pair_positions, first = numpy.unique(keys // ring_count, return_index=True)
+        ring_positions[pair_positions] = keys[first] % ring_count
+        return ring_positions
+
+    def _get_part(self, ring_position: int, start_distance: float, end_distance: float, start_coordinates: numpy.ndarray, end_coordinates: numpy.ndarray) -> numpy.ndarray | None:
+        """
+        Get the coordinates of the part of a ring between two distances along it (like
+        shapely.ops.substring), or None if the part is a point.
+        """
+        if start_distance == end_distance:
+            return None
+        distances = self.ring_distances[ring_position]
+        first = numpy.searchsorted(distances, start_distance, side='right')
+        # (the last vertex is never included because it is the end of the ring)
+        last = min(int(numpy.searchsorted(distances, end_distance, side='left')), len(distances) - 1)
+        return numpy.concatenate([
+            start_coordinates[None, :],
+            self.ring_coordinates[ring_position][first:max(first, last)],
+            end_coordinates[None, :],
+        ])
+
+    def trace(self, start_points: numpy.ndarray, end_points: numpy.ndarray, *, prefer_shortest: bool = True) -> list[LineString | MultiLineString | None]:
+        """
+        Trace the boundary part from each start point to each end point (arrays of shapely Points)
+        along the ring that includes both points. See trace_boundary_part.
+        """
+        start_points = numpy.asarray(start_points, dtype=object)
+        end_points = numpy.asarray(end_points, dtype=object)
+        traced_parts: list[LineString | MultiLineString | None] = [None] * len(start_points)
+        ring_positions = self.find_rings(start_points, end_points)
+        traced = numpy.flatnonzero(ring_positions >= 0)
+        if len(traced) == 0:
+            return traced_parts
+        rings = self.rings[ring_positions[traced]]
+        ring_lengths = self.ring_lengths[ring_positions[traced]]
+
+        # compute the distances along the ring to each point and the lengths of both possible paths
+        start_distances = shapely.line_locate_point(rings, start_points[traced])
+        end_distances = shapely.line_locate_point(rings, end_points[traced])
+        forward_lengths = (end_distances - start_distances) % ring_lengths
+        reverse_lengths = ring_lengths - forward_lengths
+
+        # trace forward from the start point if that matches the preference, and otherwise
+        # trace forward from the end point
+        is_forward = (forward_lengths <= reverse_lengths) == prefer_shortest
+        from_distances = numpy.where(is_forward, start_distances, end_distances)
+        to_distances = numpy.where(is_forward, end_distances, start_distances)
+        from_coordinates = shapely.get_coordinates(shapely.line_interpolate_point(rings, from_distances))
+        to_coordinates = shapely.get_coordinates(shapely.line_interpolate_point(rings, to_distances))
+        ring_start_coordinates = shapely.get_coordinates(shapely.line_interpolate_point(rings, 0.0))
+        ring_end_coordinates = shapely.get_coordinates(shapely.line_interpolate_point(rings, ring_lengths))
+
+        for position, pair in enumerate(traced.tolist()):
+            ring_position = int(ring_positions[pair])
+            from_distance, to_distance = float(from_distances[position]), float(to_distances[position])
+
+            # the part is contained between the ring's starting and ending points
+            if from_distance <= to_distance:
+                coordinates = self._get_part(
+                    ring_position, from_distance, to_distance, from_coordinates[position], to_coordinates[position])
+                if coordinates is not None:
+                    traced_parts[pair] = LineString(coordinates)
+                continue
+
+            # the part crosses the ring's starting and ending point, so it is traced in two parts
+            parts = [
+                self._get_part(ring_position, from_distance, float(ring_lengths[position]),
+                               from_coordinates[position], ring_end_coordinates[position]),
+                self._get_part(ring_position, 0.0, to_distance,
+                               ring_start_coordinates[position], to_coordinates[position]),
+            ]
+            lines = [LineString(coordinates) for coordinates in parts if coordinates is not None]
+            if len(lines) == 1:
+                traced_parts[pair] = lines[0]
+            elif len(lines) == 2:
+                traced_parts[pair] = MultiLineString(lines)
+
+        return traced_parts
+
+
+def trace_boundary_part(boundaries: Sequence[LineString], start_point: Point, end_point: Point, *, prefer_shortest: bool = True) -> LineString | MultiLineString | None:
     """
     Trace a boundary part from start_point to end_point within the given boundaries.
 
+    To trace many parts of the same boundaries, build a BoundaryIndex once and trace them in a batch.
+
     Args:
-        boundaries (GeometrySequence[MultiLineString]): A sequence of MultiLineString geometries representing boundaries.
+        boundaries (Sequence[LineString]): A sequence of LineString geometries representing boundaries (e.g., polygon rings).
         start_point (Point): The starting point for tracing.
         end_point (Point): The ending point for tracing.
         prefer_shortest (bool, optional): If True, prefer the shortest path. Defaults to True.
@@ -16,72 +138,6 @@ def trace_boundary_part(boundaries: GeometrySequence[MultiLineString], start_poi
     Returns:
         MultiLineString: The traced boundary part as a MultiLineString.
     """
-    # find the polygon boundary that includes both points
-    poly_boundary: LineString | None = None
-    for boundary in boundaries:
-        if not isinstance(boundary, LineString):
-            continue
-        if start_point.within(boundary.buffer(0.000001)) and end_point.within(boundary.buffer(0.000001)):
-            poly_boundary = boundary
-            break
-    if poly_boundary is None:
-        return
-
-    # compute the distances along the boundary to each point
-    distance_along_boundary_to_start_point = poly_boundary.project(start_point)
-    distance_along_boundary_to_end_point = poly_boundary.project(end_point)
-
-    # compute the lengths of both possible paths
-    forward_length = (distance_along_boundary_to_end_point -
-                      distance_along_boundary_to_start_point) % poly_boundary.length
-    reverse_length = poly_boundary.length - forward_length
-
-    # resolve the correct distances for tracing based on preferences
-    forward_is_shorter = forward_length <= reverse_length
-    print(forward_is_shorter, prefer_shortest)
-    start_dist: float
-    end_dist: float
-    if prefer_shortest and forward_is_shorter:
-        start_dist = distance_along_boundary_to_start_point
-        end_dist = distance_along_boundary_to_end_point
-    elif prefer_shortest and not forward_is_shorter:
-        start_dist = distance_along_boundary_to_end_point
-        end_dist = distance_along_boundary_to_start_point
-    elif not prefer_shortest and forward_is_shorter:
-        start_dist = distance_along_boundary_to_end_point
-        end_dist = distance_along_boundary_to_start_point
-    else:  # not prefer_shortest and not forward_is_shorter
-        start_dist = distance_along_boundary_to_start_point
-        end_dist = distance_along_boundary_to_end_point
-
-    # handle case where the segment to trace is fully contained within
-    # the polygon's starting and ending points
-    if start_dist <= end_dist:
-        boundary_segment = substring(
-            poly_boundary,
-            start_dist,
-            end_dist,
-            normalized=False,
-        )
-
-    # handle case where the segment to trace crosses the boundary start/end point
-    else:
-        boundary_segment_part1 = substring(
-            poly_boundary,
-            start_dist,
-            poly_boundary.length,
-            normalized=False,
-        )
-        boundary_segment_part2 = substring(
-            poly_boundary,
-            0,
-            end_dist,
-            normalized=False,
-        )
-        boundary_segment = boundary_segment_part1.union(boundary_segment_part2)
-
-    if isinstance(boundary_segment, LineString):
-        return boundary_segment
-    elif isinstance(boundary_segment, MultiLineString):
-        return boundary_segment
-    return None
+    return BoundaryIndex(boundaries).trace(
+        numpy.array([start_point], dtype=object), numpy.array([end_point], dtype=object),
+        prefer_shortest=prefer_shortest)[0]
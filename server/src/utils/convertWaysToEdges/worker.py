@@ -0,0 +1,294 @@
+"""
+A long-lived worker process that converts ways to edges.
+
+The worker connects to a Unix socket and exchanges JSON messages (one per line) over it, so the
+Python interpreter and its imports are loaded once instead of once per conversion.
+
+Messages received by the worker:
+- {"type": "convert", "id": ..., "ways_path": ..., "edges_paths": [...], "connection_tolerance": ...,
+   "min_edge_length": ..., "no_orphans": ..., "intermediate_crs": ..., "incremental_state_path": ...,
+   "profiler": ..., "profile_stages": [...], "profile_dir": ..., "columns": [...], "bbox": [...],
+   "use_arrow": ..., "geometry_encoding": ..., "min_component_edges": ..., "min_component_length": ...,
+   "drop_small_components": ..., "cost_profiles": {...}, "graph_dir": ..., "graph_cost_profile": ...,
+   "cache_dir": ..., "cache_max_bytes": ..., "remove_duplicate_lines": ..., "precision_grid": ...,
+   "contract_degree_two_nodes": ..., "contraction_attributes": [...], "low_memory": ...,
+   "memory_budget": ..., "distance_matrix": ...}
+- {"type": "cancel", "id": ...}
+- {"type": "shutdown"}
+
+Messages sent by the worker:
+- {"type": "ready", "pid": ...}
+- {"type": "progress", "id": ..., "message": ...} for every line that a job prints
+- {"type": "done", "id": ..., "paths": [...], "report": [...], "remaining_jobs": ...}
+- {"type": "error", "id": ..., "message": ..., "traceback": ..., "remaining_jobs": ...}
+- {"type": "cancelled", "id": ..., "remaining_jobs": ...}
+- {"type": "exit", "reason": "recycle" | "shutdown"}
+
+The report of a finished job lists the measurements of each stage of the conversion (see
+stage_report.StageRecord). The optional profiler ('cprofile' or 'pyinstrument') profiles the
+stages in profile_stages (or the top-level stages) and saves the profiles to profile_dir.
+
+The optional columns, bbox, and use_arrow control how the ways are read (see read_ways), and
+use_arrow and geometry_encoding control how the results are written (see write_edges_result).
+
+If remove_duplicate_lines is true, duplicate and covered lines are removed before splitting,
+after snapping to the optional precision_grid (see deduplicate_lines). If
+contract_degree_two_nodes is true, chains of edges with the same contraction_attributes are merged
+through nodes of degree 2, and the edge mapping is written next to each edges file (see
+contract_chains). The optional low_memory and memory_budget (in bytes) reduce the peak memory
+of the conversion (see convert_ways_to_edges).
+
+The optional cost_profiles replace the default cost profiles (see compute_edge_costs). If
+graph_dir is provided, the routing graph is also exported there with the costs of
+graph_cost_profile (see export_graph), and the directory is included in the paths of the
+finished job. If distance_matrix is also true, the costs between every pair of polygons are
+exported to the same directory (see export_distance_matrix) from the polygon entrances, which
+are also written next to each edges file.
+
+If cache_dir is provided, the outputs of the conversion stages are checkpointed there (up to
+cache_max_bytes) and a repeated conversion of the same ways resumes from the deepest checkpoint
+whose parameters did not change (see stage_cache). Incremental conversions are not cached.
+
+A running job is cancelled the next time it prints a progress message or a stage of the
+conversion starts or finishes (see stage_report.StageReport). A single stage can run for a long
+time without either (e.g., a union of all lines), so if the job has not stopped within
+--cancel-timeout seconds, the worker reports it as cancelled with "remaining_jobs": 0 and exits
+without waiting for it, so that a new worker is started for the next job.
+
+The worker exits after it has run the maximum number of jobs so that memory that is not released
+between jobs does not accumulate. The message that ends the last job has "remaining_jobs": 0.
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import threading
+import traceback
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any
+
+from convert_ways_to_edges import convert_ways_to_edges
+from convert_ways_to_edges_incrementally import convert_ways_to_edges_incrementally
+from export_distance_matrix import export_distance_matrix
+from export_graph import export_graph
+from read_ways import read_ways
+from stage_cache import StageCache
+from stage_report import StageReport, stage, use_report
+from write_edges_result import write_edges_result
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job when it is cancelled. It is not an Exception so that it is not caught
+    by the error handling inside the conversion.
+    """
+    pass
+
+
+class _Connection:
+    """
+    Send and receive JSON messages (one per line) over a socket.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._reader = sock.makefile('r', encoding='utf-8', newline='\n')
+        self._writer = sock.makefile('w', encoding='utf-8', newline='\n')
+        self._lock = threading.Lock()
+
+    def send(self, message: dict[str, Any]) -> None:
+        with self._lock:
+            try:
+                self._writer.write(json.dumps(message) + '\n')
+                self._writer.flush()
+            except OSError:
+                pass  # the other end of the socket closed
+
+    def receive(self):
+        for line in self._reader:
+            if line.strip():
+                yield json.loads(line)
+
+
+class _ProgressWriter(io.TextIOBase):
+    """
+    Send each line that is printed during a job as a progress message. If the job has been
+    cancelled, the next print stops the job by raising JobCancelled.
+    """
+
+    def __init__(self, connection: _Connection, job_id: str, cancelled_job_ids: set[str]):
+        self._connection = connection
+        self._job_id = job_id
+        self._cancelled_job_ids = cancelled_job_ids
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if self._job_id in self._cancelled_job_ids:
+            raise JobCancelled()
+        with self._lock:
+            *lines, self._buffer = (self._buffer + text).split('\n')
+        for line in lines:
+            self._connection.send({'type': 'progress', 'id': self._job_id, 'message': line})
+        return len(text)
+
+
+def run_job(job: dict[str, Any]) -> list[str]:
+    """
+    Convert the ways to edges and write the results to every edges path.
+    """
+    use_arrow = bool(job.get('use_arrow'))
+    bbox = job.get('bbox')
+
+    print('Reading ways...')
+    with stage('read') as record:
+        ways = read_ways(Path(job['ways_path']), columns=job.get('columns'),
+                         bbox=tuple(bbox) if bbox else None, use_arrow=use_arrow)
+        record['output_count'] = len(ways)
+
+    convert_args = (job['connection_tolerance'], job['min_edge_length'], job['no_orphans'], job['intermediate_crs'])
+    convert_options: dict[str, Any] = {
+        'min_component_edges': job.get('min_component_edges'),
+        'min_component_length': job.get('min_component_length'),
+        'drop_small_components': bool(job.get('drop_small_components')),
+        'cost_profiles': job.get('cost_profiles'),
+        'remove_duplicate_lines': bool(job.get('remove_duplicate_lines')),
+        'precision_grid': job.get('precision_grid'),
+        'contract_degree_two_nodes': bool(job.get('contract_degree_two_nodes')),
+        'contraction_attributes': job.get('contraction_attributes'),
+        'low_memory': bool(job.get('low_memory')),
+        'memory_budget': job.get('memory_budget'),
+    }
+    if job.get('incremental_state_path'):
+        result = convert_ways_to_edges_incrementally(
+            ways, Path(job['incremental_state_path']), *convert_args, **convert_options)
+    else:
+        cache = None
+        if job.get('cache_dir'):
+            cache = StageCache(Path(job['cache_dir']), max_bytes=job.get('cache_max_bytes') or 2 * 1024 ** 3)
+        result = convert_ways_to_edges(ways, *convert_args, **convert_options, cache=cache)
+
+    # remove fid columns (edge_id is and way_id are our new unique identifiers)
+    # (any column named fid or fid{number} will be removed)
+    fid_columns = [col for col in result['edges'].columns if col ==
+                   'fid' or col.startswith('fid') and col[3:].isdigit()]
+    result['edges'] = result['edges'].drop(columns=fid_columns)
+
+    # save the edges, vertices, and orphans to every output file
+    print('Saving edges, vertices, and orphans...')
+    with stage('write', input_count=len(result['edges'])) as record:
+        written_paths = write_edges_result(
+            result, [Path(edges_path) for edges_path in job['edges_paths']],
+            use_arrow=use_arrow, geometry_encoding=job.get('geometry_encoding') or 'WKB')
+        record['output_count'] = len(written_paths)
+
+    # export the routing graph
+    if job.get('graph_dir'):
+        print('Exporting routing graph...')
+        with stage('graph', input_count=len(result['edges'])):
+            written_paths.append(export_graph(result, Path(job['graph_dir']), job['intermediate_crs'],
+                                              cost_profile=job.get('graph_cost_profile') or 'distance'))
+        if job.get('distance_matrix'):
+            print('Exporting distance matrix...')
+            with stage('distance_matrix', input_count=len(result.get('entrances', []))):
+                export_distance_matrix(result, Path(job['graph_dir']))
+
+    return [str(path) for path in written_paths]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Convert ways to edges for jobs received over a Unix socket.')
+    parser.add_argument('--socket', required=True, help='The path of the Unix socket to connect to.')
+    parser.add_argument('--max-jobs', type=int, default=10,
+                        help='The number of jobs to run before exiting.')
+    parser.add_argument('--cancel-timeout', type=float, default=10.0,
+                        help='The number of seconds to wait for a cancelled job to stop before exiting.')
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(args.socket)
+    connection = _Connection(sock)
+
+    # receive messages in the background so that jobs can be cancelled while they run
+    jobs: queue.Queue[dict[str, Any] | None] = queue.Queue()
+    cancelled_job_ids: set[str] = set()
+    current_job_ids: list[str] = []
+    # held while the outcome of the current job is sent, so that a job is only reported once
+    outcome_lock = threading.Lock()
+
+    def check_cancelled(job_id: str) -> None:
+        if job_id in cancelled_job_ids:
+            raise JobCancelled()
+
+    def exit_if_still_running(job_id: str) -> None:
+        with outcome_lock:
+            if job_id not in current_job_ids:
+                return
+            connection.send({'type': 'cancelled', 'id': job_id, 'remaining_jobs': 0})
+            connection.send({'type': 'exit', 'reason': 'recycle'})
+            os._exit(0)
+
+    def receive_messages() -> None:
+        for message in connection.receive():
+            if message['type'] == 'convert':
+                jobs.put(message)
+            elif message['type'] == 'cancel':
+                cancelled_job_ids.add(message['id'])
+                timer = threading.Timer(args.cancel_timeout, exit_if_still_running, (message['id'],))
+                timer.daemon = True
+                timer.start()
+            elif message['type'] == 'shutdown':
+                jobs.put(None)
+
+        # the other end of the socket closed, so stop the current job and exit
+        cancelled_job_ids.update(current_job_ids)
+        jobs.put(None)
+
+    threading.Thread(target=receive_messages, daemon=True).start()
+    connection.send({'type': 'ready', 'pid': os.getpid()})
+
+    completed_jobs = 0
+    while completed_jobs < args.max_jobs:
+        job = jobs.get()
+        if job is None:
+            connection.send({'type': 'exit', 'reason': 'shutdown'})
+            return
+
+        job_id = job['id']
+        if job_id in cancelled_job_ids:
+            connection.send({'type': 'cancelled', 'id': job_id, 'remaining_jobs': args.max_jobs - completed_jobs})
+            continue
+
+        current_job_ids[:] = [job_id]
+        outcome: dict[str, Any]
+        try:
+            report = StageReport(
+                profiler=job.get('profiler'),
+                profile_stages=job.get('profile_stages'),
+                profile_dir=Path(job['profile_dir']) if job.get('profile_dir') else None,
+                check_cancelled=lambda: check_cancelled(job_id),
+            )
+            with redirect_stdout(_ProgressWriter(connection, job_id, cancelled_job_ids)), use_report(report):
+                paths = run_job(job)
+            outcome = {'type': 'done', 'id': job_id, 'paths': paths, 'report': report.records}
+        except JobCancelled:
+            outcome = {'type': 'cancelled', 'id': job_id}
+        except Exception as error:
+            outcome = {'type': 'error', 'id': job_id, 'message': str(error), 'traceback': traceback.format_exc()}
+
+        completed_jobs += 1
+        with outcome_lock:
+            current_job_ids.clear()
+            connection.send({**outcome, 'remaining_jobs': args.max_jobs - completed_jobs})
+
+    connection.send({'type': 'exit', 'reason': 'recycle'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+import { spawn } from 'node:child_process';
+import { randomUUID } from 'node:crypto';
+import net from 'node:net';
+import os from 'node:os';
+import path from 'node:path';
+
+export interface ConvertWaysToEdgesIoOptions {
+  /** Only reads these attribute columns of the ways (the geometry is always read). */
+  columns?: string[];
+  /** Only reads the ways that intersect this bounding box (minx, miny, maxx, maxy in the CRS of the ways file). */
+  bbox?: [number, number, number, number];
+  /** Reads and writes files with pyogrio's Arrow reader and writer (requires pyarrow). */
+  useArrow?: boolean;
+  /** The geometry encoding of GeoParquet outputs (default is 'WKB'). */
+  geometryEncoding?: 'WKB' | 'geoarrow';
+  /** Also exports the edges as memory-mappable routing graph and snapping arrays to this folder (see export_graph.py). */
+  graphDir?: string;
+  /** The cost profile of the exported routing graph (default is 'distance'). */
+  graphCostProfile?: string;
+  /** Also exports the costs between every pair of polygons (e.g., buildings) to the graph folder (see export_distance_matrix.py). */
+  distanceMatrix?: boolean;
+}
+
+/**
+ * How the costs of traversing the edges are computed for a named profile (see compute_edge_costs.py).
+ * Each profile becomes `cost__{profile}` and `reverse_cost__{profile}` columns on the edges.
+ */
+export interface ConvertWaysToEdgesCostProfile {
+  /** The cost of traversing one metre (default is 1). */
+  multiplier?: number;
+  /** Additional multipliers for edges with specific attribute values (column -> value -> multiplier). */
+  multipliers?: Record<string, Record<string, number>>;
+  /** Attribute values that make an edge impassable in both directions (column -> values). */
+  impassable?: Record<string, (string | number)[]>;
+  /** The column with one-way flags ('yes', 'true', or '1' for forward only; '-1' or 'reverse' for reverse only). */
+  oneway?: string;
+}
+
+export interface ConvertWaysToEdgesJob extends ConvertWaysToEdgesIoOptions {
+  waysPath: string;
+  edgesPaths: string[];
+  connectionTolerance: number;
+  minimumEdgeLength: number;
+  noOrphans: boolean;
+  intermediateCrs: string;
+  incrementalStatePath?: string;
+  /** Components with fewer edges or a shorter total length are small (see find_components.py). */
+  minComponentEdges?: number;
+  minComponentLength?: number;
+  /** Drops small components instead of failing (or warning if orphans are allowed). */
+  dropSmallComponents?: boolean;
+  /** Removes duplicate lines and lines covered by other lines before splitting, merging their attributes (see deduplicate_lines.py). */
+  removeDuplicateLines?: boolean;
+  /** Snaps the coordinates to a grid of this size (in the units of the intermediate CRS) before removing duplicate lines. */
+  precisionGrid?: number;
+  /**
+   * Merges chains of edges through nodes of degree 2 when their `contractionAttributes` (default is all attributes)
+   * match, and writes the original edges of each merged edge next to the edges files (see contract_chains.py).
+   */
+  contractDegreeTwoNodes?: boolean;
+  contractionAttributes?: string[];
+  /** Carries only the line geometries through the edge steps and joins the attributes afterwards to reduce copying. */
+  lowMemory?: boolean;
+  /** The memory budget of the conversion in bytes; noding falls back to tiles when it would not fit. */
+  memoryBudget?: number;
+  /** The cost profiles to compute (default is a 'distance' profile of twice the edge length in metres). */
+  costProfiles?: Record<string, ConvertWaysToEdgesCostProfile>;
+  /** Checkpoints the stage outputs to this folder so that repeated conversions of the same ways resume from them (see stage_cache.py). */
+  cacheDir?: string;
+  /** The size cap of the checkpoint folder (default is 2 GiB); the least recently used checkpoints are deleted first. */
+  cacheMaxBytes?: number;
+  /** Profiles the stages in `profileStages` (or the top-level stages) and saves the profiles to `profileDir`. */
+  profiler?: 'cprofile' | 'pyinstrument';
+  profileStages?: string[];
+  profileDir?: string;
+}
+
+/**
+ * The measurements of one stage of a conversion (see stage_report.py).
+ * Nested stages have paths like 'e1/node'.
+ */
+export interface ConvertWaysToEdgesStageRecord {
+  stage: string;
+  depth: number;
+  wall_seconds: number;
+  cpu_seconds: number;
+  peak_rss_bytes: number;
+  input_count: number | null;
+  output_count: number | null;
+  profile_path: string | null;
+}
+
+export interface ConvertWaysToEdgesJobResult {
+  /** The paths of the written files. */
+  paths: string[];
+  /** The measurements of each stage of the conversion. */
+  report: ConvertWaysToEdgesStageRecord[];
+}
+
+export interface ConvertWaysToEdgesJobOptions {
+  /** Cancels the job when aborted. A running job stops the next time it reports progress. */
+  signal?: AbortSignal;
+  /** Receives each progress message of the job. Defaults to logging the messages. */
+  onProgress?: (message: string) => void;
+}
+
+type WorkerMessage =
+  | { type: 'ready'; pid: number }
+  | { type: 'progress'; id: string; message: string }
+  | { type: 'done'; id: string; paths: string[]; report: ConvertWaysToEdgesStageRecord[]; remaining_jobs: number }
+  | { type: 'error'; id: string; message: string; traceback: string; remaining_jobs: number }
+  | { type: 'cancelled'; id: string; remaining_jobs: number }
+  | { type: 'exit'; reason: 'recycle' | 'shutdown' };
+
+interface QueuedJob {
+  id: string;
+  job: ConvertWaysToEdgesJob;
+  options: ConvertWaysToEdgesJobOptions;
+  resolve: (result: ConvertWaysToEdgesJobResult) => void;
+  reject: (reason: unknown) => void;
+  /** The connection to the worker process that the job was sent to. */
+  connection?: Promise<net.Socket>;
+}
+
+/**
+ * A long-lived Python process (see worker.py) that converts ways to edges.
+ *
+ * The process is started when the first job is run, so the conda environment is activated and
+ * geopandas, pandas, and shapely are imported once instead of once per conversion. Jobs are
+ * sent to the process one at a time over a Unix socket. The process exits after it has run
+ * `maxJobs` jobs to limit memory growth, and a new process is started for the next job.
+ *
+ * A cancelled job stops between the stages of the conversion. If it does not stop within
+ * `cancelTimeoutSeconds` (e.g., inside a long union), the process exits instead and a new
+ * process is started for the next job.
+ */
+export class ConvertWaysToEdgesWorker {
+  private readonly maxJobs: number;
+  private readonly cancelTimeoutSeconds: number;
+  private readonly queue: QueuedJob[] = [];
+  private current: QueuedJob | null = null;
+  private connection: Promise<net.Socket> | null = null;
+
+  constructor(options: { maxJobs?: number; cancelTimeoutSeconds?: number } = {}) {
+    this.maxJobs = options.maxJobs ?? 10;
+    this.cancelTimeoutSeconds = options.cancelTimeoutSeconds ?? 10;
+  }
+
+  /**
+   * Runs a conversion job. Resolves with the paths of the written files and the stage report.
+   */
+  run(job: ConvertWaysToEdgesJob, options: ConvertWaysToEdgesJobOptions = {}) {
+    return new Promise<ConvertWaysToEdgesJobResult>((resolve, reject) => {
+      const queuedJob: QueuedJob = { id: randomUUID(), job, options, resolve, reject };
+      const { signal } = options;
+
+      if (signal?.aborted) {
+        reject(signal.reason);
+        return;
+      }
+
+      signal?.addEventListener(
+        'abort',
+        () => {
+          // remove the job if it has not started yet
+          const queuePosition = this.queue.indexOf(queuedJob);
+          if (queuePosition >= 0) {
+            this.queue.splice(queuePosition, 1);
+            reject(signal.reason);
+            return;
+          }
+
+          // otherwise, ask the worker to stop the job
+          if (this.current === queuedJob) {
+            queuedJob.connection?.then((socket) => send(socket, { type: 'cancel', id: queuedJob.id }));
+          }
+        },
+        { once: true }
+      );
+
+      this.queue.push(queuedJob);
+      this.next();
+    });
+  }
+
+  /**
+   * Stops the worker process after the current job finishes.
+   */
+  async stop() {
+    const connection = this.connection;
+    this.connection = null;
+    if (connection) {
+      send(await connection, { type: 'shutdown' });
+    }
+  }
+
+  /**
+   * Sends the next queued job to the worker process if it is not busy,
+   * starting the process if it is not running.
+   */
+  private next() {
+    if (this.current || this.queue.length === 0) {
+      return;
+    }
+
+    const queuedJob = this.queue.shift()!;
+    this.current = queuedJob;
+    this.connection ??= this.start();
+    queuedJob.connection = this.connection;
+    queuedJob.connection
+      .then((socket) => {
+        const { job } = queuedJob;
+        send(socket, {
+          type: 'convert',
+          id: queuedJob.id,
+          ways_path: job.waysPath,
+          edges_paths: job.edgesPaths,
+          connection_tolerance: job.connectionTolerance,
+          min_edge_length: job.minimumEdgeLength,
+          no_orphans: job.noOrphans,
+          intermediate_crs: job.intermediateCrs,
+          incremental_state_path: job.incrementalStatePath ?? null,
+          min_component_edges: job.minComponentEdges ?? null,
+          min_component_length: job.minComponentLength ?? null,
+          drop_small_components: job.dropSmallComponents ?? false,
+          cost_profiles: job.costProfiles ?? null,
+          remove_duplicate_lines: job.removeDuplicateLines ?? false,
+          precision_grid: job.precisionGrid ?? null,
+          contract_degree_two_nodes: job.contractDegreeTwoNodes ?? false,
+          contraction_attributes: job.contractionAttributes ?? null,
+          low_memory: job.lowMemory ?? false,
+          memory_budget: job.memoryBudget ?? null,
+          cache_dir: job.cacheDir ?? null,
+          cache_max_bytes: job.cacheMaxBytes ?? null,
+          profiler: job.profiler ?? null,
+          profile_stages: job.profileStages ?? null,
+          profile_dir: job.profileDir ?? null,
+          columns: job.columns ?? null,
+          bbox: job.bbox ?? null,
+          use_arrow: job.useArrow ?? false,
+          geometry_encoding: job.geometryEncoding ?? null,
+          graph_dir: job.graphDir ?? null,
+          graph_cost_profile: job.graphCostProfile ?? null,
+          distance_matrix: job.distanceMatrix ?? false,
+        });
+      })
+      .catch((error) => this.finish(queuedJob, () => queuedJob.reject(error)));
+  }
+
+  /**
+   * Settles the current job and moves on to the next one.
+   */
+  private finish(queuedJob: QueuedJob, settle: () => void) {
+    if (this.current !== queuedJob) {
+      return;
+    }
+    this.current = null;
+    settle();
+    this.next();
+  }
+
+  /**
+   * Starts the worker process and waits for it to connect.
+   */
+  private start() {
+    const socketPath = path.join(os.tmpdir(), `convert-ways-to-edges-${process.pid}-${randomUUID()}.sock`);
+
+    const connection = new Promise<net.Socket>((resolve, reject) => {
+      // only accept the connection from the worker process
+      const server = net.createServer((socket) => {
+        server.close();
+        this.listen(socket, connection, resolve);
+      });
+      server.on('error', reject);
+
+      server.listen(socketPath, () => {
+        const child = spawn(
+          `$(conda info --base)/bin/conda run --live-stream --name convert-ways-to-edges --cwd "${
+            import.meta.dirname
+          }" python -u worker.py --socket "${socketPath}" --max-jobs ${this.maxJobs} --cancel-timeout ${this.cancelTimeoutSeconds}`,
+          {
+            shell: '/bin/bash',
+            stdio: ['ignore', 'inherit', 'inherit'],
+            env: Object.fromEntries(Object.entries(process.env).filter(([key, value]) => !!value)),
+          }
+        );
+
+        child.on('error', reject);
+        child.on('exit', (code) => {
+          server.close();
+          reject(new Error(`The convert ways to edges worker exited before connecting (exit code ${code}).`));
+        });
+      });
+    });
+
+    return connection;
+  }
+
+  /**
+   * Handles the messages that the worker process sends over the socket.
+   */
+  private listen(socket: net.Socket, connection: Promise<net.Socket>, onReady: (socket: net.Socket) => void) {
+    let buffered = '';
+
+    socket.setEncoding('utf-8');
+    socket.on('data', (data: string) => {
+      const lines = (buffered + data).split('\n');
+      buffered = lines.pop() ?? '';
+
+      for (const line of lines.filter((line) => line.trim())) {
+        const message = JSON.parse(line) as WorkerMessage;
+        const current = this.current;
+
+        if (message.type === 'ready') {
+          onReady(socket);
+          continue;
+        }
+
+        if (message.type === 'exit') {
+          continue;
+        }
+
+        if (!current || message.id !== current.id) {
+          continue;
+        }
+
+        if (message.type === 'progress') {
+          (current.options.onProgress ?? console.log)(message.message);
+          continue;
+        }
+
+        // the worker exits after the last job it accepts, so a new one is needed for the next job
+        if (message.remaining_jobs <= 0 && this.connection === connection) {
+          this.connection = null;
+        }
+
+        if (message.type === 'done') {
+          this.finish(current, () => current.resolve({ paths: message.paths, report: message.report }));
+        } else if (message.type === 'cancelled') {
+          this.finish(current, () => current.reject(current.options.signal?.reason ?? new Error('Job cancelled.')));
+        } else if (message.type === 'error') {
+          this.finish(current, () => current.reject(new Error(`${message.message}\n\n${message.traceback}`)));
+        }
+      }
+    });
+
+    // if the worker process goes away, fail its current job and start a new process for the next job
+    socket.on('close', () => {
+      if (this.connection === connection) {
+        this.connection = null;
+      }
+      const current = this.current;
+      if (current && current.connection === connection) {
+        this.finish(current, () => current.reject(new Error('The convert ways to edges worker exited unexpectedly.')));
+      }
+    });
+  }
+}
+
+function send(socket: net.Socket, message: Record<string, unknown>) {
+  socket.write(JSON.stringify(message) + '\n');
+}
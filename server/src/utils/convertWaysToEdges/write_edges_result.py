@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Literal
+
+import geopandas
+
+from convert_ways_to_edges import EdgesResult
+from write_pgcopy import write_pgcopy
+
+
+def get_sibling_path(edges_path: Path, suffix: str) -> Path:
+    """
+    Get the path of a file that is saved next to the edges file, with a suffix added to the
+    file name (e.g., edges.gpkg -> edges_vertices.gpkg).
+    """
+    return edges_path.with_name(edges_path.stem + suffix + edges_path.suffix)
+
+
+def _write(gdf: geopandas.GeoDataFrame, path: Path, id_column: str | None, use_arrow: bool, geometry_encoding: Literal['WKB', 'geoarrow']) -> Path:
+    print(f'  Saving {len(gdf)} features to {path}...')
+
+    # parquet file
+    if path.suffix == '.parquet':
+        gdf.to_parquet(path, geometry_encoding=geometry_encoding)
+
+    # binary COPY stream for PostgreSQL
+    elif path.suffix == '.pgcopy':
+        write_pgcopy(gdf, path, id_column=id_column)
+
+    # any other file type supported by geopandas
+    elif use_arrow:
+        gdf.to_file(path, engine='pyogrio', use_arrow=True)
+    else:
+        gdf.to_file(path)
+
+    return path
+
+
+def write_edges_result(result: EdgesResult, edges_paths: list[Path], *, vertices: bool = True, orphans: bool = True, max_workers: int | None = None, use_arrow: bool = False, geometry_encoding: Literal['WKB', 'geoarrow'] = 'WKB') -> list[Path]:
+    """
+    Write the edges (and optionally the vertices and orphans) from a single conversion to every
+    one of the edges paths. The format of each file is chosen from its extension: GeoParquet for
+    .parquet, a PostgreSQL binary COPY stream with its schema for .pgcopy (see write_pgcopy, where
+    the `edge_id` and `node_id` become the `id` of the edges and vertices), and any format
+    supported by geopandas otherwise (e.g., .gpkg, .geojson).
+
+    The vertices and orphans are saved next to each edges file with '_vertices' and '_orphans'
+    suffixes (e.g., edges_vertices.gpkg and edges_orphans.gpkg), as is the edge mapping of
+    contracted edges with an '_edge_mapping' suffix and the polygon entrances with an '_entrances'
+    suffix if the result has them. The list of edge ids on each
+    vertex is not saved because it cannot be stored in most formats, and the edges already
+    reference their start and end vertices.
+
+    The files are written in parallel threads (one per file unless `max_workers` is specified).
+
+    If `use_arrow` is True, formats other than GeoParquet are written with pyogrio's Arrow writer
+    instead of row by row (this requires pyarrow). GeoParquet geometries are encoded as WKB or
+    as native GeoArrow geometries depending on `geometry_encoding`.
+
+    Returns the paths of all written files.
+    """
+    nodes = result['nodes'].drop(columns=['edges'], errors='ignore')
+
+    # collect every file that needs to be written (with the id column of the edges and vertices)
+    writes: list[tuple[geopandas.GeoDataFrame, Path, str | None]] = []
+    for edges_path in edges_paths:
+        writes.append((result['edges'], edges_path, 'edge_id'))
+        if vertices:
+            writes.append((nodes, get_sibling_path(edges_path, '_vertices'), 'node_id'))
+        if orphans:
+            writes.append((result['orphans'], get_sibling_path(edges_path, '_orphans'), None))
+        if 'edge_mapping' in result:
+            writes.append((result['edge_mapping'], get_sibling_path(edges_path, '_edge_mapping'), None))
+        if 'entrances' in result:
+            writes.append((result['entrances'], get_sibling_path(edges_path, '_entrances'), None))
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(writes), 1)) as executor:
+        futures = [executor.submit(_write, gdf, path, id_column, use_arrow, geometry_encoding)
+                   for gdf, path, id_column in writes]
+        return [future.result() for future in futures]
@@ -0,0 +1,169 @@
+import itertools
+import json
+import re
+import struct
+from pathlib import Path
+from typing import TypedDict
+
+import geopandas
+import numpy
+import pandas
+import shapely
+
+# the header of a binary COPY stream: the signature, the flags, and the length of the header extension
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+_NULL_FIELD = struct.pack('>i', -1)
+_POSTGRES_EPOCH = numpy.datetime64('2000-01-01T00:00:00', 'us')
+
+
+class PgCopyColumn(TypedDict):
+    name: str
+    type: str
+
+
+class PgCopySchema(TypedDict):
+    columns: list[PgCopyColumn]
+    primary_key: str | None
+    geometry_column: str
+    srid: int
+    row_count: int
+
+
+def _launder_name(name: str) -> str:
+    """
+    Launder a column name the way ogr2ogr does for PostgreSQL (lowercase, with spaces, hyphens,
+    hashes, and quotes replaced by underscores), so that the columns keep their previous names.
+    """
+    return re.sub(r"[\s\-#']", '_', str(name).lower())
+
+
+def _encode_fixed_width(values: numpy.ndarray, is_null: numpy.ndarray, value_dtype: str) -> list[bytes]:
+    """
+    Encode values of a fixed-width type as binary COPY fields (the length followed by the
+    big-endian value).
+    """
+    fields = numpy.zeros(len(values), dtype=[('length', '>i4'), ('value', value_dtype)])
+    fields['length'] = numpy.dtype(value_dtype).itemsize
+    fields['value'][~is_null] = values[~is_null]
+    raw = fields.tobytes()
+    encoded = [raw[offset:offset + fields.itemsize] for offset in range(0, len(raw), fields.itemsize)]
+    for position in numpy.flatnonzero(is_null).tolist():
+        encoded[position] = _NULL_FIELD
+    return encoded
+
+
+def _encode_variable_width(values: list[bytes | None]) -> list[bytes]:
+    """
+    Encode byte strings as binary COPY fields (the length followed by the bytes).
+    """
+    return [_NULL_FIELD if value is None else struct.pack('>i', len(value)) + value for value in values]
+
+
+def _get_column_type(values: pandas.Series) -> str:
+    """
+    Choose the PostgreSQL type of a column from its dtype (text for any dtype that has no
+    matching type).
+    """
+    if pandas.api.types.is_bool_dtype(values.dtype):
+        return 'boolean'
+    if pandas.api.types.is_integer_dtype(values.dtype):
+        return 'bigint'
+    if pandas.api.types.is_float_dtype(values.dtype):
+        return 'double precision'
+    if pandas.api.types.is_datetime64_any_dtype(values.dtype):
+        return 'timestamptz' if getattr(values.dt, 'tz', None) is not None else 'timestamp'
+    return 'text'
+
+
+def _get_geometry_type(geometries: geopandas.GeoSeries, srid: int) -> str:
+    """
+    Choose the PostGIS type of the geometry column (e.g., geometry(LineString, 4326) for edges
+    and geometry(Point, 4326) for nodes, or geometry(Geometry, 4326) for mixed geometry types).
+    """
+    geometry_types = geometries.geom_type.dropna().unique()
+    geometry_type = geometry_types[0] if len(geometry_types) == 1 else 'Geometry'
+    return f'geometry({geometry_type}, {srid})'
+
+
+def _encode_column(values: pandas.Series, column_type: str) -> list[bytes]:
+    """
+    Encode the values of a column as binary COPY fields of its PostgreSQL type.
+    """
+    is_null = values.isna().to_numpy()
+    if column_type == 'boolean':
+        return _encode_fixed_width(values.to_numpy(dtype=bool, na_value=False), is_null, '?')
+    if column_type == 'bigint':
+        return _encode_fixed_width(values.to_numpy(dtype=numpy.int64, na_value=0), is_null, '>i8')
+    if column_type == 'double precision':
+        return _encode_fixed_width(values.to_numpy(dtype=numpy.float64, na_value=numpy.nan), is_null, '>f8')
+    if column_type in ('timestamp', 'timestamptz'):
+        # timestamps are microseconds since 2000-01-01 (in UTC for time zone aware timestamps)
+        if column_type == 'timestamptz':
+            values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+        timestamps = values.to_numpy(dtype='datetime64[us]', na_value=numpy.datetime64('NaT'))
+        return _encode_fixed_width((timestamps - _POSTGRES_EPOCH).astype(numpy.int64), is_null, '>i8')
+    return _encode_variable_width(
+        [None if null else str(value).encode('utf-8') for value, null in zip(values.tolist(), is_null.tolist())])
+
+
+def write_pgcopy(gdf: geopandas.GeoDataFrame, path: Path, *, id_column: str | None = None, chunk_size: int = 50000) -> Path:
+    """
+    Write a GeoDataFrame as a PostgreSQL binary COPY stream (for `COPY ... FROM STDIN (FORMAT
+    binary)`) so that it can be loaded into PostGIS without converting it to SQL text, along with
+    its schema in a JSON file next to it (e.g., edges.pgcopy.json), which lists the name and
+    PostgreSQL type of each column, the primary key, the geometry column, and the SRID.
+
+    The `id_column` (a column or the name of the index) is written first as the BIGINT `id`
+    primary key. Integers are written as BIGINT, floats as DOUBLE PRECISION (NaN as NULL),
+    booleans as BOOLEAN, timestamps as TIMESTAMP or TIMESTAMPTZ, and the geometries as EWKB in a
+    `geom` column (typed with their geometry type if they all have the same one, see
+    _get_geometry_type). Every other column is written as TEXT. Column names are laundered like ogr2ogr
+    does (see _launder_name).
+
+    The rows are encoded in chunks of `chunk_size` rows so that the whole stream is never held
+    in memory. Returns the path of the stream.
+    """
+    if id_column is not None and id_column not in gdf.columns and gdf.index.name == id_column:
+        gdf = gdf.reset_index()
+    attribute_columns = [column for column in gdf.columns if column not in (gdf.geometry.name, id_column)]
+    srid = (gdf.crs.to_epsg() or 0) if gdf.crs is not None else 0
+    column_types = [_get_column_type(gdf[column]) for column in attribute_columns]
+
+    columns: list[PgCopyColumn] = [
+        *([PgCopyColumn(name='id', type='bigint')] if id_column is not None else []),
+        *[PgCopyColumn(name=_launder_name(column), type=column_type)
+          for column, column_type in zip(attribute_columns, column_types)],
+        PgCopyColumn(name='geom', type=_get_geometry_type(gdf.geometry, srid)),
+    ]
+    row_header = struct.pack('>h', len(columns))
+
+    with open(path, 'wb') as copy_file:
+        copy_file.write(PGCOPY_HEADER)
+        for start in range(0, len(gdf), chunk_size):
+            chunk = gdf.iloc[start:start + chunk_size]
+
+            # encode each column of the chunk, and then interleave the fields of each row after
+            # the number of fields in the row
+            encoded_columns: list[list[bytes]] = []
+            if id_column is not None:
+                encoded_columns.append(_encode_column(chunk[id_column], 'bigint'))
+            for column, column_type in zip(attribute_columns, column_types):
+                encoded_columns.append(_encode_column(chunk[column], column_type))
+            geometries = shapely.set_srid(chunk.geometry.to_numpy(), srid)
+            encoded_columns.append(_encode_variable_width(shapely.to_wkb(geometries, include_srid=True).tolist()))
+
+            copy_file.write(b''.join(itertools.chain.from_iterable(
+                zip(itertools.repeat(row_header, len(chunk)), *encoded_columns))))
+        copy_file.write(PGCOPY_TRAILER)
+
+    schema: PgCopySchema = {
+        'columns': columns,
+        'primary_key': 'id' if id_column is not None else None,
+        'geometry_column': 'geom',
+        'srid': srid,
+        'row_count': len(gdf),
+    }
+    path.with_name(path.name + '.json').write_text(json.dumps(schema, indent=2), encoding='utf-8')
+    return path
@@ -1,13 +1,23 @@
-import { glob, mkdir, readFile, rm, writeFile } from 'node:fs/promises';
+import { glob, mkdir, rm, writeFile } from 'node:fs/promises';
 import path from 'node:path';
 import { exec } from './exec.js';
 import { getFirstLayerName } from './getFirstLayerName.js';
-import { constants, convertWaysToEdges, getFirstLayerFeatureCount } from './index.js';
+import { constants, convertWaysToEdges, loadRoutingTables } from './index.js';
 
 export interface RoutingInitOptions {
   edgesTableName?: string;
   verticesTableName?: string;
   waysLayers: string[];
+  /**
+   * The folder where the previous edges are kept so that only the ways that changed
+   * need to be converted again. Set to `false` to always convert all ways.
+   */
+  incrementalStateFolder?: string | false;
+  /**
+   * The folder where the routing graph arrays are exported for in-process routing
+   * (see convertWaysToEdges/routing_graph.py). Set to `false` to skip the export.
+   */
+  graphFolder?: string | false;
 }
 
 export async function generateRoutingTables(inputFolder: string, options: RoutingInitOptions) {
@@ -30,13 +40,21 @@ export async function generateRoutingTables(inputFolder: string, options: Routin
   mkdir(path.dirname(mergedWaysFgbPath), { recursive: true });
   rm(mergedWaysFgbPath, { force: true }); // ensure we start with no existing data
 
+  // the way_id of each way is built from the primary key (fid) of its row and the position of its
+  // layer in the ways layers so that a way keeps its way_id between runs (which the incremental
+  // conversion relies on) no matter which rows are added or deleted or the order of the rows
+  const getWayIdSql = (waysFgbFile: string) => {
+    const layerPosition = options.waysLayers.indexOf(path.basename(waysFgbFile, '.fgb'));
+    return `CAST(fid AS INTEGER) * ${options.waysLayers.length} + ${layerPosition}`;
+  };
+
   // create a merged ways sources fgb file using the first ways source layer
-  // and add a sequential way_id column (ROW_NUMBER() OVER () AS way_id)
+  // and add the way_id column
   const firstLayerName = await getFirstLayerName(waysFgbFiles[0]!);
   await exec(
     `ogr2ogr -f Flatgeobuf "${mergedWaysFgbPath}" "${waysFgbFiles[0]}" \
     -t_srs EPSG:4326 \
-    -sql  "SELECT *, ROW_NUMBER() OVER () AS way_id, CAST('${firstLayerName}' AS TEXT) AS table_name FROM '${firstLayerName}'" \
+    -sql  "SELECT *, ${getWayIdSql(waysFgbFiles[0]!)} AS way_id, CAST('${firstLayerName}' AS TEXT) AS table_name FROM '${firstLayerName}'" \
     -dialect SQLite \
     -nln ways`,
     false,
@@ -47,10 +65,6 @@ export async function generateRoutingTables(inputFolder: string, options: Routin
   for (const waysFgbFile of waysFgbFiles.slice(1)) {
     const layerName = await getFirstLayerName(waysFgbFile);
 
-    // find how many features are already in the merged ways souces fgb file
-    // so we can start incrementing way_id from there
-    const edgeIdOffset = await getFirstLayerFeatureCount(mergedWaysFgbPath);
-
     // step 1: merge schema without adding rows (add missing columns)
     await exec(
       `ogr2ogr -f FlatGeobuf -update -append "${mergedWaysFgbPath}" "${waysFgbFile}" \
@@ -66,7 +80,7 @@ export async function generateRoutingTables(inputFolder: string, options: Routin
     await exec(
       `ogr2ogr -f FlatGeobuf -update -append "${mergedWaysFgbPath}" "${waysFgbFile}" \
     -t_srs EPSG:4326 \
-    -sql "SELECT *, ROW_NUMBER() OVER () + ${edgeIdOffset} AS way_id, CAST('${layerName}' AS TEXT) AS table_name FROM '${layerName}'" \
+    -sql "SELECT *, ${getWayIdSql(waysFgbFile)} AS way_id, CAST('${layerName}' AS TEXT) AS table_name FROM '${layerName}'" \
     -dialect SQLite \
     -nln ways`,
       false,
@@ -76,127 +90,31 @@ export async function generateRoutingTables(inputFolder: string, options: Routin
 
   // convert the ways to edges
   console.log('Converting ways to edges...');
-  const edgesOutputPath = path.join(workingDir, 'edges.gpkg');
-  await convertWaysToEdges(mergedWaysFgbPath, edgesOutputPath, undefined, undefined, true);
+  // (the state is kept outside of the working directory so that it survives between runs)
+  const incrementalStateFolder = options.incrementalStateFolder ?? constants.routingIncrementalStateFolder;
+  const incrementalStatePath = incrementalStateFolder
+    ? path.join(incrementalStateFolder, 'convert-ways-to-edges-state.pkl')
+    : undefined;
+  // (the edges and vertices are written as binary COPY streams that are loaded without SQL text)
+  const edgesOutputPath = path.join(workingDir, 'edges.pgcopy');
   await convertWaysToEdges(
     mergedWaysFgbPath,
-    edgesOutputPath.replace('.gpkg', '.geojson'),
+    [edgesOutputPath, edgesOutputPath.replace('.pgcopy', '.geojson')],
     undefined,
     undefined,
-    true
-  );
-
-  // create a SQL dump file of the merged edges sources
-  console.log('Generating routing tables SQL dump...');
-  const dumpFilePath = path.join(workingDir, 'routing-tables.sql');
-  await exec(
-    `ogr2ogr -f "PGDUMP" "${dumpFilePath}" \
-      "${edgesOutputPath}" \
-      -nln ${options.edgesTableName ?? 'edges'} \
-      -lco FID=fid \
-      -dialect SQLite \
-      -overwrite
-      `,
-    false,
-    true
+    true,
+    undefined,
+    incrementalStatePath,
+    { graphDir: (options.graphFolder ?? constants.routingGraphFolder) || undefined }
   );
 
-  // prepend instructions to drop the tables if they exist
-  let dumpFileContent = await readFile(dumpFilePath, 'utf-8');
-  dumpFileContent =
-    `
-  -- drop the existing edges and vertices tables if they exist
-  DROP TABLE IF EXISTS edges;
-  DROP TABLE IF EXISTS vertices;
-
-  -- load the edges table
-  ` + dumpFileContent;
-
-  // append additional instructions related to creating the routing topology
-  dumpFileContent += `
-  -- replace fid (the primary key) with edge_id and drop the old edge_id column
-  UPDATE edges SET fid = edge_id;
-  ALTER TABLE edges DROP COLUMN edge_id;
-  ALTER TABLE edges RENAME COLUMN fid TO id; -- rename fid to id
-
-  -- make id use BIGINT type
-  ALTER TABLE edges
-  ALTER COLUMN id TYPE BIGINT;
-
-  -- create the vertices table
-  CREATE TABLE vertices AS
-  SELECT *
-  FROM pgr_extractVertices('SELECT id AS id, geom FROM edges');
-
-  -- make the vertices table use BIGINT type for id
-  ALTER TABLE vertices
-  ALTER COLUMN id TYPE BIGINT;
-
-  -- set the SRID on the vertices table to match the edges table
-  DO $$
-  DECLARE
-    -- prepare a variable to hold the SRID
-    srid INTEGER;
-  BEGIN
-    -- get the SRID from the edges table
-    SELECT Find_SRID('', 'edges', 'geom') INTO srid;
-
-    -- apply the SRID to the vertices table
-    EXECUTE format(
-      'ALTER TABLE vertices
-       ALTER COLUMN geom
-       TYPE geometry(Point, %s)
-       USING ST_SetSRID(geom, %s);',
-      srid, srid
-    );
-  END
-  $$;
-
-  -- add start and end columns to the edges table
-  ALTER TABLE edges
-  ADD COLUMN start_vertex BIGINT,
-  ADD COLUMN end_vertex BIGINT;
-
-  -- populate the start column for each edge based on the corresponding start point in the vertices table
-  UPDATE edges
-  SET start_vertex = vertices.id
-      FROM vertices
-      WHERE ST_Equals(ST_StartPoint(edges.geom), vertices.geom);
-
-  -- populate the end column for each edge based on the corresponding end point in the vertices table
-  UPDATE edges
-  SET end_vertex = vertices.id
-      FROM vertices
-      WHERE ST_Equals(ST_EndPoint(edges.geom), vertices.geom);
-
-  -- add cost and reverse_cost columns to the edges table
-  -- (costs help the routing algorithm determine the "cost" of traversing each edge)
-  ALTER TABLE edges
-  ADD COLUMN cost__distance DOUBLE PRECISION,
-  ADD COLUMN reverse_cost__distance DOUBLE PRECISION;
-
-  -- assign costs to each edge (for now, make the cost double the length of the edge)
-  -- In the future, we may set more advanced costs based on speed limits, road types,
-  -- one-way directions, etc.
-  UPDATE edges
-  SET cost__distance = ST_Length(geom) * 2,
-      reverse_cost__distance = ST_Length(geom) * 2;
-  `;
-
-  // write the final dump file
-  await writeFile(dumpFilePath, dumpFileContent, 'utf-8');
-
-  // import the SQL dump file into the main database
-  console.log('Importing routing tables into the database...');
-  await exec(
-    `PGHOST=${constants.database.host} \
-      PGPORT=${constants.database.port} \
-      PGUSER=${constants.database.username} \
-      PGPASSWORD=${constants.database.password} \
-      psql -d ${constants.database.routingdatabase} -f "${dumpFilePath}"`,
-    false,
-    true
-  );
+  // stream the edges and vertices into the database, replacing the previous tables at once
+  console.log('Loading routing tables into the database...');
+  const verticesOutputPath = edgesOutputPath.replace('.pgcopy', '_vertices.pgcopy');
+  await loadRoutingTables([
+    { tableName: options.edgesTableName ?? 'edges', copyPath: edgesOutputPath },
+    { tableName: options.verticesTableName ?? 'vertices', copyPath: verticesOutputPath },
+  ]);
 
   // write service json file indicating the presence of the service
   const serviceDir = path.join(constants.fileBasedServicesDataFolder, 'FurmanCampusGraph');
@@ -13,6 +13,7 @@ export { inferServiceResponseFormat } from './inferServiceResponseFormat.js';
 export { initDoc, jsonToArcGisHtml } from './jsonToArcGisHtml.js';
 export { kartDatabasePool } from './kartDatabasePool.js';
 export { listDbGeometryTables } from './listDbGeometryTables.js';
+export { loadRoutingTables } from './loadRoutingTables.js';
 export { routingDatabasePool } from './routingDatabasePool.js';
 export { uncapitalize } from './uncapitalize.js';
 export { unwrapServiceName } from './unwrapServiceName.js';
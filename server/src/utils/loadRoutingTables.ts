@@ -0,0 +1,109 @@
+import { createReadStream } from 'node:fs';
+import { readFile } from 'node:fs/promises';
+import { pipeline } from 'node:stream/promises';
+import { Pool } from 'pg';
+import pgCopyStreams from 'pg-copy-streams';
+import { routingDatabasePool } from './routingDatabasePool.js';
+
+/**
+ * The schema that is written next to each binary COPY stream (see convertWaysToEdges/write_pgcopy.py).
+ */
+interface PgCopySchema {
+  columns: { name: string; type: string }[];
+  primary_key: string | null;
+  geometry_column: string;
+  srid: number;
+  row_count: number;
+}
+
+export interface RoutingTableCopy {
+  /** The name of the table to create or replace. */
+  tableName: string;
+  /** The path of the binary COPY stream (its schema is read from the `.json` file next to it). */
+  copyPath: string;
+}
+
+/**
+ * Loads binary COPY streams that were written by the conversion from ways to edges into
+ * PostgreSQL without converting them to SQL text.
+ *
+ * Each stream is copied into a staging table, which is indexed (primary key and spatial index)
+ * and analyzed after the copy. The staging tables then replace the previous tables in a single
+ * transaction, so the previous tables stay queryable until all new tables are ready.
+ *
+ * @param tables - The tables to load and the paths of their binary COPY streams.
+ * @param pool - The PostgreSQL connection pool (the routing database by default).
+ */
+export async function loadRoutingTables(tables: RoutingTableCopy[], pool: Pool = routingDatabasePool) {
+  const schemas = await Promise.all(
+    tables.map(
+      async ({ copyPath }) => JSON.parse(await readFile(`${copyPath}.json`, 'utf-8')) as PgCopySchema
+    )
+  );
+
+  const client = await pool.connect();
+  try {
+    // drop the staging tables that a failed load may have left behind
+    for (const { tableName } of tables) {
+      await client.query(`DROP TABLE IF EXISTS ${client.escapeIdentifier(`${tableName}__staging`)}`);
+    }
+
+    // copy each stream into a staging table and index it
+    for (const [index, { tableName, copyPath }] of tables.entries()) {
+      const schema = schemas[index]!;
+      const stagingTable = client.escapeIdentifier(`${tableName}__staging`);
+      const columns = schema.columns.map(
+        (column) => `${client.escapeIdentifier(column.name)} ${column.type}`
+      );
+
+      await client.query(`CREATE TABLE ${stagingTable} (${columns.join(', ')})`);
+      await pipeline(
+        createReadStream(copyPath),
+        client.query(pgCopyStreams.from(`COPY ${stagingTable} FROM STDIN (FORMAT binary)`))
+      );
+      console.log(`Copied ${schema.row_count} rows into ${tableName}__staging`);
+
+      // (building the indexes after the copy is faster than updating them for every row)
+      if (schema.primary_key) {
+        await client.query(
+          `ALTER TABLE ${stagingTable} ADD CONSTRAINT ${client.escapeIdentifier(`${tableName}__staging_pkey`)}
+          PRIMARY KEY (${client.escapeIdentifier(schema.primary_key)})`
+        );
+      }
+      await client.query(
+        `CREATE INDEX ${client.escapeIdentifier(`${tableName}__staging_geom_idx`)}
+        ON ${stagingTable} USING GIST (${client.escapeIdentifier(schema.geometry_column)})`
+      );
+      await client.query(`ANALYZE ${stagingTable}`);
+    }
+
+    // replace the previous tables with the staging tables all at once
+    await client.query('BEGIN');
+    try {
+      for (const [index, { tableName }] of tables.entries()) {
+        const schema = schemas[index]!;
+        await client.query(`DROP TABLE IF EXISTS ${client.escapeIdentifier(tableName)}`);
+        await client.query(
+          `ALTER TABLE ${client.escapeIdentifier(`${tableName}__staging`)}
+          RENAME TO ${client.escapeIdentifier(tableName)}`
+        );
+        if (schema.primary_key) {
+          await client.query(
+            `ALTER INDEX ${client.escapeIdentifier(`${tableName}__staging_pkey`)}
+            RENAME TO ${client.escapeIdentifier(`${tableName}_pkey`)}`
+          );
+        }
+        await client.query(
+          `ALTER INDEX ${client.escapeIdentifier(`${tableName}__staging_geom_idx`)}
+          RENAME TO ${client.escapeIdentifier(`${tableName}_geom_idx`)}`
+        );
+      }
+      await client.query('COMMIT');
+    } catch (error) {
+      await client.query('ROLLBACK');
+      throw error;
+    }
+  } finally {
+    client.release();
+  }
+}